@@ -0,0 +1,329 @@
+"""Alertas declarativas sobre cada tenencia normalizada, sin dependencias de interfaz.
+
+Las reglas se definen en config.json ("alertas") y se compilan una sola vez
+en arrays: columna, operador, umbral, enfriamiento y una matriz de filtros.
+Cada consulta las evalúa todas juntas con operaciones vectorizadas sobre
+matrices reglas x tickers, sin recorrer filas en Python; solo se recorren
+las alertas que efectivamente se disparan.
+
+Las alertas son por flanco: se disparan cuando la condición pasa de falsa a
+verdadera (o, con el operador "cruza", cuando el valor cruza el umbral en
+cualquier sentido), y después de dispararse esperan el enfriamiento antes de
+poder volver a hacerlo. Cada alerta se agrega como una línea JSON al registro.
+"""
+import json
+import operator
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+from cartera import claves_unicas
+
+
+log = obtener('alertas')
+
+
+ARCHIVO_ALERTAS = 'alertas.log'
+ENFRIAMIENTO = 300  # Segundos por defecto entre dos disparos de la misma regla y ticker
+
+OPERADORES = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'cruza': operator.ge,  # Se dispara con cualquier cambio de lado respecto del umbral
+}
+
+AGREGADOS = ('suma', 'promedio', 'maximo', 'minimo')
+
+CLAVE_AGREGADO = '*'  # Ticker con que se informan las alertas sobre agregados
+
+# Estado de la condición de cada regla y ticker
+DESCONOCIDO = -1
+
+
+class ReglaInvalida(ValueError):
+    pass
+
+
+def describir_regla(regla):
+    """Texto de la regla, para las alertas y los avisos"""
+    columna = regla['columna']
+    if regla.get('agregado'):
+        columna = f"{regla['agregado']}({columna})"
+    texto = f"{columna} {regla['operador']} {regla['valor']:g}"
+    filtro = regla.get('filtro') or {}
+    if filtro:
+        texto += ' para ' + ', '.join(f"{col} == {valor}" for col, valor in filtro.items())
+    return texto
+
+
+def validar_regla(regla):
+    """Devuelve la regla normalizada o levanta ReglaInvalida"""
+    if not isinstance(regla, dict):
+        raise ReglaInvalida("cada regla debe ser un objeto")
+    for clave in ('columna', 'operador', 'valor'):
+        if clave not in regla:
+            raise ReglaInvalida(f"falta '{clave}'")
+    if regla['operador'] not in OPERADORES:
+        raise ReglaInvalida(f"operador desconocido '{regla['operador']}' (válidos: {', '.join(OPERADORES)})")
+    if regla.get('agregado') and regla['agregado'] not in AGREGADOS:
+        raise ReglaInvalida(f"agregado desconocido '{regla['agregado']}' (válidos: {', '.join(AGREGADOS)})")
+    try:
+        valor = float(regla['valor'])
+        enfriamiento = float(regla.get('enfriamiento', ENFRIAMIENTO))
+    except (TypeError, ValueError):
+        raise ReglaInvalida("'valor' y 'enfriamiento' deben ser números")
+    filtro = regla.get('filtro') or {}
+    if not isinstance(filtro, dict):
+        raise ReglaInvalida("'filtro' debe ser un objeto columna -> valor (o lista de valores)")
+
+    normalizada = dict(regla, valor=valor, enfriamiento=enfriamiento, filtro=filtro)
+    normalizada['nombre'] = regla.get('nombre') or describir_regla(normalizada)
+    return normalizada
+
+
+class ReglasCompiladas:
+    """Reglas de alerta en forma de arrays, listas para evaluar sobre cualquier tenencia.
+
+    Las reglas por ticker y las de agregados (suma, promedio, etc. de las filas
+    que pasan el filtro) se compilan por separado pero con la misma estructura.
+    """
+    def __init__(self, reglas):
+        self.reglas = []
+        for i, regla in enumerate(reglas or []):
+            try:
+                self.reglas.append(validar_regla(regla))
+            except ReglaInvalida as e:
+                log.warning("Alerta %d ignorada: %s", i + 1, e)
+
+        self.columnas = list(dict.fromkeys(regla['columna'] for regla in self.reglas))
+        self.columna = np.array([self.columnas.index(regla['columna']) for regla in self.reglas], dtype=np.int64)
+        self.umbral = np.array([regla['valor'] for regla in self.reglas], dtype=float)
+        self.enfriamiento = np.array([regla['enfriamiento'] for regla in self.reglas], dtype=float)
+        self.cruces = np.flatnonzero([regla['operador'] == 'cruza' for regla in self.reglas])
+        self.por_operador = {op: np.flatnonzero([regla['operador'] == op for regla in self.reglas])
+                             for op in OPERADORES}
+        self.por_operador = {op: reglas for op, reglas in self.por_operador.items() if len(reglas)}
+
+        agregado = [regla.get('agregado') for regla in self.reglas]
+        self.agregadas = np.flatnonzero([bool(a) for a in agregado])
+        self.por_ticker = np.flatnonzero([not a for a in agregado])
+        self.por_agregado = {a: np.flatnonzero([x == a for x in agregado]) for a in AGREGADOS}
+
+        # Filtros: por cada columna filtrada, los valores aceptados y una matriz
+        # reglas x valores; una columna extra en False para los valores que no figuran
+        self.filtros = {}
+        for columna in dict.fromkeys(col for regla in self.reglas for col in regla['filtro']):
+            valores = []
+            for regla in self.reglas:
+                aceptados = regla['filtro'].get(columna)
+                if aceptados is not None:
+                    valores.extend(str(v) for v in (aceptados if isinstance(aceptados, list) else [aceptados]))
+            indice = pd.Index(list(dict.fromkeys(valores)))
+            matriz = np.ones((len(self.reglas), len(indice) + 1), dtype=bool)
+            for i, regla in enumerate(self.reglas):
+                aceptados = regla['filtro'].get(columna)
+                if aceptados is not None:
+                    aceptados = [str(v) for v in (aceptados if isinstance(aceptados, list) else [aceptados])]
+                    matriz[i] = False
+                    matriz[i, indice.get_indexer(aceptados)] = True
+            self.filtros[columna] = (indice, matriz)
+
+    def __len__(self):
+        return len(self.reglas)
+
+    def filtro(self, df):
+        """Matriz reglas x filas con las filas que pasa el filtro de cada regla"""
+        mascara = np.ones((len(self.reglas), len(df)), dtype=bool)
+        for columna, (indice, matriz) in self.filtros.items():
+            if columna not in df.columns:
+                # Sin la columna ninguna fila cumple los filtros que la usan
+                mascara &= matriz[:, -1:]
+                continue
+            posiciones = indice.get_indexer(df[columna].astype(str).to_numpy())
+            mascara &= matriz[:, posiciones]  # -1 toma la última columna (valor no aceptado)
+        return mascara
+
+    def valores(self, df):
+        """Matriz columnas x filas (float, NaN si falta o no es numérico)"""
+        valores = np.full((len(self.columnas), len(df)), np.nan)
+        for i, columna in enumerate(self.columnas):
+            if columna in df.columns:
+                valores[i] = pd.to_numeric(df[columna], errors='coerce').to_numpy(dtype=float)
+        return valores
+
+    def condiciones(self, valores, subconjunto, por_regla=False):
+        """Condición de las reglas del subconjunto (matriz reglas x columnas de valores).
+
+        valores es la matriz columnas x filas de valores(), o con por_regla una
+        fila por regla (por ejemplo, los agregados).
+        """
+        condicion = np.zeros((len(self.reglas), valores.shape[1]), dtype=bool)
+        for op, reglas in self.por_operador.items():
+            reglas = reglas[np.isin(reglas, subconjunto)]
+            if len(reglas):
+                filas = valores[reglas] if por_regla else valores[self.columna[reglas]]
+                condicion[reglas] = OPERADORES[op](filas, self.umbral[reglas, None])
+        return condicion
+
+
+def agregar(valores, mascara, reglas_por_agregado):
+    """Agregado de cada regla sobre sus filas filtradas (NaN si no queda ninguna)"""
+    resultado = np.full(len(valores), np.nan)
+    validas = mascara & ~np.isnan(valores)
+    cantidad = validas.sum(axis=1)
+    for agregado, reglas in reglas_por_agregado.items():
+        if not len(reglas):
+            continue
+        if agregado in ('suma', 'promedio'):
+            suma = np.where(validas[reglas], valores[reglas], 0.0).sum(axis=1)
+            resultado[reglas] = suma if agregado == 'suma' else suma / np.maximum(cantidad[reglas], 1)
+        elif agregado == 'maximo':
+            resultado[reglas] = np.where(validas[reglas], valores[reglas], -np.inf).max(axis=1)
+        else:
+            resultado[reglas] = np.where(validas[reglas], valores[reglas], np.inf).min(axis=1)
+    resultado[cantidad == 0] = np.nan
+    return resultado
+
+
+class RegistroAlertas:
+    """Archivo de alertas de solo agregado, una línea JSON por alerta (compartido entre cuentas)"""
+    def __init__(self, archivo=ARCHIVO_ALERTAS):
+        self.archivo = archivo
+        self.lock = threading.Lock()
+
+    def agregar(self, alertas):
+        if not alertas:
+            return
+        lineas = ''.join(json.dumps(alerta, ensure_ascii=False) + '\n' for alerta in alertas)
+        with self.lock, open(self.archivo, 'a', encoding='utf-8') as f:
+            f.write(lineas)
+
+
+class MotorAlertas:
+    """Estado de las alertas de una cuenta: último valor de cada condición y último disparo.
+
+    El estado se guarda en matrices reglas x tickers que crecen cuando aparece
+    un ticker nuevo; los tickers que faltan en una consulta conservan su estado.
+    """
+    def __init__(self, reglas, cuenta='', registro=None, notificar=None):
+        self.reglas = reglas if isinstance(reglas, ReglasCompiladas) else ReglasCompiladas(reglas)
+        self.cuenta = cuenta
+        self.registro = registro
+        self.notificar = notificar  # Se llama con la lista de alertas disparadas (desde el hilo de sondeo)
+        n = len(self.reglas)
+        self.tickers = []
+        self.indice = pd.Index([], dtype=object)
+        self.estado = np.full((n, 0), DESCONOCIDO, dtype=np.int8)
+        self.ultimo_disparo = np.full((n, 0), -np.inf)
+        self.estado_agregado = np.full(n, DESCONOCIDO, dtype=np.int8)
+        self.disparo_agregado = np.full(n, -np.inf)
+
+    def ids_de(self, tickers):
+        ids = self.indice.get_indexer(tickers)
+        nuevos = ids < 0
+        if nuevos.any():
+            altas = list(pd.unique(tickers[nuevos]))
+            self.tickers.extend(altas)
+            self.indice = pd.Index(self.tickers, dtype=object)
+            n = len(self.reglas)
+            self.estado = np.hstack([self.estado, np.full((n, len(altas)), DESCONOCIDO, dtype=np.int8)])
+            self.ultimo_disparo = np.hstack([self.ultimo_disparo, np.full((n, len(altas)), -np.inf)])
+            ids = self.indice.get_indexer(tickers)
+        return ids
+
+    def columnas_de(self, ids):
+        """Índice para las matrices de estado: un slice (vista, sin copia) si los tickers vienen en el orden guardado"""
+        if len(ids) == len(self.tickers) and (ids == np.arange(len(ids))).all():
+            return slice(None)
+        return ids
+
+    def flancos(self, condicion, previo):
+        """Condiciones que acaban de cumplirse (o, para "cruza", que cambiaron de lado)"""
+        flanco = condicion & (previo != 1)
+        cruces = self.reglas.cruces
+        if len(cruces):
+            flanco[cruces] = (previo[cruces] != DESCONOCIDO) & (previo[cruces] != condicion[cruces])
+        return flanco
+
+    def evaluar(self, df, ahora=None):
+        """Evalúa todas las reglas sobre la tenencia; devuelve la lista de alertas disparadas"""
+        if not len(self.reglas) or df.empty:
+            return []
+        ahora = time.time() if ahora is None else ahora
+
+        if 'Nombre de la Especie' in df.columns:
+            df = df[(df['Nombre de la Especie'] != 'TOTALES').to_numpy()]
+        tickers = (df['Ticker'].astype(str).to_numpy(dtype=object) if 'Ticker' in df.columns
+                   else np.array([str(i) for i in range(len(df))], dtype=object))
+
+        valores = self.reglas.valores(df)
+        mascara = self.reglas.filtro(df)
+        alertas = []
+
+        # Reglas por ticker: el enfriamiento solo se mira en los flancos
+        reglas = self.reglas.por_ticker
+        if len(reglas) and len(df):
+            ids = self.ids_de(tickers)
+            if np.bincount(ids).max() > 1:
+                # Tickers repetidos en la tenencia: cada aparición lleva su propio estado (Ticker#1, ...), como en Cartera
+                ids = self.ids_de(claves_unicas(tickers))
+            columnas = self.columnas_de(ids)
+            condicion = self.reglas.condiciones(valores, reglas) & mascara
+            flanco = self.flancos(condicion, self.estado[:, columnas])
+            flanco[self.reglas.agregadas] = False
+            self.estado[:, columnas] = condicion
+            reglas_flanco, filas_flanco = np.nonzero(flanco)
+            enfriadas = (ahora - self.ultimo_disparo[reglas_flanco, ids[filas_flanco]]
+                         >= self.reglas.enfriamiento[reglas_flanco])
+            reglas_flanco, filas_flanco = reglas_flanco[enfriadas], filas_flanco[enfriadas]
+            self.ultimo_disparo[reglas_flanco, ids[filas_flanco]] = ahora
+            for regla, fila in zip(reglas_flanco, filas_flanco):
+                alertas.append(self.alerta(regla, tickers[fila], valores[self.reglas.columna[regla], fila], ahora))
+
+        # Reglas sobre agregados de las filas filtradas
+        reglas = self.reglas.agregadas
+        if len(reglas):
+            agregados = agregar(valores[self.reglas.columna], mascara, self.reglas.por_agregado)
+            condicion = self.reglas.condiciones(agregados[:, None], reglas, por_regla=True)[:, 0]
+            validos = ~np.isnan(agregados)
+            disparos = self.flancos(condicion, self.estado_agregado) & validos
+            disparos &= ahora - self.disparo_agregado >= self.reglas.enfriamiento
+            disparos[self.reglas.por_ticker] = False
+            self.estado_agregado[reglas] = np.where(validos[reglas], condicion[reglas], DESCONOCIDO)
+            for regla in np.flatnonzero(disparos):
+                self.disparo_agregado[regla] = ahora
+                alertas.append(self.alerta(regla, CLAVE_AGREGADO, agregados[regla], ahora))
+
+        if alertas:
+            if self.registro is not None:
+                self.registro.agregar(alertas)
+            if self.notificar is not None:
+                self.notificar(alertas)
+        return alertas
+
+    def alerta(self, regla, ticker, valor, ahora):
+        regla_dict = self.reglas.reglas[regla]
+        return {
+            't': round(ahora, 3),
+            'hora': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ahora)),
+            'cuenta': self.cuenta,
+            'regla': regla_dict['nombre'],
+            'ticker': ticker,
+            'columna': regla_dict['columna'],
+            'valor': None if np.isnan(valor) else round(float(valor), 4),
+            'umbral': regla_dict['valor'],
+        }
+
+
+def texto_alerta(alerta):
+    """Una línea legible para consola o notificaciones"""
+    donde = f"{alerta['cuenta']} " if alerta['cuenta'] else ''
+    sujeto = 'Total' if alerta['ticker'] == CLAVE_AGREGADO else alerta['ticker']
+    return f"[{alerta['hora'][11:]}] {donde}{sujeto}: {alerta['regla']} ({alerta['columna']} = {alerta['valor']})"
@@ -0,0 +1,85 @@
+"""Arranque de la interfaz: splash inmediato y carga diferida de lo pesado.
+
+Solo importa PyQt5 al cargar el módulo; pandas, NumPy y la ventana principal
+se importan después de pintar el splash, y SHDA recién en el pool con el
+primer login. La ventana arranca mostrando la última tenencia guardada en
+disco y la reemplaza por los datos en vivo cuando llegan.
+
+Con medir=True se informan los tiempos desde el inicio del proceso hasta el
+splash, el primer pintado de la ventana y el primer dato en vivo, y se sale.
+"""
+import sys
+import time
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor, QFont, QPixmap
+from PyQt5.QtWidgets import QApplication, QSplashScreen
+
+
+ESPERA_MAXIMA_MEDICION = 60  # Segundos a esperar el primer dato en vivo al medir el arranque
+
+
+class MedicionArranque:
+    """Tiempos de arranque desde inicio (time.perf_counter() al comenzar el proceso)"""
+    def __init__(self, inicio=None):
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self.tiempos = {}  # hito -> segundos desde el inicio, en orden de aparición
+
+    def marcar(self, hito):
+        if hito not in self.tiempos:
+            self.tiempos[hito] = time.perf_counter() - self.inicio
+
+    def informe(self):
+        return '\n'.join(f"{hito:<28} {segundos * 1000:8.0f} ms" for hito, segundos in self.tiempos.items())
+
+
+def crear_splash():
+    pixmap = QPixmap(420, 160)
+    pixmap.fill(QColor('#265A7C'))
+    splash = QSplashScreen(pixmap)
+    splash.setFont(QFont("Arial", 12, QFont.Bold))
+    splash.showMessage("Monitoreo Tenencias IEB+\n\nCargando...", Qt.AlignCenter, Qt.white)
+    return splash
+
+
+def main(medir=False, inicio=None, grabar=None, reproducir=None, velocidad=1.0):
+    medicion = MedicionArranque(inicio)
+    app = QApplication(sys.argv)
+
+    splash = crear_splash()
+    splash.show()
+    app.processEvents()  # Pintar el splash antes de importar pandas y la ventana
+    medicion.marcar('splash')
+
+    from interfaz import InterfazSHDA
+    medicion.marcar('modulos importados')
+
+    ventana = InterfazSHDA(grabar=grabar, reproducir=reproducir, velocidad=velocidad)
+    ventana.show()
+    splash.finish(ventana)
+
+    def primer_pintado():
+        medicion.marcar('primer pintado')
+        if ventana.restauradas:
+            medicion.marcar('instantanea restaurada')
+        ventana.metricas.registrar('arranque_primer_pintado', medicion.tiempos['primer pintado'])
+
+    def primer_dato(nombre):
+        medicion.marcar('primer dato en vivo')
+        ventana.metricas.registrar('arranque_primer_dato', medicion.tiempos['primer dato en vivo'])
+        if medir:
+            terminar_medicion()
+
+    def terminar_medicion():
+        if 'primer dato en vivo' not in medicion.tiempos:
+            print(f"Sin datos en vivo después de {ESPERA_MAXIMA_MEDICION} s")
+        print(medicion.informe())
+        ventana.close()
+
+    # Los eventos de pintado pendientes se procesan antes que este timer
+    QTimer.singleShot(0, primer_pintado)
+    ventana.primeros_datos.connect(primer_dato)
+    if medir:
+        QTimer.singleShot(ESPERA_MAXIMA_MEDICION * 1000, terminar_medicion)
+
+    sys.exit(app.exec_())
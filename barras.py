@@ -0,0 +1,302 @@
+"""Barras OHLC y resultado contra distintas bases sobre el historial intradiario, sin dependencias de interfaz.
+
+Dos estructuras, ambas extendidas con cada consulta en lugar de recorrer el
+día de nuevo:
+
+- Barras de 1, 5 y 15 minutos por (ticker, tamaño): la primera consulta lee
+  la serie del ticker en el historial y las siguientes solo los registros
+  nuevos, que se agregan a la última barra o abren barras nuevas.
+- Precios por minuto de todos los tickers (una columna por minuto con el
+  último precio conocido al final de ese minuto) y el precio de apertura.
+  Al empezar el día (o al arrancar a mitad de la rueda) se cargan una vez
+  desde el historial; después cada consulta escribe una sola columna.
+
+Con los precios por minuto la base de cada ticker (cierre anterior,
+apertura, hace N minutos o una hora elegida) se obtiene para toda la
+tenencia con una indexación vectorizada, así que cambiar de base en la
+interfaz no relee el historial.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+from historial import dia_de
+
+
+log = obtener('barras')
+
+
+TAMANOS_BARRA = (1, 5, 15)  # Minutos
+
+DTYPE_BARRA = np.dtype([('inicio', '<f8'), ('apertura', '<f8'), ('maximo', '<f8'), ('minimo', '<f8'),
+                        ('cierre', '<f8')])
+
+COLUMNAS_BASE = ['Var % Base', 'Resultado Base']
+
+MINUTOS_INICIALES = 64  # Columnas preasignadas de precios por minuto; se duplica al hacer falta
+
+# Tipos de base
+BASE_CIERRE = 'cierre'
+BASE_APERTURA = 'apertura'
+BASE_MINUTOS = 'minutos'
+BASE_HORA = 'hora'
+DESCRIPCION_BASE = {
+    BASE_CIERRE: 'Cierre anterior',
+    BASE_APERTURA: 'Apertura',
+    BASE_MINUTOS: 'Hace N minutos',
+    BASE_HORA: 'Hora elegida',
+}
+MINUTOS_BASE = 30  # N por defecto de "hace N minutos"
+
+
+class BaseComparacion:
+    """Contra qué precio se mide Var % Base y Resultado Base.
+
+    Es inmutable: la interfaz reemplaza la del pipeline por una nueva y cada
+    tenencia recuerda (en df.attrs['base']) con cuál se calculó.
+    """
+    def __init__(self, tipo=BASE_CIERRE, minutos=MINUTOS_BASE, t=None):
+        if tipo not in DESCRIPCION_BASE:
+            raise ValueError(f"Base desconocida: {tipo}")
+        self.tipo = tipo
+        self.minutos = minutos
+        self.t = t  # Para BASE_HORA: time.time() de la hora elegida
+
+    def __eq__(self, otra):
+        return (isinstance(otra, BaseComparacion)
+                and (self.tipo, self.minutos, self.t) == (otra.tipo, otra.minutos, otra.t))
+
+    def __hash__(self):
+        return hash((self.tipo, self.minutos, self.t))
+
+    def descripcion(self):
+        if self.tipo == BASE_MINUTOS:
+            return f"Hace {self.minutos} min"
+        if self.tipo == BASE_HORA and self.t is not None:
+            return f"A las {time.strftime('%H:%M', time.localtime(self.t))}"
+        return DESCRIPCION_BASE[self.tipo]
+
+
+def agrupar_barras(t, precios, minutos):
+    """Barras OHLC de una serie ordenada por tiempo, vectorizadas"""
+    if not len(t):
+        return np.zeros(0, dtype=DTYPE_BARRA)
+    segundos = minutos * 60
+    inicios = np.floor(t / segundos) * segundos
+    cortes = np.flatnonzero(np.r_[True, inicios[1:] != inicios[:-1]])
+    ultimos = np.r_[cortes[1:] - 1, len(t) - 1]
+
+    barras = np.empty(len(cortes), dtype=DTYPE_BARRA)
+    barras['inicio'] = inicios[cortes]
+    barras['apertura'] = precios[cortes]
+    barras['maximo'] = np.maximum.reduceat(precios, cortes)
+    barras['minimo'] = np.minimum.reduceat(precios, cortes)
+    barras['cierre'] = precios[ultimos]
+    return barras
+
+
+class BarrasTicker:
+    """Barras de un ticker y un tamaño, con la cantidad de registros del historial ya incorporados"""
+    def __init__(self, minutos):
+        self.minutos = minutos
+        self.barras = np.zeros(0, dtype=DTYPE_BARRA)
+        self.leidos = 0
+
+    def extender(self, registros):
+        """Incorpora registros nuevos (en orden): completan la última barra o agregan barras"""
+        if not len(registros):
+            return
+        nuevas = agrupar_barras(registros['t'], registros['precio'], self.minutos)
+        self.leidos += len(registros)
+        if len(self.barras) and nuevas['inicio'][0] == self.barras['inicio'][-1]:
+            ultima = self.barras[-1]
+            ultima['maximo'] = max(ultima['maximo'], nuevas['maximo'][0])
+            ultima['minimo'] = min(ultima['minimo'], nuevas['minimo'][0])
+            ultima['cierre'] = nuevas['cierre'][0]
+            nuevas = nuevas[1:]
+        if len(nuevas):
+            self.barras = np.concatenate([self.barras, nuevas])
+
+
+class PreciosPorMinuto:
+    """Último precio de cada ticker al final de cada minuto del día, y su apertura"""
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self, dia=None):
+        self.dia = dia
+        self.tickers = []
+        self.indice = pd.Index([], dtype=object)
+        self.apertura = np.zeros(0)
+        self.precios = np.full((0, MINUTOS_INICIALES), np.nan)  # Tickers x minutos
+        self.minutos = np.zeros(0, dtype=np.int64)  # Minuto (t // 60) de cada columna usada
+
+    def ids_de(self, tickers):
+        ids = self.indice.get_indexer(tickers)
+        nuevos = ids < 0
+        if nuevos.any():
+            altas = list(pd.unique(tickers[nuevos]))
+            self.tickers.extend(altas)
+            self.indice = pd.Index(self.tickers, dtype=object)
+            self.apertura = np.concatenate([self.apertura, np.full(len(altas), np.nan)])
+            self.precios = np.vstack([self.precios, np.full((len(altas), self.precios.shape[1]), np.nan)])
+            ids = self.indice.get_indexer(tickers)
+        return ids
+
+    def columna_para(self, minuto):
+        """Columna del minuto: la última si es el mismo, o una nueva que arranca con los precios anteriores"""
+        usadas = len(self.minutos)
+        if usadas and minuto <= self.minutos[-1]:
+            return usadas - 1
+        if usadas == self.precios.shape[1]:
+            self.precios = np.hstack([self.precios, np.full_like(self.precios, np.nan)])
+        if usadas:
+            self.precios[:, usadas] = self.precios[:, usadas - 1]
+        self.minutos = np.append(self.minutos, minuto)
+        return usadas
+
+    def registrar(self, t, tickers, precios):
+        validos = np.isfinite(precios) & (precios > 0)
+        ids = self.ids_de(tickers[validos])
+        precios = precios[validos]
+        self.precios[ids, self.columna_para(int(t // 60))] = precios
+        sin_apertura = np.isnan(self.apertura[ids])
+        self.apertura[ids[sin_apertura]] = precios[sin_apertura]
+
+    def cargar(self, tickers, ids, registros):
+        """Arma los precios por minuto de una vez desde los registros del historial del día"""
+        if not len(registros):
+            return
+        orden = np.lexsort((registros['t'], ids))
+        ids = ids[orden]
+        t = registros['t'][orden]
+        precios = registros['precio'][orden]
+        filas = self.ids_de(np.asarray(tickers, dtype=object)[ids])
+
+        minuto = (t // 60).astype(np.int64)
+        self.minutos = np.unique(minuto)
+        columnas = np.searchsorted(self.minutos, minuto)
+        capacidad = max(MINUTOS_INICIALES, 2 * len(self.minutos))
+        self.precios = np.full((len(self.tickers), capacidad), np.nan)
+
+        # Último registro de cada (ticker, minuto) y primero de cada ticker
+        ultimo = np.r_[(ids[1:] != ids[:-1]) | (columnas[1:] != columnas[:-1]), True]
+        self.precios[filas[ultimo], columnas[ultimo]] = precios[ultimo]
+        primero = np.r_[True, ids[1:] != ids[:-1]]
+        self.apertura[filas[primero]] = precios[primero]
+
+        # Los minutos sin registro de un ticker repiten su último precio
+        usados = self.precios[:, :len(self.minutos)]
+        posiciones = np.where(np.isnan(usados), 0, np.arange(usados.shape[1]))
+        np.maximum.accumulate(posiciones, axis=1, out=posiciones)
+        self.precios[:, :len(self.minutos)] = np.take_along_axis(usados, posiciones, axis=1)
+
+    def precio_en(self, tickers, t):
+        """Último precio de cada ticker al final del minuto de t (NaN si todavía no había)"""
+        resultado = np.full(len(tickers), np.nan)
+        columna = np.searchsorted(self.minutos, int(t // 60), side='right') - 1
+        if columna < 0:
+            return resultado
+        ids = self.indice.get_indexer(tickers)
+        encontrados = ids >= 0
+        resultado[encontrados] = self.precios[ids[encontrados], columna]
+        return resultado
+
+    def apertura_de(self, tickers):
+        resultado = np.full(len(tickers), np.nan)
+        ids = self.indice.get_indexer(tickers)
+        encontrados = ids >= 0
+        resultado[encontrados] = self.apertura[ids[encontrados]]
+        return resultado
+
+
+class ConsultasIntradiarias:
+    """Barras por (ticker, tamaño) y precios base para toda la tenencia, sobre el historial de una cuenta.
+
+    registrar se llama desde el hilo de sondeo con cada consulta; barras y
+    precios_base se pueden llamar desde la interfaz al mismo tiempo.
+    """
+    def __init__(self, historial=None):
+        self.historial = historial  # historial.HistorialIntradiario, o None (sin barras ni carga inicial)
+        self.por_minuto = PreciosPorMinuto()
+        self.cache = {}  # (ticker, minutos) -> BarrasTicker
+        self.lock = threading.Lock()
+
+    def asegurar_dia(self, t):
+        """Al cambiar el día se descartan los cachés y se cargan los precios ya registrados hoy"""
+        dia = dia_de(t)
+        if dia == self.por_minuto.dia:
+            return
+        self.por_minuto.reiniciar(dia)
+        self.cache = {}
+        if self.historial is not None:
+            tickers, ids, registros = self.historial.registros_del_dia(dia)
+            self.por_minuto.cargar(tickers, ids, registros)
+            if len(registros):
+                log.info("Precios por minuto cargados desde el historial (%d registros)", len(registros))
+
+    def registrar(self, t, tickers, precios):
+        """Agrega los precios de una consulta"""
+        with self.lock:
+            self.asegurar_dia(t)
+            self.por_minuto.registrar(t, tickers, precios)
+
+    def barras(self, ticker, minutos=1):
+        """Barras OHLC del día del ticker (array con inicio, apertura, maximo, minimo, cierre)"""
+        if minutos not in TAMANOS_BARRA:
+            raise ValueError(f"Tamaño de barra no soportado: {minutos} (se admite {TAMANOS_BARRA})")
+        with self.lock:
+            self.asegurar_dia(time.time())
+            clave = (ticker, minutos)
+            barras = self.cache.get(clave)
+            if barras is None:
+                barras = self.cache[clave] = BarrasTicker(minutos)
+            if self.historial is not None:
+                barras.extender(self.historial.serie(ticker, desde=barras.leidos))
+            return barras.barras.copy()
+
+    def precios_base(self, tickers, base, ahora=None, cierres=None):
+        """Precio base de cada ticker según la base elegida (NaN donde no hay).
+
+        cierres es la base del cierre anterior (DataFrame indexado por Ticker
+        con PCIO_anterior, ver normalizacion.CacheAnterior).
+        """
+        ahora = time.time() if ahora is None else ahora
+        if base.tipo == BASE_CIERRE:
+            resultado = np.full(len(tickers), np.nan)
+            if cierres is not None and not cierres.empty:
+                posiciones = cierres.index.get_indexer(tickers)
+                encontrados = posiciones >= 0
+                resultado[encontrados] = cierres['PCIO_anterior'].to_numpy()[posiciones[encontrados]]
+            return resultado
+
+        with self.lock:
+            self.asegurar_dia(ahora)
+            if base.tipo == BASE_APERTURA:
+                return self.por_minuto.apertura_de(tickers)
+            t = ahora - base.minutos * 60 if base.tipo == BASE_MINUTOS else base.t
+            if t is None:
+                return np.full(len(tickers), np.nan)
+            return self.por_minuto.precio_en(tickers, t)
+
+    def columnas_base(self, tickers, precios, importes, base=None, ahora=None, cierres=None):
+        """Var % Base y Resultado Base de toda la tenencia (base None es el cierre anterior)"""
+        base = base if base is not None else BaseComparacion()
+        return columnas_contra_base(precios, importes, self.precios_base(tickers, base, ahora, cierres))
+
+
+def columnas_contra_base(precios, importes, bases):
+    """Var % Base y Resultado Base: variación del precio y su efecto sobre el importe actual.
+
+    El resultado se calcula sobre el importe (importe * (precio - base) / precio)
+    para respetar cómo cotiza cada instrumento (por ejemplo, bonos cada 100).
+    """
+    validos = np.isfinite(bases) & (bases > 0) & (precios > 0)
+    variacion = np.full(len(precios), np.nan)
+    resultado = np.full(len(precios), np.nan)
+    np.divide(precios - bases, bases, out=variacion, where=validos)
+    np.divide(importes * (precios - bases), precios, out=resultado, where=validos)
+    return {'Var % Base': (variacion * 100).round(2), 'Resultado Base': resultado.round(2)}
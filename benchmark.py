@@ -0,0 +1,252 @@
+"""Benchmark del ciclo de actualización con un SHDA simulado.
+
+Mide, para carteras de distinto tamaño, el tiempo y el pico de memoria de
+cada etapa de normalización, del diff entre instantáneas y del llenado de
+TablaDataFrame (Qt en modo offscreen).
+
+    python benchmark.py
+    python benchmark.py --tamanos 100 1000 --repeticiones 50 --sin-tabla
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from cierres import AlmacenCierres
+from diferencias import diferenciar_instantaneas
+from historial import HistorialIntradiario
+from normalizacion import CacheAnterior, PipelineTenencias
+
+
+TAMANOS = [10, 100, 1000, 10000]
+
+ESTADOS_OPERACION = ['Concertada', 'Parcial', 'Pendiente', 'Cancelada']
+
+
+class SHDASimulado:
+    """Reemplazo de SHDA.SHDA cuyo account() devuelve una tenencia sintética.
+
+    Cada llamada mueve aleatoriamente una parte de los precios y de las
+    operaciones del día, como haría el mercado entre dos consultas.
+    """
+    def __init__(self, host=None, dni=None, user=None, password=None, cantidad=100, semilla=0,
+                 fraccion_cambios=0.1, hora='CONTINUO'):
+        self.rng = np.random.default_rng(semilla)
+        self.cantidad = cantidad
+        self.fraccion_cambios = fraccion_cambios
+        self.hora = hora
+
+        # Tickers únicos de 3 a 6 letras
+        generador = random.Random(semilla)
+        tickers = set()
+        while len(tickers) < cantidad:
+            tickers.add(''.join(generador.choices(string.ascii_uppercase, k=generador.randint(3, 6))))
+        self.tickers = np.array(sorted(tickers), dtype=object)
+
+        self.tipos = self.rng.integers(0, 8, cantidad)
+        self.cantidades = self.rng.integers(1, 5000, cantidad)
+        self.precios = np.round(self.rng.lognormal(6, 1.5, cantidad), 2)
+        self.costos = np.round(self.precios * self.rng.uniform(0.7, 1.3, cantidad), 2)
+        self.operaciones = [[] for _ in range(cantidad)]
+
+    def nueva_operacion(self, i):
+        cantidad = int(self.rng.integers(1, 500)) * (1 if self.rng.random() < 0.5 else -1)
+        precio = float(self.precios[i])
+        return {'DETA': ESTADOS_OPERACION[int(self.rng.integers(0, len(ESTADOS_OPERACION)))],
+                'IMPO': f"{-cantidad * precio:.2f}", 'CANT': str(cantidad), 'PCIO': f"{precio:.2f}"}
+
+    def tick(self):
+        """Mueve precios y agrega operaciones en una fracción de los tickers"""
+        cambios = self.rng.random(self.cantidad) < self.fraccion_cambios
+        self.precios[cambios] = np.round(
+            self.precios[cambios] * (1 + self.rng.normal(0, 0.002, int(cambios.sum()))), 2)
+
+        for i in np.flatnonzero(self.rng.random(self.cantidad) < self.fraccion_cambios / 10):
+            self.operaciones[i].append(self.nueva_operacion(i))
+
+    def account(self, comitente):
+        self.tick()
+
+        importes = np.round(self.precios * self.cantidades, 2)
+        filas = {
+            'TICK': self.tickers,
+            'AMPL': np.array([f"Especie {t}" for t in self.tickers], dtype=object),
+            'CANT': self.cantidades.astype(str),
+            'PCIO': self.precios.astype(str),
+            'GTOS': np.round((self.precios - self.costos) * self.cantidades, 2).astype(str),
+            'CAN0': self.costos.astype(str),
+            'CAN2': np.zeros(self.cantidad).astype(str),
+            'CAN3': np.round((self.precios / self.costos - 1) * 100, 2).astype(str),
+            'IMPO': importes.astype(str),
+            'TIPO': self.tipos.astype(str),
+            'ESPE': np.full(self.cantidad, 'Titulo', dtype=object),
+            'Hora': np.full(self.cantidad, self.hora, dtype=object),
+            'Detalle': np.array([str(ops) if ops else '' for ops in self.operaciones], dtype=object),
+        }
+        df = pd.DataFrame(filas)
+
+        # Dólar y efectivo, que el pipeline trata de forma especial
+        extra = pd.DataFrame([
+            {'TICK': 'DOLARUSA', 'AMPL': 'Dolar MEP', 'CANT': '100', 'PCIO': '1200.00', 'GTOS': '0',
+             'CAN0': '0', 'CAN2': '0', 'CAN3': '0', 'IMPO': '120000.00', 'TIPO': '4', 'ESPE': 'Titulo',
+             'Hora': self.hora, 'Detalle': ''},
+            {'TICK': 'ARS', 'AMPL': 'Pesos', 'CANT': '1', 'PCIO': '1', 'GTOS': '0', 'CAN0': '0',
+             'CAN2': '0', 'CAN3': '0', 'IMPO': '250000.00', 'TIPO': '9', 'ESPE': 'Cash',
+             'Hora': self.hora, 'Detalle': ''},
+        ])
+        return pd.concat([df, extra], ignore_index=True)
+
+
+class Medicion:
+    """Acumula tiempos (segundos) y pico de memoria (bytes) por etapa"""
+    def __init__(self):
+        self.tiempos = {}
+        self.picos = {}
+
+    def tiempo(self, etapa, segundos):
+        self.tiempos.setdefault(etapa, []).append(segundos)
+
+    def pico(self, etapa, bytes_pico):
+        self.picos[etapa] = max(self.picos.get(etapa, 0), bytes_pico)
+
+
+def medir_pipeline(pipeline, datos, medicion, con_memoria=False):
+    """Ejecuta el pipeline etapa por etapa registrando tiempo o memoria"""
+    etapas = [('construir', pipeline.construir)] + pipeline.etapas
+    valor = datos
+    for nombre, etapa in etapas:
+        if con_memoria:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            valor = etapa(valor)
+            medicion.pico(nombre, tracemalloc.get_traced_memory()[1] - base)
+        else:
+            inicio = time.perf_counter()
+            valor = etapa(valor)
+            medicion.tiempo(nombre, time.perf_counter() - inicio)
+    return valor
+
+
+def medir_etapa(medicion, nombre, funcion, con_memoria=False):
+    if con_memoria:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        resultado = funcion()
+        medicion.pico(nombre, tracemalloc.get_traced_memory()[1] - base)
+        return resultado
+
+    inicio = time.perf_counter()
+    resultado = funcion()
+    medicion.tiempo(nombre, time.perf_counter() - inicio)
+    return resultado
+
+
+def crear_tabla():
+    """Crea una TablaDataFrame offscreen; devuelve None si PyQt5 no está disponible"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from interfaz import TablaDataFrame
+    except ImportError as e:
+        print(f"Sin medición de tabla: {e}")
+        return None
+
+    app = QApplication.instance() or QApplication([])
+    tabla = TablaDataFrame()
+    tabla.resize(1500, 900)
+    tabla.app = app  # Mantener viva la aplicación mientras exista la tabla
+    return tabla
+
+
+def medir_tamano(cantidad, repeticiones, directorio, con_tabla):
+    """Corre el ciclo completo repeticiones veces para una cartera de cantidad tickers"""
+    hb = SHDASimulado(cantidad=cantidad)
+
+    # Cierre de ayer para que las variaciones diarias tengan contra qué compararse
+    almacen = AlmacenCierres(os.path.join(directorio, f"cierres_{cantidad}"))
+    almacen.guardar(hb.account(0), time.time() - 86400)
+    cache_anterior = CacheAnterior(os.path.join(directorio, 'sin_anterior.json'), almacen)
+    pipeline = PipelineTenencias(cache_anterior=cache_anterior, guardar_cierre=False)
+
+    historial = HistorialIntradiario(os.path.join(directorio, f"historial_{cantidad}"))
+    inicio_sesion = time.time()
+    tabla = crear_tabla() if con_tabla else None
+    medicion = Medicion()
+    anterior = None
+
+    for repeticion in range(repeticiones + 1):
+        # La primera vuelta calienta cachés (baseline, imports) y no se cuenta
+        medicion_vuelta = medicion if repeticion else Medicion()
+
+        datos = medir_etapa(medicion_vuelta, 'account (simulado)', lambda: hb.account(0))
+        df = medir_pipeline(pipeline, datos, medicion_vuelta)
+
+        medir_etapa(medicion_vuelta, 'historial', lambda: historial.registrar(df, inicio_sesion + repeticion))
+
+        if anterior is not None:
+            medir_etapa(medicion_vuelta, 'diff', lambda: diferenciar_instantaneas(anterior, df))
+        anterior = df
+
+        if tabla is not None:
+            operaciones = pipeline.operaciones.actual
+            if repeticion == 0:
+                # La carga inicial es un reset completo del modelo: se registra aparte
+                medir_etapa(medicion, 'tabla (carga inicial)', lambda: tabla.actualizar_df(df, operaciones))
+            else:
+                medir_etapa(medicion_vuelta, 'tabla (incremental)', lambda: tabla.actualizar_df(df, operaciones))
+            medir_etapa(medicion_vuelta, 'tabla (pintado)', tabla.grab)
+
+    # Pasada aparte con tracemalloc, que distorsiona los tiempos
+    tracemalloc.start()
+    try:
+        datos = medir_etapa(medicion, 'account (simulado)', lambda: hb.account(0), con_memoria=True)
+        df = medir_pipeline(pipeline, datos, medicion, con_memoria=True)
+        medir_etapa(medicion, 'diff', lambda: diferenciar_instantaneas(anterior, df), con_memoria=True)
+        if tabla is not None:
+            medir_etapa(medicion, 'tabla (incremental)', lambda: tabla.actualizar_df(df, pipeline.operaciones.actual),
+                        con_memoria=True)
+    finally:
+        tracemalloc.stop()
+        historial.cerrar()
+
+    return medicion
+
+
+def imprimir_resultados(cantidad, medicion):
+    print(f"\n=== {cantidad} tenencias ===")
+    print(f"{'Etapa':<24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'pico KiB':>12}")
+    total = 0.0
+    for etapa, tiempos in medicion.tiempos.items():
+        ms = np.array(tiempos) * 1000
+        pico = medicion.picos.get(etapa)
+        pico_txt = f"{pico / 1024:,.0f}" if pico is not None else '-'
+        print(f"{etapa:<24}{np.percentile(ms, 50):>10.3f}{np.percentile(ms, 95):>10.3f}{ms.max():>10.3f}{pico_txt:>12}")
+        if not etapa.startswith(('account', 'tabla (carga')):
+            total += np.percentile(ms, 50)
+    print(f"{'Total procesamiento':<24}{total:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del ciclo de actualización con SHDA simulado")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS,
+                        help="Cantidades de tenencias a medir")
+    parser.add_argument('--repeticiones', type=int, default=20,
+                        help="Consultas medidas por tamaño")
+    parser.add_argument('--sin-tabla', action='store_true',
+                        help="No medir TablaDataFrame (no requiere PyQt5)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for cantidad in args.tamanos:
+            medicion = medir_tamano(cantidad, args.repeticiones, directorio, not args.sin_tabla)
+            imprimir_resultados(cantidad, medicion)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Bitácora de mensajes (logging) con escritura en segundo plano, sin dependencias de interfaz.
+
+Cada componente usa su propio logger (shda.<componente>, ver obtener). Los
+mensajes no se escriben en el hilo que los genera: un QueueHandler los deja en
+una cola y un único hilo (QueueListener) los formatea y los escribe en la
+consola y en un archivo rotativo. El formateo (incluidas las trazas de las
+excepciones) también ocurre en ese hilo.
+
+Antes de entrar en la cola, los mensajes repetidos se limitan: de un mismo
+mensaje (logger, nivel, formato y argumentos) pasan MAX_REPETIDOS por
+VENTANA_REPETIDOS segundos, y el siguiente que pasa indica cuántos se
+omitieron. El nivel de cada componente sale de config.json:
+
+    "nivel_log": "INFO",
+    "niveles_log": {"normalizacion": "WARNING", "cuentas": "DEBUG"}
+
+Un mensaje de un nivel deshabilitado cuesta solo la comparación de niveles
+del logger: los mensajes por consulta van en DEBUG con argumentos %s, así que
+en régimen no se arma ningún texto.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+
+RAIZ = 'shda'
+
+ARCHIVO_LOG = 'shda.log'
+MAX_BYTES_LOG = 5 * 1024 * 1024
+ARCHIVOS_LOG = 5  # Archivos rotados que se conservan (shda.log.1 ... shda.log.5)
+NIVEL_LOG = 'INFO'
+
+VENTANA_REPETIDOS = 60.0  # Segundos
+MAX_REPETIDOS = 3  # Copias de un mismo mensaje por ventana antes de omitirlo
+MAX_MENSAJES_DISTINTOS = 1000  # Al superarlo se olvidan los mensajes con la ventana vencida
+
+FORMATO_ARCHIVO = '%(asctime)s %(levelname)s %(name)s [%(processName)s %(threadName)s] %(message)s'
+FORMATO_CONSOLA = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+FORMATO_HORA_CONSOLA = '%H:%M:%S'
+
+_listener = None
+_manejador = None
+_lock = threading.Lock()
+_cola_procesos = None  # Mensajes de los procesos del motor (ver cola_procesos)
+_listener_procesos = None
+
+
+def obtener(componente):
+    """Logger de un componente (por ejemplo, obtener('normalizacion') -> shda.normalizacion)"""
+    return logging.getLogger(f"{RAIZ}.{componente}")
+
+
+def clave_argumento(arg):
+    """Argumento de un mensaje como parte de la clave de repetidos, sin guardar el objeto"""
+    if arg is None or isinstance(arg, (str, int, float)):
+        return arg
+    return (type(arg).__name__, str(arg))
+
+
+class FiltroRepetidos(logging.Filter):
+    """Deja pasar MAX_REPETIDOS copias de cada mensaje por ventana y cuenta las omitidas.
+
+    Un mensaje se repite si coinciden logger, nivel, formato y argumentos: dos
+    alertas distintas con el mismo formato no se omiten entre sí. La clave no
+    formatea el mensaje completo: los argumentos simples (texto y números)
+    entran tal cual y los demás (excepciones, por ejemplo) por tipo y texto,
+    así que dos excepciones iguales cuentan como repetidas y la clave no
+    retiene objetos vivos. Solo llegan acá los mensajes de niveles habilitados.
+    """
+    def __init__(self, ventana=VENTANA_REPETIDOS, maximo=MAX_REPETIDOS, reloj=time.monotonic):
+        super().__init__()
+        self.ventana = ventana
+        self.maximo = maximo
+        self.reloj = reloj
+        self.estado = {}  # clave -> [inicio de la ventana, pasados, omitidos]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        args = record.args if isinstance(record.args, tuple) else (record.args,)
+        clave = (record.name, record.levelno, str(record.msg), tuple(clave_argumento(arg) for arg in args))
+        ahora = self.reloj()
+        with self.lock:
+            if len(self.estado) > MAX_MENSAJES_DISTINTOS:
+                self.estado = {k: v for k, v in self.estado.items() if ahora - v[0] < self.ventana}
+            estado = self.estado.get(clave)
+            if estado is None or ahora - estado[0] >= self.ventana:
+                omitidos = estado[2] if estado is not None else 0
+                self.estado[clave] = [ahora, 1, 0]
+            elif estado[1] < self.maximo:
+                estado[1] += 1
+                omitidos = 0
+            else:
+                estado[2] += 1
+                return False
+        if omitidos:
+            record.omitidos = omitidos
+        return True
+
+
+class FormatoConOmitidos(logging.Formatter):
+    """Agrega al mensaje cuántas copias se omitieron desde la última que pasó"""
+    def format(self, record):
+        texto = super().format(record)
+        omitidos = getattr(record, 'omitidos', 0)
+        if omitidos:
+            texto += f" (+{omitidos} repetidos omitidos)"
+        return texto
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que genera el mensaje: lo hace el hilo escritor"""
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+def nivel(nombre, por_defecto=logging.INFO):
+    if isinstance(nombre, int):
+        return nombre
+    valor = logging.getLevelName(str(nombre).upper())
+    if not isinstance(valor, int):
+        print(f"Nivel de log desconocido: {nombre}", file=sys.stderr)
+        return por_defecto
+    return valor
+
+
+def configurar(config=None, consola=True):
+    """Aplica los niveles de config.json y arranca (o reinicia) el hilo escritor.
+
+    Se puede llamar de nuevo para cambiar niveles o archivo: los mensajes ya
+    encolados se escriben antes de cambiar de destino.
+    """
+    global _listener, _manejador
+    config = config or {}
+    raiz = logging.getLogger(RAIZ)
+
+    with _lock:
+        manejadores = []
+        if consola:
+            en_consola = logging.StreamHandler(sys.stderr)
+            en_consola.setFormatter(FormatoConOmitidos(FORMATO_CONSOLA, FORMATO_HORA_CONSOLA))
+            manejadores.append(en_consola)
+        archivo = config.get('archivo_log', ARCHIVO_LOG)
+        if archivo:
+            try:
+                en_archivo = logging.handlers.RotatingFileHandler(archivo, maxBytes=MAX_BYTES_LOG,
+                                                                  backupCount=ARCHIVOS_LOG, encoding='utf-8',
+                                                                  delay=True)
+                en_archivo.setFormatter(FormatoConOmitidos(FORMATO_ARCHIVO))
+                manejadores.append(en_archivo)
+            except OSError as e:
+                print(f"No se pudo abrir el archivo de log {archivo}: {e}", file=sys.stderr)
+
+        detener()
+        cola = queue.SimpleQueue()
+        _manejador = ManejadorCola(cola)
+        _manejador.addFilter(FiltroRepetidos())
+        _listener = logging.handlers.QueueListener(cola, *manejadores, respect_handler_level=True)
+        _listener.start()
+
+        raiz.handlers[:] = [_manejador]
+        raiz.propagate = False
+        raiz.setLevel(nivel(config.get('nivel_log', NIVEL_LOG)))
+        for nombre, logger in list(logging.Logger.manager.loggerDict.items()):
+            if nombre.startswith(RAIZ + '.') and isinstance(logger, logging.Logger):
+                logger.setLevel(logging.NOTSET)  # Sin nivel propio, hereda el de la raíz
+        for componente, nivel_componente in (config.get('niveles_log') or {}).items():
+            obtener(componente).setLevel(nivel(nivel_componente))
+
+
+class ReenvioLocal(logging.Handler):
+    """Pasa los mensajes de otro proceso a los loggers de este, con sus filtros y destinos"""
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def cola_procesos():
+    """Cola por la que los procesos del motor mandan sus mensajes; se crea y se escucha la primera vez"""
+    global _cola_procesos, _listener_procesos
+    with _lock:
+        if _cola_procesos is None:
+            import multiprocessing
+            _cola_procesos = multiprocessing.get_context('spawn').Queue()
+            _listener_procesos = logging.handlers.QueueListener(_cola_procesos, ReenvioLocal())
+            _listener_procesos.start()
+        return _cola_procesos
+
+
+def configurar_proceso(cola, config=None):
+    """En un proceso del motor: los mensajes van a la cola del proceso de la interfaz, con los mismos niveles.
+
+    Acá se usa el QueueHandler estándar, que formatea antes de encolar: el
+    mensaje tiene que poder viajar entre procesos (sin objetos ni trazas vivas).
+    """
+    config = config or {}
+    raiz = logging.getLogger(RAIZ)
+    raiz.handlers[:] = [logging.handlers.QueueHandler(cola)]
+    raiz.propagate = False
+    raiz.setLevel(nivel(config.get('nivel_log', NIVEL_LOG)))
+    for componente, nivel_componente in (config.get('niveles_log') or {}).items():
+        obtener(componente).setLevel(nivel(nivel_componente))
+
+
+def detener():
+    """Escribe los mensajes pendientes y detiene el hilo escritor"""
+    global _listener, _manejador, _listener_procesos, _cola_procesos
+    if _listener_procesos is not None:
+        _listener_procesos.stop()
+        _listener_procesos = None
+        _cola_procesos.close()
+        _cola_procesos.join_thread()
+        _cola_procesos = None
+    if _listener is not None:
+        _listener.stop()
+        for manejador in _listener.handlers:
+            manejador.close()
+        _listener = None
+    if _manejador is not None:
+        logging.getLogger(RAIZ).removeHandler(_manejador)
+        _manejador = None
+
+
+atexit.register(detener)
@@ -0,0 +1,302 @@
+"""Tenencia en un contenedor tipado y preasignado, actualizado en el lugar en cada consulta.
+
+Cada ticker tiene una fila fija de un array estructurado de NumPy (números en
+float64, TIPO como código entero chico y textos como objetos), ubicada por un
+índice ticker -> fila. Cada respuesta de SHDA se escribe sobre esas filas; el
+array solo crece (al doble) cuando aparecen tickers nuevos, así que en
+régimen no se arma ningún DataFrame intermedio por etapa.
+
+Qué columna cruda va a qué campo, y con qué conversión, se decide una sola
+vez por esquema (el conjunto de columnas de la respuesta) en un
+PlanNormalizacion que queda guardado; si el broker cambia el esquema se
+compila otro plan una vez y se avisa.
+
+Los totales se llevan aparte, fuera de las filas de datos. Recién al final
+se arma el DataFrame que se muestra, con la fila TOTALES agregada sin cambiar
+el tipo de ninguna columna: las numéricas siguen siendo float64 de punta a
+punta (NaN donde no hay valor) y TIPO es una columna categórica.
+"""
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+
+
+log = obtener('cartera')
+
+
+CAPACIDAD_INICIAL = 256  # Filas preasignadas; se duplica al hacer falta
+
+COLUMNAS_RENOMBRAR = {
+    "AMPL": "Nombre de la Especie",
+    "TICK": "Ticker",
+    "CANT": "Cantidad",
+    "Hora": "Hora",
+    "PCIO": "Ultimo Precio",
+    "GTOS": "Resultado",
+    "CAN0": "Costo Promedio",
+    "CAN2": "Sabe Dios",
+    "CAN3": "% Var Total",
+    "IMPO": "Importe Actual",
+    "Detalle": "Detalle de operaciones diarias",
+}
+
+# Columnas que se redondean a 2 decimales al leer la respuesta
+COLUMNAS_NUMERICAS = ['Ultimo Precio', 'Resultado', 'Costo Promedio', '% Var Total', 'Importe Actual']
+
+CAMPOS_NUMERICOS = ['Cantidad', 'Ultimo Precio', 'Resultado', 'Costo Promedio', 'Sabe Dios', '% Var Total',
+                    'Importe Actual', 'Actual en U$S', '% Diario', 'Resultado del dia', 'Var % Base', 'Resultado Base',
+                    'Operaciones', 'Cant. Operada', 'Neto Operado', 'VWAP',
+                    'Máx. Día', 'Mín. Día', 'Var % Ventana', 'Volatilidad', 'Tendencia']
+CAMPOS_TEXTO = ['Nombre de la Especie', 'Ticker', 'Hora', 'Detalle de operaciones diarias']
+
+DTYPE_CARTERA = np.dtype([(campo, '<f8') for campo in CAMPOS_NUMERICOS] + [('TIPO', '<i2')]
+                         + [(campo, 'O') for campo in CAMPOS_TEXTO])
+
+TIPO_ACTIVO = {
+    '0': 'Acciones', '1': 'Bonos', '2': 'Panel General', '3': 'ON',
+    '4': 'Dolar USA', '5': 'Opciones', '6': 'Letras', '7': 'Cedear'
+}
+TIPO_EFECTIVO = 'Efectivo'  # Filas con ESPE == 'Cash', sin importar el código
+CODIGO_EFECTIVO = len(TIPO_ACTIVO)
+SIN_TIPO = -1
+
+# Columnas que se suman en la fila TOTALES
+COLUMNAS_TOTALES = ['Resultado', 'Importe Actual', 'Actual en U$S', 'Resultado del dia', 'Resultado Base',
+                    'Neto Operado']
+
+
+def fila_vacia():
+    """Registro con NaN en los números, sin TIPO y textos vacíos, para las filas nuevas"""
+    fila = np.zeros((), dtype=DTYPE_CARTERA)
+    for campo in CAMPOS_NUMERICOS:
+        fila[campo] = np.nan
+    fila['TIPO'] = SIN_TIPO
+    for campo in CAMPOS_TEXTO:
+        fila[campo] = ''
+    return fila
+
+
+class PlanNormalizacion:
+    """Cómo escribir una respuesta de un esquema dado (columnas crudas, en orden) en la Cartera.
+
+    copias tiene (columna cruda, campo, es_texto, redondear) por cada columna
+    conocida presente; presentes son los campos que esa respuesta completa.
+    """
+    def __init__(self, esquema):
+        self.esquema = esquema
+        columnas = set(esquema)
+        self.copias = [(origen, destino, destino in CAMPOS_TEXTO, destino in COLUMNAS_NUMERICAS)
+                       for origen, destino in COLUMNAS_RENOMBRAR.items() if origen in columnas]
+        self.con_ticker = 'TICK' in columnas
+        self.con_tipo = 'TIPO' in columnas
+        self.con_especie = 'ESPE' in columnas
+        self.presentes = frozenset([destino for _, destino, _, _ in self.copias] + (['TIPO'] if self.con_tipo else []))
+        self.ignoradas = [col for col in esquema if col not in COLUMNAS_RENOMBRAR and col not in ('TIPO', 'ESPE')]
+
+    def aplicar(self, df, datos, ids):
+        """Escribe las columnas de la respuesta en las filas ids de datos"""
+        for origen, destino, es_texto, redondear in self.copias:
+            columna = df[origen]
+            if es_texto:
+                datos[destino][ids] = columna.to_numpy(dtype=object)
+                continue
+            if columna.dtype.kind in 'fiub':
+                valores = columna.to_numpy(dtype=float)
+            else:
+                valores = pd.to_numeric(columna, errors='coerce').to_numpy(dtype=float)
+            datos[destino][ids] = valores.round(2) if redondear else valores
+
+
+class Cartera:
+    """Filas tipadas por ticker, actualizadas en el lugar con cada respuesta cruda de hb.account"""
+    def __init__(self, capacidad=CAPACIDAD_INICIAL):
+        self.datos = np.empty(capacidad, dtype=DTYPE_CARTERA)
+        self.datos[:] = fila_vacia()
+        self.claves = []  # Clave de cada fila asignada (el Ticker; con repetidos, Ticker#n)
+        self.indice = pd.Index([], dtype=object)
+        self.orden = np.zeros(0, dtype=np.intp)  # Filas de la última respuesta, en su orden
+        self.en_respuesta = np.zeros(capacidad, dtype=bool)  # Fila -> vino en la última respuesta
+        self.tickers = np.zeros(0, dtype=object)  # Ticker (texto) de cada fila de la última respuesta
+        self.presentes = set()  # Columnas con valores en la última respuesta
+        self.totales = {}  # Columna -> suma de las filas de la última respuesta
+        self.filas = {}  # Ticker -> fila, para búsquedas puntuales (DOLARUSA)
+        self.planes = {}  # Esquema (tupla de columnas crudas) -> PlanNormalizacion
+        self.plan = None  # Plan de la última respuesta
+        self.disposiciones = {}  # Campos presentes -> columnas de salida, en el orden pedido
+
+        # TIPO: código crudo de SHDA -> código entero; los desconocidos se agregan al vuelo
+        self.categorias = list(TIPO_ACTIVO.values()) + [TIPO_EFECTIVO]
+        self.codigos_crudos = pd.Index(list(TIPO_ACTIVO), dtype=object)
+        self.categoria_de_crudo = np.arange(len(TIPO_ACTIVO), dtype=np.int16)  # Posición en codigos_crudos -> categoría
+        self.dtype_tipo = pd.CategoricalDtype(self.categorias)
+
+    def __len__(self):
+        return len(self.orden)
+
+    def ids_de(self, claves):
+        """Filas de las claves, asignando (y creciendo el array si hace falta) las que no existían"""
+        ids = self.indice.get_indexer(claves)
+        nuevos = ids < 0
+        if nuevos.any():
+            altas = list(pd.unique(claves[nuevos]))
+            necesarias = len(self.claves) + len(altas)
+            if necesarias > len(self.datos):
+                datos = np.empty(max(necesarias, 2 * len(self.datos)), dtype=DTYPE_CARTERA)
+                datos[:len(self.datos)] = self.datos
+                datos[len(self.datos):] = fila_vacia()
+                self.datos = datos
+                self.en_respuesta = np.concatenate([self.en_respuesta,
+                                                    np.zeros(len(datos) - len(self.en_respuesta), dtype=bool)])
+            self.claves.extend(altas)
+            self.indice = pd.Index(self.claves, dtype=object)
+            self.filas = {}
+            ids = self.indice.get_indexer(claves)
+        return ids
+
+    def plan_de(self, df):
+        """Plan del esquema de la respuesta, compilado la primera vez que aparece"""
+        esquema = tuple(df.columns)
+        if self.plan is not None and self.plan.esquema == esquema:
+            return self.plan
+        plan = self.planes.get(esquema)
+        if plan is None:
+            plan = PlanNormalizacion(esquema)
+            self.planes[esquema] = plan
+            if self.plan is not None:
+                anteriores = set(self.plan.esquema)
+                agregadas = [col for col in esquema if col not in anteriores]
+                quitadas = [col for col in self.plan.esquema if col not in set(esquema)]
+                log.warning("Cambió el esquema de la respuesta de SHDA (agregadas: %s, quitadas: %s); "
+                            "plan de normalización recompilado", agregadas or '-', quitadas or '-')
+            if plan.ignoradas:
+                log.info("Columnas de SHDA sin uso en la tabla: %s", ', '.join(map(str, plan.ignoradas)))
+        self.plan = plan
+        return plan
+
+    def actualizar(self, df):
+        """Escribe la respuesta cruda (DataFrame de hb.account) sobre las filas de cada ticker"""
+        plan = self.plan_de(df)
+        n = len(df)
+        if plan.con_ticker:
+            tickers = df['TICK'].astype(str).to_numpy(dtype=object)
+        else:
+            tickers = np.array([str(i) for i in range(n)], dtype=object)
+
+        ids = self.ids_de(tickers)
+        if n and np.bincount(ids).max() > 1:
+            # Tickers repetidos en la respuesta: cada aparición lleva su propia fila
+            ids = self.ids_de(claves_unicas(tickers))
+        self.en_respuesta[self.orden] = False
+        self.en_respuesta[ids] = True
+        self.orden = ids
+        self.tickers = tickers
+
+        plan.aplicar(df, self.datos, ids)
+        if plan.con_tipo:
+            self.datos['TIPO'][ids] = self.codigos_tipo(df, plan.con_especie)
+        self.presentes = set(plan.presentes)
+        return self
+
+    def codigos_tipo(self, df, con_especie):
+        """Código entero de TIPO de cada fila, con la regla especial para Cash"""
+        crudos = df['TIPO']
+        texto = crudos.astype(str).to_numpy(dtype=object)
+        posiciones = self.codigos_crudos.get_indexer(texto)
+        desconocidos = (posiciones < 0) & crudos.notna().to_numpy()
+        if desconocidos.any():
+            # Un código nuevo de SHDA se muestra tal cual, como hasta ahora
+            for codigo in pd.unique(texto[desconocidos]):
+                if codigo not in self.categorias:
+                    self.categorias.append(codigo)
+                self.codigos_crudos = self.codigos_crudos.append(pd.Index([codigo], dtype=object))
+                self.categoria_de_crudo = np.append(self.categoria_de_crudo, self.categorias.index(codigo))
+            self.dtype_tipo = pd.CategoricalDtype(self.categorias)
+            posiciones = self.codigos_crudos.get_indexer(texto)
+
+        codigos = np.where(posiciones >= 0, self.categoria_de_crudo[posiciones], SIN_TIPO).astype(np.int16)
+        if con_especie:
+            codigos[(df['ESPE'] == 'Cash').to_numpy()] = CODIGO_EFECTIVO
+        return codigos
+
+    def fila_de(self, ticker):
+        """Fila del ticker si vino en la última respuesta, o None"""
+        fila = self.filas.get(ticker)
+        if fila is None:
+            fila = self.filas[ticker] = self.indice.get_indexer([ticker])[0]
+        if fila < 0 or not self.en_respuesta[fila]:
+            return None
+        return fila
+
+    def columna(self, nombre):
+        """Valores de una columna para las filas de la última respuesta (copia, en su orden)"""
+        return self.datos[nombre][self.orden]
+
+    def numerica(self, nombre):
+        """Columna numérica con 0 en vacíos, o ceros si la respuesta no la trae"""
+        if nombre not in self.presentes:
+            return np.zeros(len(self.orden))
+        valores = self.columna(nombre)
+        valores[np.isnan(valores)] = 0.0
+        return valores
+
+    def asignar(self, nombre, valores):
+        """Escribe una columna calculada para las filas de la última respuesta"""
+        self.datos[nombre][self.orden] = valores
+        self.presentes.add(nombre)
+
+    def calcular_totales(self):
+        """Sumas de las filas de datos, guardadas aparte en self.totales"""
+        self.totales = {col: float(np.nansum(self.columna(col))) for col in COLUMNAS_TOTALES if col in self.presentes}
+        return self.totales
+
+    def a_dataframe(self, columnas):
+        """DataFrame de las columnas presentes (en el orden de columnas) con la fila TOTALES al final.
+
+        Cada columna se copia una sola vez desde el contenedor a su array final;
+        la fila TOTALES lleva NaN (o texto vacío) donde no hay suma. Qué columnas
+        salen y de qué clase es cada una se calcula una vez por combinación de
+        columnas pedidas y campos presentes.
+        """
+        clave = (tuple(columnas), frozenset(self.presentes))
+        disposicion = self.disposiciones.get(clave)
+        if disposicion is None:
+            disposicion = self.disposiciones[clave] = [
+                (col, 'tipo' if col == 'TIPO' else 'texto' if col in CAMPOS_TEXTO else 'numero')
+                for col in columnas if col in self.presentes]
+        n = len(self.orden)
+        con_totales = 'Nombre de la Especie' in self.presentes
+        filas = n + 1 if con_totales else n
+
+        salida = {}
+        for col, clase in disposicion:
+            if clase == 'tipo':
+                codigos = np.full(filas, SIN_TIPO, dtype=np.int16)
+                np.take(self.datos['TIPO'], self.orden, out=codigos[:n])
+                salida[col] = pd.Categorical.from_codes(codigos, dtype=self.dtype_tipo)
+                continue
+            if clase == 'texto':
+                valores = np.full(filas, '', dtype=object)
+            else:
+                valores = np.full(filas, np.nan)
+            np.take(self.datos[col], self.orden, out=valores[:n])
+            salida[col] = valores
+
+        if con_totales:
+            salida['Nombre de la Especie'][n] = 'TOTALES'
+            for col, total in self.totales.items():
+                if col in salida:
+                    salida[col][n] = total
+        return pd.DataFrame(salida, columns=list(salida), copy=False)
+
+
+def claves_unicas(tickers):
+    """Claves sin repetir: la segunda aparición de un ticker pasa a ser Ticker#1, y así"""
+    vistos = {}
+    claves = tickers.copy()
+    for i, ticker in enumerate(tickers):
+        repeticion = vistos.get(ticker, 0)
+        if repeticion:
+            claves[i] = f"{ticker}#{repeticion}"
+        vistos[ticker] = repeticion + 1
+    return claves
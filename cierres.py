@@ -0,0 +1,151 @@
+"""Cierres diarios guardados en disco, base de las variaciones del día.
+
+Cada cierre se guarda en cierres/AAAA-MM-DD.npz con las columnas ticker,
+precio, importe y cantidad (arrays de NumPy sin pickle, que se cargan mucho
+más rápido que el JSON). La escritura es atómica (archivo temporal + rename)
+y solo ocurre si los datos difieren del último cierre guardado, así que
+mientras el mercado está en CIERRE no se reescribe nada. Se conservan los
+últimos CIERRES_A_CONSERVAR días para poder elegir la base por fecha.
+"""
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+
+
+log = obtener('cierres')
+
+
+DIRECTORIO_CIERRES = 'cierres'
+CIERRES_A_CONSERVAR = 10
+EXTENSION = '.npz'
+
+# La respuesta puede venir con las columnas crudas de SHDA o ya renombradas
+COLUMNAS_CIERRE = {
+    'ticker': ('TICK', 'Ticker'),
+    'precio': ('PCIO', 'Ultimo Precio'),
+    'importe': ('IMPO', 'Importe Actual'),
+    'cantidad': ('CANT', 'Cantidad'),
+}
+
+
+def fecha_de(t):
+    """Fecha (AAAA-MM-DD, hora local) de un timestamp"""
+    return time.strftime('%Y-%m-%d', time.localtime(t))
+
+
+def columnas_de_cierre(df):
+    """Arrays ticker, precio, importe y cantidad de un DataFrame, sin TOTALES ni repetidos"""
+    valores = {}
+    for nombre, candidatas in COLUMNAS_CIERRE.items():
+        columna = next((col for col in candidatas if col in df.columns), None)
+        if nombre == 'ticker':
+            if columna is None:
+                return None
+            valores[nombre] = df[columna].astype(str).to_numpy()
+        elif columna is None:
+            valores[nombre] = np.zeros(len(df))
+        else:
+            valores[nombre] = pd.to_numeric(df[columna], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    # Excluir fila de totales y tickers vacíos; ante repetidos gana el último
+    ticker = valores['ticker']
+    validas = (ticker != '') & (ticker != 'TOTALES')
+    validas &= ~pd.Series(ticker).duplicated(keep='last').to_numpy()
+    valores = {nombre: columna[validas] for nombre, columna in valores.items()}
+    valores['ticker'] = valores['ticker'].astype(str)  # Unicode de ancho fijo: se guarda sin pickle
+    return valores
+
+
+def huella_cierre(valores):
+    h = hashlib.blake2b(digest_size=16)
+    for nombre in COLUMNAS_CIERRE:
+        h.update(np.ascontiguousarray(valores[nombre]).tobytes())
+    return h.hexdigest()
+
+
+class AlmacenCierres:
+    """Cierres por fecha en un directorio, con escritura atómica y deduplicada"""
+    def __init__(self, directorio=DIRECTORIO_CIERRES, conservar=CIERRES_A_CONSERVAR):
+        self.directorio = directorio
+        self.conservar = conservar
+        self.ultima_huella = None  # Del cierre más reciente; se calcula al primer guardado
+        self.mtime_directorio = None
+        self.lista_fechas = []
+
+    def ruta(self, fecha):
+        return os.path.join(self.directorio, fecha + EXTENSION)
+
+    def fechas(self):
+        """Fechas guardadas, de la más vieja a la más nueva (se relee solo si cambió el directorio)"""
+        try:
+            mtime = os.stat(self.directorio).st_mtime_ns
+        except FileNotFoundError:
+            self.mtime_directorio = None
+            self.lista_fechas = []
+            return []
+
+        if mtime != self.mtime_directorio:
+            self.lista_fechas = sorted(archivo[:-len(EXTENSION)] for archivo in os.listdir(self.directorio)
+                                       if archivo.endswith(EXTENSION))
+            self.mtime_directorio = mtime
+        return self.lista_fechas
+
+    def fecha_base(self, antes_de=None):
+        """Último cierre anterior a la fecha indicada (por defecto, hoy); None si no hay"""
+        antes_de = antes_de or fecha_de(time.time())
+        anteriores = [fecha for fecha in self.fechas() if fecha < antes_de]
+        return anteriores[-1] if anteriores else None
+
+    def leer(self, fecha):
+        """Columnas del cierre de una fecha (dict de arrays)"""
+        with np.load(self.ruta(fecha)) as datos:
+            return {nombre: datos[nombre] for nombre in COLUMNAS_CIERRE}
+
+    def cargar(self, fecha):
+        """Base de comparación (PCIO_anterior, IMPO_anterior) indexada por Ticker"""
+        valores = self.leer(fecha)
+        base = pd.DataFrame({'PCIO_anterior': valores['precio'], 'IMPO_anterior': valores['importe']},
+                            index=pd.Index(valores['ticker']))
+        log.info("Cierre del %s cargado con %d tickers", fecha, len(base))
+        return base
+
+    def guardar(self, df, t=None):
+        """Guarda el cierre si difiere del último guardado; devuelve True si escribió"""
+        valores = columnas_de_cierre(df)
+        if valores is None:
+            return False
+
+        huella = huella_cierre(valores)
+        if self.ultima_huella is None:
+            fechas = self.fechas()
+            if fechas:
+                self.ultima_huella = huella_cierre(self.leer(fechas[-1]))
+        if huella == self.ultima_huella:
+            return False
+
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self.ruta(fecha_de(time.time() if t is None else t))
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f:
+            np.savez(f, **valores)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+        self.ultima_huella = huella
+        log.info("Cierre guardado en %s (%d tickers)", ruta, len(valores['ticker']))
+
+        self.depurar()
+        return True
+
+    def depurar(self):
+        """Borra los cierres más viejos que los últimos self.conservar"""
+        for fecha in self.fechas()[:-self.conservar]:
+            try:
+                os.remove(self.ruta(fecha))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,58 @@
+import json
+import os
+
+from bitacora import obtener, configurar
+
+
+log = obtener('configuracion')
+
+
+CONFIG_FILE = 'config.json'
+
+# Configuración por defecto
+CONFIG_DEFAULT = {
+    "host": 0000,
+    "dni": "0000000",
+    "user": "xxxxxxxx",
+    "password": "xxxxxxxxx",
+    "comitente": 000000
+}
+
+
+def cargar_configuracion(config_file=CONFIG_FILE):
+    """Carga la configuración desde config.json, creándolo si no existe.
+
+    Devuelve (config, aviso): aviso es None si se leyó bien, o una tupla
+    (titulo, mensaje, es_error) para que la interfaz lo muestre.
+    """
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, 'r', encoding='utf-8') as f:
+                config_archivo = json.load(f)
+
+            config = dict(CONFIG_DEFAULT)
+            config.update(config_archivo)
+
+            configurar(config)  # Niveles y archivo de la bitácora
+            log.info("Configuración cargada desde %s", config_file)
+            return config, None
+
+        # Crear archivo de configuración con valores por defecto
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump(CONFIG_DEFAULT, f, indent=4, ensure_ascii=False)
+
+        configurar(CONFIG_DEFAULT)
+        log.warning("Archivo %s creado con configuración por defecto", config_file)
+        return dict(CONFIG_DEFAULT), ("Configuración",
+                                      f"Se ha creado el archivo {config_file} con la configuración por defecto.\n"
+                                      "Por favor, edite este archivo con sus credenciales reales.",
+                                      False)
+
+    except Exception as e:
+        configurar()
+        log.error("Error al cargar configuración: %s", e)
+        # Usar configuración por defecto en caso de error
+        return dict(CONFIG_DEFAULT), ("Error de Configuración",
+                                      f"Error al cargar {config_file}. Usando configuración por defecto.\n"
+                                      f"Error: {str(e)}",
+                                      True)
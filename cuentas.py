@@ -0,0 +1,310 @@
+"""Cuentas (comitentes) monitoreadas y su sondeo, sin dependencias de interfaz.
+
+config.json admite una lista "cuentas"; cada entrada toma de la raíz del
+archivo las claves que no defina (por ejemplo, las credenciales compartidas).
+Sin "cuentas" se usa la configuración de una sola cuenta de siempre.
+"""
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+import pandas as pd
+
+from barras import ConsultasIntradiarias
+from bitacora import obtener
+from cierres import AlmacenCierres, DIRECTORIO_CIERRES
+from historial import HistorialIntradiario, DIRECTORIO_HISTORIAL
+from normalizacion import CacheAnterior, PipelineTenencias, hay_cierre, ARCHIVO_ANTERIOR
+from planificador import PlanificadorSondeo, INTERVALO_BASE
+from series import VENTANA_MINUTOS
+from sesion import clasificar_error, ERROR_SESION, REINTENTOS_ANTES_DE_RELOGIN, CONECTANDO, CONECTADO, REINTENTANDO
+
+
+log = obtener('cuentas')
+
+
+CLAVES_CUENTA = ['host', 'dni', 'user', 'password', 'comitente']
+
+MAX_HILOS = 4  # Consultas simultáneas por defecto
+
+# Última tenencia mostrada, para pintar la tabla al arrancar antes del primer dato en vivo
+ARCHIVO_ULTIMA = 'ultima.json'
+INTERVALO_GUARDADO_ULTIMA = 30  # Segundos mínimos entre escrituras (al cerrar siempre se guarda)
+ESPERA_CIERRE = 2.0  # Segundos que cerrar espera a que termine de procesarse una consulta en curso
+
+
+class Cuenta:
+    """Datos de conexión de un comitente y los archivos donde guarda su estado"""
+    def __init__(self, nombre, host, dni, user, password, comitente, separar_archivos=False):
+        self.nombre = nombre
+        self.host = host
+        self.dni = dni
+        self.user = user
+        self.password = password
+        self.comitente = comitente
+
+        # Con varias cuentas cada una tiene sus propios cierres e historial
+        if separar_archivos:
+            base, extension = os.path.splitext(ARCHIVO_ANTERIOR)
+            self.archivo_anterior = f"{base}_{comitente}{extension}"
+            self.directorio_historial = os.path.join(DIRECTORIO_HISTORIAL, str(comitente))
+            self.directorio_cierres = os.path.join(DIRECTORIO_CIERRES, str(comitente))
+            base, extension = os.path.splitext(ARCHIVO_ULTIMA)
+            self.archivo_ultima = f"{base}_{comitente}{extension}"
+        else:
+            self.archivo_anterior = ARCHIVO_ANTERIOR
+            self.directorio_historial = DIRECTORIO_HISTORIAL
+            self.directorio_cierres = DIRECTORIO_CIERRES
+            self.archivo_ultima = ARCHIVO_ULTIMA
+
+    @property
+    def credenciales(self):
+        """Clave de sesión: cuentas con las mismas credenciales comparten el login"""
+        return (self.host, str(self.dni), self.user)
+
+
+def cuentas_desde_config(config):
+    """Arma la lista de cuentas a partir de config.json"""
+    entradas = config.get('cuentas') or [{}]
+    separar = len(entradas) > 1
+
+    cuentas = []
+    for entrada in entradas:
+        datos = {clave: entrada.get(clave, config.get(clave)) for clave in CLAVES_CUENTA}
+        nombre = entrada.get('nombre') or str(datos['comitente'])
+        cuentas.append(Cuenta(nombre, separar_archivos=separar, **datos))
+    return cuentas
+
+
+def cargar_ultima(archivo):
+    """Última tenencia guardada y su fecha de escritura (time.time()), o (None, None)"""
+    try:
+        t = os.path.getmtime(archivo)
+        # dtype=False: sin inferir tipos, los tickers numéricos siguen siendo texto
+        df = pd.read_json(archivo, orient='split', dtype=False, convert_dates=False)
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        log.warning("No se pudo leer la última tenencia guardada (%s): %s", archivo, e)
+        return None, None
+    return df, t
+
+
+class SondeoCuenta:
+    """Pipeline, historial y planificador propios de una cuenta"""
+    def __init__(self, cuenta, intervalo_base=INTERVALO_BASE, columnas_operaciones=False, fecha_base=None,
+                 metricas=None, perfil=None, columnas_intradiarias=False, ventana_minutos=VENTANA_MINUTOS, alertas=None,
+                 publicador=None, grabador=None, planificador=None, persistir=True, columnas_base=False):
+        self.cuenta = cuenta
+        # Sin persistir (al reproducir una grabación) se leen los cierres pero no se escribe nada
+        # en los archivos de la cuenta: el historial va a un directorio temporal
+        self.persistir = persistir
+        self.directorio_temporal = None if persistir else tempfile.TemporaryDirectory(prefix='historial_')
+        self.historial = HistorialIntradiario(cuenta.directorio_historial if persistir else self.directorio_temporal.name)
+        self.consultas = ConsultasIntradiarias(self.historial)  # Barras OHLC y precios base sobre el historial
+        cache_anterior = CacheAnterior(cuenta.archivo_anterior, AlmacenCierres(cuenta.directorio_cierres), fecha_base)
+        self.pipeline = PipelineTenencias(cache_anterior, guardar_cierre=persistir,
+                                          columnas_operaciones=columnas_operaciones, metricas=metricas,
+                                          columnas_intradiarias=columnas_intradiarias, ventana_minutos=ventana_minutos,
+                                          columnas_base=columnas_base, consultas=self.consultas)
+        self.metricas = metricas  # metricas.Metricas compartidas, o None
+        self.perfil = perfil  # metricas.CapturaPerfil compartida, o None
+        self.alertas = alertas  # alertas.MotorAlertas de la cuenta, o None
+        self.publicador = publicador  # publicacion.PublicadorTenencias compartido, o None
+        self.grabador = grabador  # grabacion.GrabadorRespuestas compartido, o None
+        self.planificador = planificador if planificador is not None else PlanificadorSondeo(intervalo_base=intervalo_base)
+
+        # Estado de la conexión, para mostrar en la interfaz
+        self.estado = CONECTANDO
+        self.tipo_error = None
+        self.ultimo_error = None
+        self.ultima_actualizacion = None  # time.time() de la última consulta exitosa
+
+        # Última tenencia pendiente de guardar en disco (se escribe como mucho cada INTERVALO_GUARDADO_ULTIMA)
+        self.ultima_pendiente = None
+        self.ultima_guardada = None  # time.monotonic() de la última escritura
+
+        # El procesamiento de cada respuesta y cerrar no se pisan; una respuesta que llega ya cerrada se descarta
+        self.lock = threading.Lock()
+        self.cerrado = False
+
+    @property
+    def operaciones(self):
+        """Operaciones parseadas de la última respuesta procesada (ticker -> array)"""
+        return self.pipeline.operaciones.actual
+
+    @property
+    def tendencias(self):
+        """Últimos precios por ticker de la última respuesta procesada (series.Tendencias), o None"""
+        return self.pipeline.tendencias
+
+    @property
+    def reintentos(self):
+        return self.planificador.errores
+
+    def estado_conexion(self):
+        """Instantánea del estado de conexión (se puede pasar entre hilos)"""
+        return {
+            'estado': self.estado,
+            'reintentos': self.reintentos,
+            'tipo_error': self.tipo_error,
+            'ultimo_error': self.ultimo_error,
+            'ultima_actualizacion': self.ultima_actualizacion,
+        }
+
+    def reiniciar(self):
+        """Vuelve al estado inicial de conexión (al reconectar manualmente)"""
+        self.planificador.reiniciar()
+        self.estado = CONECTANDO
+        self.tipo_error = None
+        self.ultimo_error = None
+
+    def consultar_con_sesion(self, sesiones):
+        """Obtiene la sesión (haciendo login si hace falta) y consulta la tenencia.
+
+        Ante una sesión vencida, o tras varios errores seguidos, se descarta la
+        sesión para que el próximo intento vuelva a loguearse; ante errores de
+        red se conserva. El reintento lo programa el planificador con backoff.
+        """
+        hb = None
+        try:
+            with self.perfil.ciclo() if self.perfil is not None else nullcontext(), self.medir('consulta'):
+                hb, lock_sesion = sesiones.obtener(self.cuenta)
+                df = self.consultar(hb, lock_sesion)
+        except Exception as e:
+            if hb is None:
+                # Falló el login: consultar no llegó a registrar el error
+                self.planificador.registrar_error()
+            self.tipo_error = clasificar_error(e)
+            self.ultimo_error = str(e)
+            self.estado = REINTENTANDO
+            if hb is not None and (self.tipo_error == ERROR_SESION or self.reintentos >= REINTENTOS_ANTES_DE_RELOGIN):
+                sesiones.invalidar(self.cuenta, hb)
+            raise
+
+        self.estado = CONECTADO
+        self.tipo_error = None
+        self.ultimo_error = None
+        self.ultima_actualizacion = time.time()
+        return df
+
+    def consultar(self, hb, lock=None):
+        """Consulta y normaliza la tenencia; devuelve None si la respuesta no cambió.
+
+        Los errores se registran en el planificador (backoff) y se propagan.
+        La espera de la red no toma el lock de la cuenta: solo el procesamiento.
+        """
+        try:
+            if lock is not None:
+                with lock:
+                    datos = self.consultar_red(hb)
+            else:
+                datos = self.consultar_red(hb)
+        except Exception:
+            self.planificador.registrar_error()
+            raise
+        t = time.time()
+
+        with self.lock:
+            if self.cerrado:
+                # La cuenta se cerró mientras se esperaba la respuesta: no se escribe nada más
+                return None
+            return self.procesar(t, datos)
+
+    def procesar(self, t, datos):
+        """Normaliza la respuesta y la registra en historial, alertas, publicador y última tenencia"""
+        try:
+            # Si la respuesta es idéntica a la anterior no hay nada que procesar
+            with self.medir('hash'):
+                cambio = self.planificador.registrar_payload(datos)
+            self.grabar(t, datos, cambio)
+            if not cambio:
+                return None
+
+            df = self.pipeline.procesar(datos)
+            self.planificador.registrar_cierre(hay_cierre(df))
+        except Exception:
+            self.planificador.registrar_error()
+            raise
+
+        # Un problema con el historial no debe cortar el sondeo
+        try:
+            with self.medir('historial'):
+                self.historial.registrar(df)
+        except Exception as e:
+            log.error("Error al registrar historial (%s): %s", self.cuenta.nombre, e)
+
+        # Ni las alertas
+        if self.alertas is not None:
+            try:
+                with self.medir('alertas'):
+                    self.alertas.evaluar(df)
+            except Exception as e:
+                log.error("Error al evaluar alertas (%s): %s", self.cuenta.nombre, e)
+
+        # Ni los lectores conectados al publicador
+        if self.publicador is not None:
+            try:
+                with self.medir('publicacion'):
+                    self.publicador.publicar(self.cuenta.nombre, df)
+            except Exception as e:
+                log.error("Error al publicar tenencia (%s): %s", self.cuenta.nombre, e)
+
+        self.ultima_pendiente = df
+        ahora = time.monotonic()
+        if self.ultima_guardada is None or ahora - self.ultima_guardada >= INTERVALO_GUARDADO_ULTIMA:
+            self.guardar_ultima()
+        return df
+
+    def medir(self, etapa):
+        return self.metricas.medir(etapa) if self.metricas is not None else nullcontext()
+
+    def grabar(self, t, datos, cambio):
+        """Agrega la respuesta cruda a la grabación; un error al grabar no corta el sondeo"""
+        if self.grabador is None:
+            return
+        try:
+            with self.medir('grabacion'):
+                self.grabador.grabar(self.cuenta.comitente, t, datos, repetida=not cambio)
+        except Exception as e:
+            log.error("Error al grabar la respuesta (%s): %s", self.cuenta.nombre, e)
+
+    def consultar_red(self, hb):
+        """Llamada a hb.account, medida como la etapa 'red'"""
+        with self.medir('red'):
+            return hb.account(self.cuenta.comitente)
+
+    def guardar_ultima(self):
+        """Escribe la última tenencia pendiente en disco de forma atómica (temporal + rename)"""
+        df = self.ultima_pendiente
+        if df is None or not self.persistir:
+            return
+        self.ultima_pendiente = None
+        self.ultima_guardada = time.monotonic()
+        archivo = self.cuenta.archivo_ultima
+        temporal = archivo + '.tmp'
+        try:
+            df.to_json(temporal, orient='split', index=False, force_ascii=False, double_precision=15)
+            os.replace(temporal, archivo)
+        except Exception as e:
+            log.error("Error al guardar la última tenencia (%s): %s", self.cuenta.nombre, e)
+
+    def cargar_ultima(self):
+        return cargar_ultima(self.cuenta.archivo_ultima)
+
+    def cerrar(self, espera=ESPERA_CIERRE):
+        """Guarda la última tenencia y cierra el historial, esperando (con límite) a la consulta en curso"""
+        tomado = self.lock.acquire(timeout=espera)
+        if not tomado:
+            log.warning("Se cierra la cuenta %s con una consulta todavía en proceso", self.cuenta.nombre)
+        try:
+            self.cerrado = True
+            self.guardar_ultima()
+            self.historial.cerrar()
+            if self.directorio_temporal is not None:
+                self.directorio_temporal.cleanup()
+        finally:
+            if tomado:
+                self.lock.release()
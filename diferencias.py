@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+
+CLAVE_TOTALES = 'TOTALES'
+
+
+def claves_de_filas(df):
+    """Devuelve la clave de cada fila: el Ticker, o TOTALES para la fila de totales.
+
+    Devuelve None si el DataFrame no tiene Ticker o si hay claves repetidas,
+    en cuyo caso las filas no se pueden emparejar entre instantáneas.
+    """
+    if 'Ticker' not in df.columns:
+        return None
+
+    claves = df['Ticker'].astype(str).to_numpy(dtype=object)
+    if 'Nombre de la Especie' in df.columns:
+        es_totales = (df['Nombre de la Especie'] == CLAVE_TOTALES).to_numpy()
+        claves = np.where(es_totales, CLAVE_TOTALES, claves)
+
+    if len(pd.unique(claves)) != len(claves):
+        return None
+    return claves
+
+
+def celdas_distintas(anterior, nuevo):
+    """Compara dos arrays celda a celda; dos vacíos (NaN/None) se consideran iguales"""
+    distintas = np.asarray(anterior != nuevo, dtype=bool)
+    if distintas.any():
+        distintas &= ~(pd.isna(anterior) & pd.isna(nuevo))
+    return distintas
+
+
+class DiferenciaInstantaneas:
+    """Diferencias entre dos instantáneas de tenencia emparejadas por clave de fila.
+
+    - claves_eliminadas / pos_eliminadas: filas que estaban y ya no están
+    - claves_insertadas / pos_insertadas: filas nuevas (posiciones en la nueva instantánea)
+    - pos_anterior / pos_nuevo: posiciones de las filas comunes, en el orden anterior
+    - cambios: matriz booleana (filas comunes x columnas) con las celdas modificadas
+    """
+    def __init__(self, columnas, claves_comunes, pos_anterior, pos_nuevo,
+                 claves_eliminadas, pos_eliminadas, claves_insertadas, pos_insertadas, cambios):
+        self.columnas = columnas
+        self.claves_comunes = claves_comunes
+        self.pos_anterior = pos_anterior
+        self.pos_nuevo = pos_nuevo
+        self.claves_eliminadas = claves_eliminadas
+        self.pos_eliminadas = pos_eliminadas
+        self.claves_insertadas = claves_insertadas
+        self.pos_insertadas = pos_insertadas
+        self.cambios = cambios
+
+    @property
+    def vacia(self):
+        return not (len(self.pos_eliminadas) or len(self.pos_insertadas) or self.cambios.any())
+
+    def orden_nuevo(self):
+        """Posiciones de la nueva instantánea en el orden anterior, con las filas nuevas al final"""
+        return np.concatenate([self.pos_nuevo, self.pos_insertadas])
+
+
+def diferenciar_instantaneas(anterior, nuevo, claves_anteriores=None, claves_nuevas=None):
+    """Compara dos instantáneas normalizadas con las mismas columnas.
+
+    Devuelve None si no se pueden emparejar (columnas distintas, sin Ticker
+    o con claves repetidas); en ese caso corresponde un refresco completo.
+    """
+    if list(anterior.columns) != list(nuevo.columns):
+        return None
+
+    if claves_anteriores is None:
+        claves_anteriores = claves_de_filas(anterior)
+    if claves_nuevas is None:
+        claves_nuevas = claves_de_filas(nuevo)
+    if claves_anteriores is None or claves_nuevas is None:
+        return None
+
+    # Emparejar filas por clave de una sola vez
+    pos_en_nuevo = pd.Index(claves_nuevas).get_indexer(claves_anteriores)
+    comunes = pos_en_nuevo >= 0
+    pos_anterior = np.flatnonzero(comunes)
+    pos_nuevo = pos_en_nuevo[comunes]
+    pos_eliminadas = np.flatnonzero(~comunes)
+
+    en_anterior = pd.Index(claves_anteriores).get_indexer(claves_nuevas) >= 0
+    pos_insertadas = np.flatnonzero(~en_anterior)
+
+    # Comparar columna por columna sobre las filas comunes
+    columnas = list(nuevo.columns)
+    cambios = np.zeros((len(pos_anterior), len(columnas)), dtype=bool)
+    for j, col in enumerate(columnas):
+        valores_ant = anterior[col].to_numpy()[pos_anterior]
+        valores_nue = nuevo[col].to_numpy()[pos_nuevo]
+        cambios[:, j] = celdas_distintas(valores_ant, valores_nue)
+
+    return DiferenciaInstantaneas(
+        columnas,
+        claves_anteriores[pos_anterior],
+        pos_anterior,
+        pos_nuevo,
+        claves_anteriores[pos_eliminadas],
+        pos_eliminadas,
+        claves_nuevas[pos_insertadas],
+        pos_insertadas,
+        cambios,
+    )
@@ -0,0 +1,160 @@
+"""Grabación y reproducción de las respuestas crudas de hb.account, sin dependencias de interfaz.
+
+Grabar agrega cada respuesta, con su comitente y su time.time(), a un archivo
+gzip de solo agregado: cada registro es un pickle de (comitente, t, datos) y
+el archivo se vacía al disco después de cada uno, así que un corte a mitad de
+la sesión solo pierde el último registro. Las respuestas idénticas a la
+anterior se graban sin datos (None) para no repetir la tenencia completa.
+
+Reproducir reemplaza al cliente de SHDA por ReproductorSHDA, que entrega las
+respuestas grabadas respetando los tiempos originales divididos por la
+velocidad (1 = tiempo real, 10 = diez veces más rápido, 0 = sin esperas).
+Sin esperas, reproducir un día entero mide cuántas instantáneas por segundo
+absorben el pipeline y la tabla.
+
+El archivo es un pickle: solo reproducir grabaciones propias.
+"""
+import gzip
+import pickle
+import threading
+import time
+import zlib
+from collections import deque
+
+from bitacora import obtener
+from planificador import PlanificadorSondeo
+
+
+log = obtener('grabacion')
+
+
+NIVEL_COMPRESION = 6  # 9 comprime apenas más y tarda bastante más en el hilo de sondeo
+ESPERA_FIN = 1.0  # Segundos que espera cada consulta una vez agotada la grabación
+
+
+class GrabadorRespuestas:
+    """Agrega respuestas crudas de hb.account a un archivo gzip (se puede llamar desde cualquier hilo)"""
+    def __init__(self, archivo):
+        self.ruta = archivo
+        self.archivo = gzip.open(archivo, 'ab', compresslevel=NIVEL_COMPRESION)
+        self.lock = threading.Lock()
+        self.registros = 0
+        log.info("Grabando respuestas de SHDA en %s", archivo)
+
+    def grabar(self, comitente, t, datos, repetida=False):
+        registro = (str(comitente), t, None if repetida else datos)
+        with self.lock:
+            pickle.dump(registro, self.archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            self.archivo.flush()  # Z_SYNC_FLUSH: lo grabado se puede leer aunque el proceso muera
+            self.registros += 1
+
+    def cerrar(self):
+        with self.lock:
+            self.archivo.close()
+
+
+def leer_grabacion(archivo):
+    """Genera (comitente, t, datos) en orden de grabación; datos es None si repite la respuesta anterior.
+
+    Un registro final incompleto (el proceso murió mientras grababa) se ignora.
+    """
+    with gzip.open(archivo, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+            except (pickle.UnpicklingError, zlib.error, gzip.BadGzipFile) as e:
+                log.warning("Grabación truncada en %s: %s", archivo, e)
+                return
+
+
+class ReproductorSHDA:
+    """Reemplazo de SHDA.SHDA cuyo account() devuelve las respuestas de una grabación.
+
+    Lee el archivo a medida que lo necesita (un día entero no entra en
+    memoria); las respuestas de otros comitentes leídas por adelantado
+    esperan en una cola propia. Agotada la grabación, cada cuenta sigue
+    recibiendo su última respuesta, que el planificador saltea por repetida.
+    """
+    def __init__(self, archivo, velocidad=1.0):
+        self.ruta = archivo
+        self.velocidad = velocidad  # 0 = sin esperas
+        self.registros = leer_grabacion(archivo)
+        self.pendientes = {}  # comitente -> deque de (t, datos)
+        self.ultimas = {}  # comitente -> última respuesta entregada
+        self.agotada = False
+        self.t0 = None  # t del primer registro
+        self.inicio = None  # time.monotonic() de la primera consulta
+        self.fin = None  # time.monotonic() de la primera consulta después de agotar la grabación
+        self.entregadas = 0
+        self.lock = threading.Lock()
+
+    def fabrica(self, host=None, dni=None, user=None, password=None):
+        """Para GestorSesiones(fabrica=...): todas las cuentas comparten el reproductor"""
+        return self
+
+    def planificador(self):
+        """El ritmo lo marca la grabación: el planificador no espera entre consultas"""
+        return PlanificadorSondeo(intervalo_base=0, intervalo_estatico=0, intervalo_cierre=0)
+
+    def leer_hasta(self, comitente):
+        """Lee registros hasta tener uno del comitente (con el lock tomado)"""
+        cola = self.pendientes.setdefault(comitente, deque())
+        while not cola and not self.agotada:
+            try:
+                registro_comitente, t, datos = next(self.registros)
+            except StopIteration:
+                self.agotada = True
+                break
+            if self.t0 is None:
+                self.t0 = t
+            self.pendientes.setdefault(registro_comitente, deque()).append((t, datos))
+        return cola
+
+    def account(self, comitente):
+        comitente = str(comitente)
+        with self.lock:
+            if self.inicio is None:
+                self.inicio = time.monotonic()
+            cola = self.leer_hasta(comitente)
+            registro = cola.popleft() if cola else None
+            if registro is None:
+                ultima = self.ultimas.get(comitente)
+                if ultima is None:
+                    raise ValueError(f"La grabación {self.ruta} no tiene respuestas del comitente {comitente}")
+                if self.fin is None and self.agotada and not any(self.pendientes.values()):
+                    self.fin = time.monotonic()
+
+        if registro is None:
+            time.sleep(ESPERA_FIN)
+            return ultima
+
+        t, datos = registro
+        if self.velocidad:
+            espera = self.inicio + (t - self.t0) / self.velocidad - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+        with self.lock:
+            # Respuesta repetida: se devuelve la anterior para que el planificador la saltee
+            if datos is None:
+                datos = self.ultimas.get(comitente)
+            self.ultimas[comitente] = datos
+            self.entregadas += 1
+        return datos
+
+    @property
+    def terminado(self):
+        """Se entregaron (y se procesaron) todas las respuestas grabadas"""
+        return self.fin is not None
+
+    def resumen(self, procesadas=None):
+        """Respuestas entregadas por segundo (y procesadas, si se indica) desde la primera consulta"""
+        if self.inicio is None:
+            return "Reproducción sin consultas"
+        segundos = max((self.fin or time.monotonic()) - self.inicio, 1e-9)
+        texto = f"Reproducidas {self.entregadas} respuestas en {segundos:.1f} s ({self.entregadas / segundos:.1f}/s)"
+        if procesadas is not None:
+            texto += f", {procesadas} instantáneas procesadas ({procesadas / segundos:.1f}/s)"
+        return texto
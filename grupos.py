@@ -0,0 +1,109 @@
+"""Subtotales por TIPO y pesos en la cartera, sin dependencias de interfaz.
+
+Cada fila de la tenencia aporta sus columnas sumables al grupo de su TIPO.
+Las sumas de cada grupo se mantienen con ajustes: cuando cambian pocas
+filas se resta su aporte anterior y se suma el nuevo, solo en sus grupos,
+sin volver a recorrer la tenencia entera. El peso de una fila (o de un
+grupo) es su Importe Actual sobre el total de la cartera.
+"""
+import numpy as np
+import pandas as pd
+
+from cartera import COLUMNAS_TOTALES
+from diferencias import CLAVE_TOTALES
+
+
+COLUMNA_PESO = '% Cartera'  # Importe Actual sobre el total, en porcentaje
+COLUMNA_BASE_PESO = 'Importe Actual'
+SIN_GRUPO = -1  # Fila TOTALES: no pertenece a ningún grupo
+GRUPO_SIN_TIPO = 'Sin tipo'
+
+
+def columnas_sumables(columnas):
+    """Columnas de COLUMNAS_TOTALES presentes, en ese orden"""
+    return [col for col in COLUMNAS_TOTALES if col in columnas]
+
+
+class SubtotalesPorTipo:
+    """Sumas por grupo de TIPO, con la cantidad de filas de cada uno.
+
+    Los grupos se numeran en el orden en que aparecen y no se borran: un
+    grupo sin filas queda con cantidad 0 (y no se muestra), así que el número
+    de cada grupo es estable mientras dure la tabla.
+    """
+    def __init__(self, columnas=()):
+        self.columnas = list(columnas)  # Columnas sumadas
+        self.grupos = []  # Nombre de cada grupo
+        self.indice = pd.Index([], dtype=object)
+        self.rangos = np.zeros(0, dtype=np.intp)  # Posición de cada grupo ordenado por nombre
+        self.sumas = np.zeros((0, len(self.columnas)))
+        self.cantidades = np.zeros(0, dtype=np.int64)
+
+    def codigos(self, tipos, es_totales=None):
+        """Grupo de cada fila según su TIPO, agregando los grupos nuevos"""
+        nombres = np.array(tipos, dtype=object)
+        nombres[pd.isna(nombres) | (nombres == '')] = GRUPO_SIN_TIPO
+        codigos = self.indice.get_indexer(nombres)
+        nuevos = codigos < 0
+        if es_totales is not None:
+            nuevos &= ~es_totales
+        if nuevos.any():
+            self.grupos.extend(pd.unique(nombres[nuevos]))
+            self.indice = pd.Index(self.grupos, dtype=object)
+            self.rangos = np.argsort(np.argsort(np.array(self.grupos, dtype=object), kind='stable'))
+            agregados = len(self.grupos) - len(self.cantidades)
+            self.sumas = np.vstack([self.sumas, np.zeros((agregados, len(self.columnas)))])
+            self.cantidades = np.concatenate([self.cantidades, np.zeros(agregados, dtype=np.int64)])
+            codigos = self.indice.get_indexer(nombres)
+        if es_totales is not None:
+            codigos[es_totales] = SIN_GRUPO
+        return codigos.astype(np.intp)
+
+    def aportes(self, df, filas=None):
+        """(códigos, matriz filas x columnas sumadas) de las filas indicadas del DataFrame (todas si filas es None)"""
+        def tomar(col):
+            valores = df[col].to_numpy()
+            return valores if filas is None else valores[filas]
+
+        cantidad = len(df) if filas is None else len(filas)
+        if 'Nombre de la Especie' in df.columns:
+            es_totales = tomar('Nombre de la Especie') == CLAVE_TOTALES
+        else:
+            es_totales = np.zeros(cantidad, dtype=bool)
+        tipos = tomar('TIPO') if 'TIPO' in df.columns else np.full(cantidad, None, dtype=object)
+        codigos = self.codigos(tipos, es_totales)
+
+        valores = np.zeros((cantidad, len(self.columnas)))
+        for j, col in enumerate(self.columnas):
+            columna = tomar(col)
+            if columna.dtype.kind != 'f':
+                # Tenencias restauradas o consolidadas pueden traer números como texto
+                columna = pd.to_numeric(columna, errors='coerce')
+            valores[:, j] = columna
+        valores[np.isnan(valores)] = 0.0
+        return codigos, valores
+
+    def recalcular(self, codigos, valores):
+        """Sumas desde cero, para la carga inicial o un cambio de columnas"""
+        self.sumas[:] = 0.0
+        self.cantidades[:] = 0
+        self.sumar(codigos, valores)
+
+    def sumar(self, codigos, valores, signo=1):
+        en_grupo = codigos >= 0
+        np.add.at(self.sumas, codigos[en_grupo], signo * valores[en_grupo])
+        np.add.at(self.cantidades, codigos[en_grupo], signo)
+
+    def ajustar(self, codigos_antes, valores_antes, codigos_despues, valores_despues):
+        """Resta el aporte anterior de las filas que cambiaron y suma el nuevo"""
+        self.sumar(codigos_antes, valores_antes, signo=-1)
+        self.sumar(codigos_despues, valores_despues)
+        # Un grupo que se vacía vuelve a cero exacto, sin restos de redondeo
+        self.sumas[self.cantidades == 0] = 0.0
+
+    def suma(self, grupo, columna):
+        return float(self.sumas[grupo, self.columnas.index(columna)])
+
+    def total(self, columna):
+        """Suma de la columna en toda la cartera"""
+        return float(self.sumas[:, self.columnas.index(columna)].sum())
@@ -0,0 +1,285 @@
+"""Historial intradiario de precios, cantidades e importes por ticker.
+
+Cada día se guarda en su propio directorio (historial/AAAA-MM-DD/) con:
+
+- ticks.bin: registros de ancho fijo (t, precio, cantidad, importe) agrupados
+  en bloques de tamaño fijo; cada bloque pertenece a un único ticker
+- bloques.u4: id de ticker de cada bloque, en orden (índice ticker -> bloques)
+- tickers.txt: un ticker por línea; el número de línea es su id
+
+ticks.bin se accede como np.memmap, así que agregar una consulta es una
+escritura vectorizada en memoria compartida con el sistema operativo, y leer
+la serie de un ticker solo toca sus bloques. Solo se registran los tickers
+cuyo precio, cantidad o importe cambió desde su último registro.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cartera import claves_unicas
+from normalizacion import columna_numerica
+
+
+DIRECTORIO_HISTORIAL = 'historial'
+
+DTYPE_TICK = np.dtype([('t', '<f8'), ('precio', '<f8'), ('cantidad', '<f8'), ('importe', '<f8')])
+
+REGISTROS_POR_BLOQUE = 256
+BLOQUES_POR_CRECIMIENTO = 256
+
+
+def dia_de(t):
+    """Nombre de la partición (AAAA-MM-DD, hora local) para un timestamp"""
+    return time.strftime('%Y-%m-%d', time.localtime(t))
+
+
+class ParticionDiaria:
+    """Archivos de un día del historial"""
+    def __init__(self, ruta, registros_por_bloque=REGISTROS_POR_BLOQUE, solo_lectura=False):
+        self.ruta = ruta
+        self.registros_por_bloque = registros_por_bloque
+        self.solo_lectura = solo_lectura
+        self.archivo_datos = os.path.join(ruta, 'ticks.bin')
+        self.archivo_bloques = os.path.join(ruta, 'bloques.u4')
+        self.archivo_tickers = os.path.join(ruta, 'tickers.txt')
+
+        if not solo_lectura:
+            os.makedirs(ruta, exist_ok=True)
+
+        # Tabla de tickers
+        self.tickers = []
+        if os.path.exists(self.archivo_tickers):
+            with open(self.archivo_tickers, 'r', encoding='utf-8') as f:
+                self.tickers = f.read().splitlines()
+        self.indice = pd.Index(self.tickers)
+
+        # Bloques de cada ticker, en orden
+        bloques = np.fromfile(self.archivo_bloques, dtype='<u4') if os.path.exists(self.archivo_bloques) else np.zeros(0, '<u4')
+        self.total_bloques = len(bloques)
+        self.ticker_de_bloque = bloques.astype(np.int64)
+        self.bloques_de = [[] for _ in self.tickers]
+        for bloque, ticker_id in enumerate(bloques):
+            self.bloques_de[ticker_id].append(bloque)
+
+        self.mm = None
+        self.capacidad_bloques = 0
+        self.abrir_datos()
+
+        # Estado de escritura: bloque actual, registros usados y último valor por ticker
+        n = len(self.tickers)
+        self.bloque_actual = np.full(n, -1, dtype=np.int64)
+        self.llenado = np.full(n, registros_por_bloque, dtype=np.int64)
+        self.ultimo = np.full((n, 3), np.nan)
+        for ticker_id, bloques_ticker in enumerate(self.bloques_de):
+            if bloques_ticker and self.mm is not None:
+                registros = self.registros_bloque(bloques_ticker[-1])
+                usados = int((registros['t'] > 0).sum())
+                self.bloque_actual[ticker_id] = bloques_ticker[-1]
+                self.llenado[ticker_id] = usados
+                if usados:
+                    ultimo = registros[usados - 1]
+                    self.ultimo[ticker_id] = (ultimo['precio'], ultimo['cantidad'], ultimo['importe'])
+
+    def abrir_datos(self):
+        """(Re)abre ticks.bin como memmap con el tamaño actual del archivo"""
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm = None
+        if not os.path.exists(self.archivo_datos):
+            return
+        registros = os.path.getsize(self.archivo_datos) // DTYPE_TICK.itemsize
+        self.capacidad_bloques = registros // self.registros_por_bloque
+        if self.capacidad_bloques:
+            self.mm = np.memmap(self.archivo_datos, dtype=DTYPE_TICK, mode='r' if self.solo_lectura else 'r+',
+                                shape=(self.capacidad_bloques * self.registros_por_bloque,))
+
+    def asegurar_capacidad(self, bloques):
+        """Agranda ticks.bin en tramos para alojar al menos la cantidad de bloques indicada"""
+        if bloques <= self.capacidad_bloques:
+            return
+        nueva = max(bloques, self.capacidad_bloques + BLOQUES_POR_CRECIMIENTO)
+        with open(self.archivo_datos, 'ab') as f:
+            f.truncate(nueva * self.registros_por_bloque * DTYPE_TICK.itemsize)
+        self.abrir_datos()
+
+    def registros_bloque(self, bloque):
+        inicio = bloque * self.registros_por_bloque
+        return self.mm[inicio:inicio + self.registros_por_bloque]
+
+    def ids_de(self, tickers):
+        """Ids de los tickers, dando de alta los que no existían"""
+        ids = self.indice.get_indexer(tickers)
+        nuevos = ids < 0
+        if nuevos.any():
+            altas = list(pd.unique(tickers[nuevos]))
+            with open(self.archivo_tickers, 'a', encoding='utf-8') as f:
+                f.write(''.join(f"{ticker}\n" for ticker in altas))
+            self.tickers.extend(altas)
+            self.indice = pd.Index(self.tickers)
+            self.bloques_de.extend([] for _ in altas)
+            self.bloque_actual = np.concatenate([self.bloque_actual, np.full(len(altas), -1, dtype=np.int64)])
+            self.llenado = np.concatenate([self.llenado, np.full(len(altas), self.registros_por_bloque, dtype=np.int64)])
+            self.ultimo = np.vstack([self.ultimo, np.full((len(altas), 3), np.nan)])
+            ids = self.indice.get_indexer(tickers)
+        return ids
+
+    def registrar(self, t, tickers, precios, cantidades, importes):
+        """Agrega un registro por ticker que haya cambiado; devuelve cuántos se escribieron"""
+        ids = self.ids_de(tickers)
+        if len(ids) and np.bincount(ids).max() > 1:
+            # Tickers repetidos en la tenencia: cada aparición lleva su propia serie (Ticker#1, ...), como en Cartera
+            ids = self.ids_de(claves_unicas(tickers))
+        valores = np.column_stack([precios, cantidades, importes])
+
+        # Solo los que cambiaron desde su último registro
+        cambiaron = ~(valores == self.ultimo[ids]).all(axis=1)
+        if not cambiaron.any():
+            return 0
+        ids = ids[cambiaron]
+        valores = valores[cambiaron]
+
+        # Bloques nuevos para los tickers sin bloque o con el bloque lleno
+        llenos = ids[self.llenado[ids] >= self.registros_por_bloque]
+        if len(llenos):
+            nuevos_bloques = np.arange(self.total_bloques, self.total_bloques + len(llenos))
+            self.asegurar_capacidad(self.total_bloques + len(llenos))
+            with open(self.archivo_bloques, 'ab') as f:
+                llenos.astype('<u4').tofile(f)
+            for ticker_id, bloque in zip(llenos, nuevos_bloques):
+                self.bloques_de[ticker_id].append(int(bloque))
+            self.ticker_de_bloque = np.concatenate([self.ticker_de_bloque, llenos])
+            self.bloque_actual[llenos] = nuevos_bloques
+            self.llenado[llenos] = 0
+            self.total_bloques += len(llenos)
+
+        # Escritura vectorizada en el memmap
+        posiciones = self.bloque_actual[ids] * self.registros_por_bloque + self.llenado[ids]
+        registros = np.empty(len(ids), dtype=DTYPE_TICK)
+        registros['t'] = t
+        registros['precio'] = valores[:, 0]
+        registros['cantidad'] = valores[:, 1]
+        registros['importe'] = valores[:, 2]
+        self.mm[posiciones] = registros
+
+        self.llenado[ids] += 1
+        self.ultimo[ids] = valores
+        return len(ids)
+
+    def serie(self, ticker, desde=0):
+        """Registros de un ticker en orden temporal, leyendo solo sus bloques.
+
+        Con desde se saltean los primeros registros del ticker (los ya leídos)
+        y solo se tocan los bloques que contienen los siguientes.
+        """
+        if self.mm is None or ticker not in self.indice:
+            return np.zeros(0, dtype=DTYPE_TICK)
+        primer_bloque, salteados = divmod(desde, self.registros_por_bloque)
+        bloques = self.bloques_de[self.indice.get_loc(ticker)][primer_bloque:]
+        registros = self.mm.reshape(-1, self.registros_por_bloque)[bloques].reshape(-1)[salteados:]
+        return registros[registros['t'] > 0]
+
+    def registros(self):
+        """(ticker de cada registro, registros) de todo el día, en orden de bloque"""
+        if self.mm is None or not self.total_bloques:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=DTYPE_TICK)
+        registros = self.mm[:self.total_bloques * self.registros_por_bloque]
+        ids = np.repeat(self.ticker_de_bloque, self.registros_por_bloque)
+        validos = registros['t'] > 0
+        return ids[validos], np.array(registros[validos])
+
+    def cerrar(self):
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm = None
+
+
+class HistorialIntradiario:
+    """Guarda cada consulta en la partición del día y permite leer series por ticker.
+
+    Se puede leer desde otro hilo mientras el sondeo escribe: registrar y las
+    lecturas del día en curso toman el mismo lock. Una vez cerrado, registrar
+    no escribe más (no vuelve a abrir una partición que nadie cerraría).
+    """
+    def __init__(self, directorio=DIRECTORIO_HISTORIAL, registros_por_bloque=REGISTROS_POR_BLOQUE):
+        self.directorio = directorio
+        self.registros_por_bloque = registros_por_bloque
+        self.dia = None
+        self.particion = None
+        self.cerrado = False
+        self.lock = threading.Lock()
+
+    def particion_para(self, t):
+        dia = dia_de(t)
+        if dia != self.dia:
+            if self.particion is not None:
+                self.particion.cerrar()
+            self.particion = ParticionDiaria(os.path.join(self.directorio, dia), self.registros_por_bloque)
+            self.dia = dia
+        return self.particion
+
+    def registrar(self, df, t=None):
+        """Registra precio, cantidad e importe de cada ticker del DataFrame normalizado"""
+        if df.empty or 'Ticker' not in df.columns:
+            return 0
+        t = time.time() if t is None else t
+
+        tickers = df['Ticker'].astype(str).to_numpy(dtype=object)
+        validas = tickers != ''
+        if 'Nombre de la Especie' in df.columns:
+            validas &= (df['Nombre de la Especie'] != 'TOTALES').to_numpy()
+
+        precios = columna_numerica(df, 'Ultimo Precio')[validas]
+        cantidades = columna_numerica(df, 'Cantidad')[validas]
+        importes = columna_numerica(df, 'Importe Actual')[validas]
+        with self.lock:
+            if self.cerrado:
+                return 0
+            return self.particion_para(t).registrar(t, tickers[validas], precios, cantidades, importes)
+
+    def serie(self, ticker, dia=None, desde=0):
+        """Serie intradiaria de un ticker (array estructurado t, precio, cantidad, importe).
+
+        desde saltea los primeros registros del ticker, para leer solo los nuevos.
+        """
+        if dia is None or dia == self.dia:
+            with self.lock:
+                if self.particion is not None:
+                    return np.array(self.particion.serie(ticker, desde))
+            dia = dia if dia is not None else dia_de(time.time())
+
+        ruta = os.path.join(self.directorio, dia)
+        if not os.path.isdir(ruta):
+            return np.zeros(0, dtype=DTYPE_TICK)
+        particion = ParticionDiaria(ruta, self.registros_por_bloque, solo_lectura=True)
+        try:
+            return np.array(particion.serie(ticker, desde))
+        finally:
+            particion.cerrar()
+
+    def registros_del_dia(self, dia):
+        """(tickers, ticker de cada registro, registros) de un día; vacío si no hay historial"""
+        with self.lock:
+            if dia == self.dia and self.particion is not None:
+                ids, registros = self.particion.registros()
+                return list(self.particion.tickers), ids, registros
+
+        ruta = os.path.join(self.directorio, dia)
+        if not os.path.isdir(ruta):
+            return [], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=DTYPE_TICK)
+        particion = ParticionDiaria(ruta, self.registros_por_bloque, solo_lectura=True)
+        try:
+            ids, registros = particion.registros()
+            return list(particion.tickers), ids, registros
+        finally:
+            particion.cerrar()
+
+    def cerrar(self):
+        with self.lock:
+            if self.particion is not None:
+                self.particion.cerrar()
+                self.particion = None
+            self.dia = None
+            self.cerrado = True
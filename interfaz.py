@@ -0,0 +1,1688 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTableWidget, QTableView, QTabWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QHeaderView,
+                            QWidget, QLabel, QPushButton, QDialog, QMessageBox, QSpinBox,
+                            QStyledItemDelegate, QStyleOptionViewItem, QStyle, QSystemTrayIcon,
+                            QLineEdit, QComboBox, QCheckBox, QTimeEdit)
+from PyQt5.QtCore import (QTimer, Qt, pyqtSlot ,pyqtSignal, QObject, QPointF, QTime, QSocketNotifier,
+                          QAbstractTableModel, QModelIndex, QSortFilterProxyModel)
+from PyQt5.QtGui import QColor, QPalette, QPixmap, QFont, QPainter, QPen, QPolygonF, QIcon
+
+from alertas import ReglasCompiladas, MotorAlertas, RegistroAlertas, texto_alerta, CLAVE_AGREGADO
+from barras import BaseComparacion, DESCRIPCION_BASE, MINUTOS_BASE, BASE_MINUTOS, BASE_HORA
+from bitacora import obtener
+from configuracion import cargar_configuracion
+from cuentas import SondeoCuenta, cuentas_desde_config, cargar_ultima, MAX_HILOS
+from cartera import TIPO_ACTIVO, TIPO_EFECTIVO
+from diferencias import claves_de_filas, diferenciar_instantaneas
+from grupos import SubtotalesPorTipo, columnas_sumables, COLUMNA_PESO, COLUMNA_BASE_PESO, SIN_GRUPO
+from metricas import Metricas, CapturaPerfil, ServidorMetricas, ARCHIVO_METRICAS
+from motor import ClienteMotor
+from publicacion import PublicadorTenencias
+from grabacion import GrabadorRespuestas, ReproductorSHDA
+from normalizacion import consolidar_tenencias
+from operaciones import CacheOperaciones, unir_operaciones
+from series import unir_tendencias, VENTANA_MINUTOS
+from sesion import GestorSesiones, describir_estado, CONECTANDO, CONECTADO, REINTENTANDO, DESCRIPCION_ERROR
+
+
+log = obtener('interfaz')
+log_alertas = obtener('alertas')
+
+
+class ConexionLED(QLabel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedSize(10, 10)
+        self.conectado = False
+        self.reintentando = False
+        self.actualizar_estado()
+    
+    def actualizar_estado(self, conectado=False, reintentando=False):
+        self.conectado = conectado
+        self.reintentando = reintentando
+        if reintentando:
+            color = QColor(255, 200, 0)  # Amarillo: conectando o reconectando
+        else:
+            color = QColor(0, 255, 0) if conectado else QColor(255, 0, 0)  # Verde o Rojo
+        palette = self.palette()
+        palette.setColor(QPalette.Window, color)
+        self.setAutoFillBackground(True)
+        self.setPalette(palette)
+
+class DetalleOperacionesDialog(QDialog):
+    """Operaciones del día de un ticker, en una ventana no modal que se actualiza con cada consulta"""
+    def __init__(self, ticker, operaciones, parent=None):
+        super().__init__(parent)
+        self.ticker = ticker
+        self.operaciones = None
+        self.setWindowTitle(f"Detalle de Operaciones - {ticker}")
+        self.setModal(False)
+        self.resize(600, 400)
+        self.setAttribute(Qt.WA_DeleteOnClose)  # Eliminar el diálogo al cerrarse
+        
+        layout = QVBoxLayout()
+        
+        # Título
+        self.titulo = QLabel()
+        self.titulo.setFont(QFont("Arial", 12, QFont.Bold))
+        self.titulo.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.titulo)
+        
+        # Tabla de operaciones
+        self.tabla = QTableWidget()
+        self.tabla.setColumnCount(4)
+        self.tabla.setHorizontalHeaderLabels(['Estado', 'Importe', 'Cantidad', 'Precio'])
+        
+        # Configurar tabla
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        self.tabla.setAlternatingRowColors(True)
+        layout.addWidget(self.tabla)
+        
+        # Botón cerrar
+        btn_layout = QHBoxLayout()
+        btn_cerrar = QPushButton("Cerrar")
+        btn_cerrar.clicked.connect(self.close)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_cerrar)
+        
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+        
+        self.actualizar(operaciones)
+    
+    def actualizar(self, operaciones):
+        """Vuelve a llenar la tabla solo si cambiaron las operaciones del ticker.
+        
+        El cache de operaciones devuelve el mismo array mientras el detalle no
+        cambie, así que en general alcanza con comparar la identidad.
+        """
+        if operaciones is self.operaciones:
+            return
+        if (operaciones is not None and self.operaciones is not None
+                and np.array_equal(operaciones, self.operaciones)):
+            self.operaciones = operaciones
+            return
+        self.operaciones = operaciones
+        if operaciones is None:
+            operaciones = []
+        
+        cantidad = len(operaciones)
+        self.titulo.setText(f"Operaciones para: {self.ticker}" if cantidad else
+                            f"Operaciones para: {self.ticker} (sin operaciones en la última consulta)")
+        
+        # Llenar datos desde el array ya parseado (DETA, IMPO, CANT, PCIO)
+        self.tabla.setUpdatesEnabled(False)
+        self.tabla.setRowCount(cantidad)
+        for row, op in enumerate(operaciones):
+            importe = float(op['IMPO'])
+            self.tabla.setItem(row, 0, QTableWidgetItem(str(op['DETA'])))
+            self.tabla.setItem(row, 1, QTableWidgetItem(f"{importe:,.2f}"))
+            self.tabla.setItem(row, 2, QTableWidgetItem(f"{float(op['CANT']):g}"))
+            self.tabla.setItem(row, 3, QTableWidgetItem(f"{float(op['PCIO']):,.2f}"))
+            
+            # Colorear según el importe (positivo/negativo)
+            color = QColor(144, 238, 144) if importe >= 0 else QColor(255, 182, 193)  # Verde claro / Rosa claro
+            
+            for col in range(4):
+                item = self.tabla.item(row, col)
+                item.setBackground(color)
+                
+                # Alinear números a la derecha
+                if col in [1, 2, 3]:  # Importe, Cantidad, Precio
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.tabla.setUpdatesEnabled(True)
+
+
+# Columnas numéricas que se alinean a la derecha
+COLUMNAS_DERECHA = ['Cantidad', 
+                    'Ultimo Precio',            
+                    'Resultado', 
+                    'Costo Promedio', 
+                    'Sabe Dios', 
+                    '% Var Total', 
+                    'Importe Actual', 
+                    '% Diario',
+                    'Resultado del dia',
+                    'Actual en U$S',
+                    'Operaciones',
+                    'Cant. Operada',
+                    'Neto Operado',
+                    'VWAP',
+                    'Máx. Día',
+                    'Mín. Día',
+                    'Var % Ventana',
+                    'Volatilidad',
+                    COLUMNA_PESO]
+
+# Cantidades: se muestran sin decimales cuando el valor es entero
+COLUMNAS_ENTERAS = ['Cantidad', 'Operaciones', 'Cant. Operada']
+
+COLUMNA_DETALLE = 'Detalle de operaciones diarias'
+
+COLUMNA_TENDENCIA = 'Tendencia'
+
+# Rol con el valor crudo de la celda, usado por el proxy para ordenar
+ROL_ORDEN = Qt.UserRole + 1
+# Rol con los últimos precios del ticker, que dibuja DelegadoTendencia
+ROL_TENDENCIA = Qt.UserRole + 2
+
+COLOR_CON_OPERACIONES = QColor(127, 255, 212)  # Verde agua (Aquamarine)
+COLOR_FILA_PAR = QColor(130, 130, 130)
+COLOR_FILA_IMPAR = QColor(150, 150, 150)
+COLOR_NEGATIVO = QColor(180, 0, 0)  # Dark Red
+COLOR_CLICKEABLE = QColor(0, 0, 190)  # Azul para indicar que es clickeable
+COLOR_CAMBIO = QColor(255, 235, 120)  # Amarillo suave para celdas recién modificadas
+COLOR_GRUPO = QColor(201, 217, 230)  # Filas de subtotal por TIPO
+COLOR_SUBE = QColor(0, 110, 0)
+COLOR_BAJA = COLOR_NEGATIVO
+
+DURACION_RESALTADO_MS = 1000
+ANCHO_TENDENCIA = 120  # Píxeles de la columna Tendencia
+
+
+class ModeloTenencias(QAbstractTableModel):
+    """Modelo de tabla que sirve las celdas directamente desde las columnas del DataFrame.
+    
+    El formato, los colores y la alineación se resuelven en data() según el rol,
+    sin crear un objeto por celda en cada actualización. Las filas se emparejan
+    por Ticker entre instantáneas y solo se notifican las celdas que cambiaron,
+    de modo que la selección, el scroll y el orden sobreviven al refresco.
+    
+    Después de las filas del DataFrame van las filas de subtotal de cada TIPO
+    (una por grupo, ocultas salvo que el proxy agrupe). Sus sumas se ajustan
+    solo con las filas que cambiaron. La columna % Cartera no viene en el
+    DataFrame: se calcula al pintar con el total de los subtotales.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.df = None  # Instantánea actual, en el orden de filas del modelo
+        self.claves = None  # Clave de cada fila (Ticker o TOTALES)
+        self.columnas_df = []  # Columnas del DataFrame
+        self.columnas = []  # Nombres de columna del modelo (las del DataFrame más % Cartera)
+        self.valores = []  # Un array por columna (None en % Cartera)
+        self.filas = 0  # Filas del DataFrame; las de subtotal van después
+        self.subtotales = SubtotalesPorTipo()
+        self.grupo_fila = np.zeros(0, dtype=np.intp)  # Grupo de TIPO de cada fila (SIN_GRUPO en TOTALES)
+        self.sumandos = np.zeros((0, 0))  # Aporte de cada fila a las sumas de su grupo
+        self.filas_grupo = 0  # Filas de subtotal ya notificadas a la vista
+        self.total_peso = np.nan  # Importe Actual total, base de % Cartera
+        self.cambio_total_peso = False  # Cambió el total en la última actualización
+        self.plegados = set()  # Nombres de los grupos plegados
+        self.busqueda = None  # Ticker y especie en minúsculas, para el filtro de texto
+        self.coincidencias = None  # (texto, filas que coinciden, grupos con alguna fila que coincide)
+        self.tiene_operaciones = np.zeros(0, dtype=bool)
+        self.operaciones = {}  # Ticker -> operaciones del día (array DETA, IMPO, CANT, PCIO)
+        self.cache_operaciones = CacheOperaciones()  # Para DataFrames que llegan sin operaciones parseadas
+        self.tendencias = None  # series.Tendencias con los últimos precios de cada ticker
+        self.alineacion_columnas = []
+        self.enteras = []  # Columnas de cantidades: sin decimales si el valor es entero
+        self.col_ticker = None
+        self.col_tendencia = None
+        self.col_peso = None
+        self.col_base_peso = None
+        self.col_etiqueta_grupo = 0  # Columna donde se muestra el nombre del grupo
+        self.fuente = QFont()
+        self.fuente.setBold(True)
+        
+        # Resaltado breve de las celdas que cambiaron
+        self.resaltar_cambios = True
+        self.resaltado_hasta = np.zeros((0, 0))  # Vencimiento (time.monotonic) por celda
+        self.timer_resaltado = QTimer(self)
+        self.timer_resaltado.setSingleShot(True)
+        self.timer_resaltado.timeout.connect(self.limpiar_resaltado)
+    
+    def actualizar_df(self, df, operaciones=None, tendencias=None):
+        """Actualiza el modelo con una nueva instantánea, notificando solo lo que cambió.
+        
+        operaciones es el diccionario ticker -> operaciones ya parseado en el pool;
+        si no se pasa, se arma desde la columna de detalle. tendencias son los
+        últimos precios por ticker; la columna Tendencia cuenta los precios
+        registrados, así que cambia (y se repinta) cuando cambia la serie.
+        """
+        self.tendencias = tendencias
+        self.cambio_total_peso = False
+        if operaciones is None:
+            if 'Ticker' in df.columns and COLUMNA_DETALLE in df.columns:
+                operaciones = self.cache_operaciones.procesar(df['Ticker'].astype(str).to_numpy(),
+                                                              df[COLUMNA_DETALLE].to_numpy())
+            else:
+                operaciones = {}
+        self.operaciones = operaciones
+        
+        claves = claves_de_filas(df)
+        
+        diferencia = None
+        if self.df is not None and self.claves is not None and claves is not None:
+            diferencia = diferenciar_instantaneas(self.df, df, self.claves, claves)
+        
+        if diferencia is None:
+            # Primera carga, cambio de columnas o filas sin clave única
+            self.beginResetModel()
+            self.cargar(df.reset_index(drop=True), claves)
+            self.subtotales = SubtotalesPorTipo(columnas_sumables(self.columnas_df))
+            self.grupo_fila, self.sumandos = self.subtotales.aportes(self.df)
+            self.subtotales.recalcular(self.grupo_fila, self.sumandos)
+            self.filas_grupo = len(self.subtotales.grupos)
+            self.total_peso = self.calcular_total_peso()
+            self.resaltado_hasta = np.zeros((self.filas, len(self.columnas)))
+            self.endResetModel()
+            return
+        
+        if not diferencia.vacia:
+            self.aplicar_diferencia(df, claves, diferencia)
+    
+    def cargar(self, df, claves):
+        """Carga el almacenamiento por columnas desde un DataFrame ya ordenado"""
+        self.df = df
+        self.claves = claves
+        self.filas = len(df)
+        self.busqueda = None
+        self.coincidencias = None
+        
+        if list(df.columns) != self.columnas_df:
+            self.columnas_df = list(df.columns)
+            self.columnas = list(self.columnas_df)
+            if COLUMNA_BASE_PESO in self.columnas:
+                self.columnas.insert(self.columnas.index(COLUMNA_BASE_PESO) + 1, COLUMNA_PESO)
+            self.alineacion_columnas = [
+                (Qt.AlignRight if col in COLUMNAS_DERECHA else Qt.AlignLeft) | Qt.AlignVCenter
+                for col in self.columnas
+            ]
+            self.enteras = [col in COLUMNAS_ENTERAS for col in self.columnas]
+            self.col_ticker = self.columnas.index('Ticker') if 'Ticker' in self.columnas else None
+            self.col_tendencia = self.columnas.index(COLUMNA_TENDENCIA) if COLUMNA_TENDENCIA in self.columnas else None
+            self.col_peso = self.columnas.index(COLUMNA_PESO) if COLUMNA_PESO in self.columnas else None
+            self.col_base_peso = self.columnas.index(COLUMNA_BASE_PESO) if self.col_peso is not None else None
+            self.col_etiqueta_grupo = next((self.columnas.index(col) for col in ('TIPO', 'Nombre de la Especie')
+                                            if col in self.columnas), 0)
+        self.valores = [None if col == COLUMNA_PESO else df[col].to_numpy() for col in self.columnas]
+        
+        # Filas con operaciones del día, calculado de una vez para toda la columna
+        if self.operaciones and self.col_ticker is not None:
+            tickers = df['Ticker'].astype(str).to_numpy()
+            self.tiene_operaciones = pd.Index(list(self.operaciones)).get_indexer(tickers) >= 0
+        else:
+            self.tiene_operaciones = np.zeros(self.filas, dtype=bool)
+    
+    def aplicar_diferencia(self, df, claves, diferencia):
+        """Aplica bajas, cambios de celdas y altas como notificaciones puntuales"""
+        # Aportes a los subtotales que se restan (antes) y se suman (después)
+        codigos_antes, valores_antes, codigos_despues, valores_despues = [], [], [], []
+        
+        # 1. Bajas, de abajo hacia arriba por bloques contiguos
+        eliminadas = diferencia.pos_eliminadas
+        if len(eliminadas):
+            codigos_antes.append(self.grupo_fila[eliminadas])
+            valores_antes.append(self.sumandos[eliminadas])
+            cortes = np.flatnonzero(np.diff(eliminadas) != 1) + 1
+            for bloque in reversed(np.split(eliminadas, cortes)):
+                primera, ultima = int(bloque[0]), int(bloque[-1])
+                self.beginRemoveRows(QModelIndex(), primera, ultima)
+                mantener = np.r_[0:primera, ultima + 1:self.filas]
+                self.cargar(self.df.iloc[mantener].reset_index(drop=True), self.claves[mantener])
+                self.resaltado_hasta = self.resaltado_hasta[mantener]
+                self.grupo_fila = self.grupo_fila[mantener]
+                self.sumandos = self.sumandos[mantener]
+                self.endRemoveRows()
+        
+        # 2. Filas comunes: quedan en el orden actual con los valores nuevos
+        orden = diferencia.orden_nuevo()
+        df_ordenado = df.iloc[orden].reset_index(drop=True)
+        claves_ordenadas = claves[orden]
+        comunes = len(diferencia.pos_nuevo)
+        
+        operaciones_antes = self.tiene_operaciones
+        self.cargar(df_ordenado.iloc[:comunes], claves_ordenadas[:comunes])
+        cambios = diferencia.cambios
+        cambio_operaciones = operaciones_antes != self.tiene_operaciones
+        
+        # Solo las filas con cambios en TIPO o en columnas sumadas mueven los subtotales
+        afectan = [j for j, col in enumerate(diferencia.columnas)
+                   if col == 'TIPO' or col in self.subtotales.columnas]
+        cambiadas = np.flatnonzero(cambios[:, afectan].any(axis=1)) if afectan else np.zeros(0, dtype=np.intp)
+        if len(cambiadas):
+            codigos, valores = self.subtotales.aportes(self.df, cambiadas)
+            codigos_antes.append(self.grupo_fila[cambiadas])
+            valores_antes.append(self.sumandos[cambiadas])
+            codigos_despues.append(codigos)
+            valores_despues.append(valores)
+            self.grupo_fila[cambiadas] = codigos
+            self.sumandos[cambiadas] = valores
+        
+        if self.col_peso is not None:
+            # % Cartera no está en el DataFrame: cambia con el Importe Actual de la fila
+            cambios = np.insert(cambios, self.col_peso, cambios[:, self.col_base_peso], axis=1)
+        
+        if self.resaltar_cambios and cambios.any():
+            self.resaltado_hasta[cambios] = time.monotonic() + DURACION_RESALTADO_MS / 1000
+        
+        ultima_columna = len(self.columnas) - 1
+        for row in np.flatnonzero(cambios.any(axis=1) | cambio_operaciones):
+            if cambio_operaciones[row]:
+                # Cambia el color de toda la fila
+                primera, ultima = 0, ultima_columna
+            else:
+                columnas_fila = np.flatnonzero(cambios[row])
+                primera, ultima = int(columnas_fila[0]), int(columnas_fila[-1])
+            self.dataChanged.emit(self.index(int(row), primera), self.index(int(row), ultima))
+        
+        # 3. Altas, al final de las filas de datos (antes de los subtotales)
+        insertadas = len(diferencia.pos_insertadas)
+        if insertadas:
+            codigos, valores = self.subtotales.aportes(df_ordenado, np.arange(comunes, comunes + insertadas))
+            codigos_despues.append(codigos)
+            valores_despues.append(valores)
+            self.beginInsertRows(QModelIndex(), comunes, comunes + insertadas - 1)
+            self.cargar(df_ordenado, claves_ordenadas)
+            self.resaltado_hasta = np.vstack([self.resaltado_hasta,
+                                              np.zeros((insertadas, len(self.columnas)))])
+            self.grupo_fila = np.concatenate([self.grupo_fila, codigos])
+            self.sumandos = np.vstack([self.sumandos, valores])
+            self.endInsertRows()
+        
+        if codigos_antes or codigos_despues:
+            self.ajustar_subtotales(codigos_antes, valores_antes, codigos_despues, valores_despues)
+        
+        if self.resaltado_hasta.any() and not self.timer_resaltado.isActive():
+            self.timer_resaltado.start(DURACION_RESALTADO_MS)
+    
+    def ajustar_subtotales(self, codigos_antes, valores_antes, codigos_despues, valores_despues):
+        """Ajusta las sumas de los grupos afectados y repinta subtotales y, si cambió el total, % Cartera"""
+        sin_codigos = np.zeros(0, dtype=np.intp)
+        sin_valores = np.zeros((0, len(self.subtotales.columnas)))
+        self.subtotales.ajustar(np.concatenate(codigos_antes + [sin_codigos]),
+                                np.concatenate(valores_antes + [sin_valores]),
+                                np.concatenate(codigos_despues + [sin_codigos]),
+                                np.concatenate(valores_despues + [sin_valores]))
+        
+        # Grupos nuevos: una fila de subtotal más por cada uno
+        grupos = len(self.subtotales.grupos)
+        if grupos > self.filas_grupo:
+            self.beginInsertRows(QModelIndex(), self.filas + self.filas_grupo, self.filas + grupos - 1)
+            self.filas_grupo = grupos
+            self.endInsertRows()
+        if self.filas_grupo:
+            self.dataChanged.emit(self.index(self.filas, 0),
+                                  self.index(self.filas + self.filas_grupo - 1, len(self.columnas) - 1))
+        
+        # Un total nuevo escala todos los pesos por igual: no cambia el orden ni el filtro, solo el
+        # texto. No se notifica la columna entera (el proxy volvería a filtrar todas las filas):
+        # la tabla repinta lo visible
+        total = self.calcular_total_peso()
+        self.cambio_total_peso = total != self.total_peso
+        self.total_peso = total
+    
+    def calcular_total_peso(self):
+        if COLUMNA_BASE_PESO not in self.subtotales.columnas:
+            return np.nan
+        return self.subtotales.total(COLUMNA_BASE_PESO)
+    
+    def peso(self, importe):
+        """% Cartera de un importe"""
+        if not self.total_peso or np.isnan(self.total_peso):
+            return np.nan
+        return float(importe) / self.total_peso * 100
+    
+    def es_grupo(self, row):
+        """Indica si la fila es de subtotal"""
+        return row >= self.filas
+    
+    def grupo_de_fila(self, row):
+        """Grupo de TIPO de una fila de datos o de subtotal (SIN_GRUPO para TOTALES)"""
+        if row >= self.filas:
+            return row - self.filas
+        return int(self.grupo_fila[row])
+    
+    def nombre_grupo(self, grupo):
+        return self.subtotales.grupos[grupo] if grupo >= 0 else None
+    
+    def alternar_grupo(self, grupo):
+        """Pliega o despliega un grupo"""
+        nombre = self.subtotales.grupos[grupo]
+        self.plegados.symmetric_difference_update({nombre})
+        indice = self.index(self.filas + grupo, self.col_etiqueta_grupo)
+        self.dataChanged.emit(indice, indice)
+    
+    def filtrar_texto(self, texto):
+        """(filas que contienen el texto en Ticker o especie, grupos con alguna de esas filas)"""
+        if self.coincidencias is None or self.coincidencias[0] != texto:
+            if self.busqueda is None:
+                partes = [pd.Series(self.valores[self.columnas.index(col)], dtype=object).fillna('').astype(str)
+                          for col in ('Ticker', 'Nombre de la Especie') if col in self.columnas]
+                busqueda = partes[0] if partes else pd.Series([''] * self.filas, dtype=object)
+                for parte in partes[1:]:
+                    busqueda = busqueda + ' ' + parte
+                self.busqueda = busqueda.str.lower()
+            filas = self.busqueda.str.contains(texto.lower(), regex=False).to_numpy(dtype=bool)
+            self.coincidencias = (texto, filas, set(np.unique(self.grupo_fila[filas]).tolist()))
+        return self.coincidencias[1], self.coincidencias[2]
+    
+    def limpiar_resaltado(self):
+        """Quita el resaltado de las celdas cuyo tiempo venció"""
+        ahora = time.monotonic()
+        vencidas = (self.resaltado_hasta > 0) & (self.resaltado_hasta <= ahora)
+        self.resaltado_hasta[vencidas] = 0
+        
+        for row in np.flatnonzero(vencidas.any(axis=1)):
+            columnas_fila = np.flatnonzero(vencidas[row])
+            self.dataChanged.emit(self.index(int(row), int(columnas_fila[0])),
+                                  self.index(int(row), int(columnas_fila[-1])),
+                                  [Qt.BackgroundRole])
+        
+        pendientes = self.resaltado_hasta[self.resaltado_hasta > 0]
+        if len(pendientes):
+            self.timer_resaltado.start(max(1, int((pendientes.min() - ahora) * 1000)))
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.filas + self.filas_grupo
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columnas)
+    
+    def valor(self, row, col):
+        """Devuelve el valor crudo de una celda"""
+        return self.valores[col][row]
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        row, col = index.row(), index.column()
+        if row >= self.filas:
+            return self.data_grupo(row - self.filas, col, role)
+        if col == self.col_peso:
+            value = self.peso(self.valores[self.col_base_peso][row])
+        else:
+            value = self.valores[col][row]
+        
+        if role == Qt.DisplayRole:
+            if col == self.col_tendencia:
+                return ''  # La dibuja DelegadoTendencia
+            if isinstance(value, (float, np.floating)):
+                if np.isnan(value):
+                    return ''
+                if self.enteras[col] and float(value).is_integer():
+                    return f"{value:.0f}"
+                return f"{value:.2f}"
+            return str(value)
+        
+        if role == Qt.TextAlignmentRole:
+            return self.alineacion_columnas[col]
+        
+        if role == Qt.FontRole:
+            return self.fuente
+        
+        if role == Qt.BackgroundRole:
+            if self.resaltado_hasta[row, col]:
+                return COLOR_CAMBIO
+            if self.tiene_operaciones[row]:
+                return COLOR_CON_OPERACIONES
+            # Alternar colores de filas
+            return COLOR_FILA_PAR if row % 2 == 0 else COLOR_FILA_IMPAR
+        
+        if role == Qt.ForegroundRole:
+            if col == self.col_ticker and self.tiene_operaciones[row]:
+                return COLOR_CLICKEABLE
+            if isinstance(value, (int, float, np.integer, np.floating)):
+                if value < 0:
+                    return COLOR_NEGATIVO
+            elif str(value).startswith('-'):
+                return COLOR_NEGATIVO
+            return None
+        
+        if role == Qt.UserRole:
+            # Operaciones parseadas, solo en la columna Ticker de filas con operaciones
+            if col == self.col_ticker and self.tiene_operaciones[row]:
+                return self.operaciones.get(str(value))
+            return None
+        
+        if role == ROL_ORDEN:
+            return value
+        
+        if role == ROL_TENDENCIA:
+            if col == self.col_tendencia and self.tendencias is not None and self.col_ticker is not None:
+                return self.tendencias.serie(str(self.valores[self.col_ticker][row]))
+            return None
+        
+        return None
+    
+    def data_grupo(self, grupo, col, role):
+        """Celdas de la fila de subtotal de un grupo: nombre, cantidad de filas, sumas y % Cartera"""
+        columna = self.columnas[col]
+        value = None
+        if columna in self.subtotales.columnas:
+            value = self.subtotales.suma(grupo, columna)
+        elif col == self.col_peso:
+            value = self.peso(self.subtotales.suma(grupo, COLUMNA_BASE_PESO))
+        
+        if role == Qt.DisplayRole:
+            if col == self.col_etiqueta_grupo:
+                nombre = self.subtotales.grupos[grupo]
+                marca = '▸' if nombre in self.plegados else '▾'
+                return f"{marca} {nombre} ({self.subtotales.cantidades[grupo]})"
+            if value is None or np.isnan(value):
+                return ''
+            return f"{value:.2f}"
+        
+        if role == Qt.TextAlignmentRole:
+            return self.alineacion_columnas[col]
+        
+        if role == Qt.FontRole:
+            return self.fuente
+        
+        if role == Qt.BackgroundRole:
+            return COLOR_GRUPO
+        
+        if role == Qt.ForegroundRole:
+            if value is not None and value < 0:
+                return COLOR_NEGATIVO
+            return None
+        
+        if role == ROL_ORDEN:
+            return value
+        
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self.columnas[section] if section < len(self.columnas) else None
+            if section >= self.filas:
+                return ''
+            return str(section + 1)
+        if role == Qt.FontRole and orientation == Qt.Horizontal:
+            return self.fuente
+        return None
+
+
+class ProxyOrdenTenencias(QSortFilterProxyModel):
+    """Ordena por el valor crudo de cada celda y mantiene la fila TOTALES al final.
+    
+    También filtra por texto (Ticker o especie) y por TIPO, y, si se agrupa,
+    muestra cada grupo bajo su fila de subtotal (los plegados, solo el
+    subtotal). Filtrar o agrupar solo vuelve a evaluar las filas que ya tiene
+    el modelo: no consulta SHDA ni rearma la tabla.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(ROL_ORDEN)
+        self.texto = ''
+        self.tipo = ''  # Vacío: todos los tipos
+        self.agrupar = False
+    
+    def filtrar(self, texto='', tipo='', agrupar=False):
+        self.texto = texto.strip()
+        self.tipo = tipo
+        self.agrupar = agrupar
+        self.invalidate()
+    
+    def es_totales(self, source_row):
+        modelo = self.sourceModel()
+        if 'Nombre de la Especie' not in modelo.columnas or modelo.es_grupo(source_row):
+            return False
+        return modelo.valor(source_row, modelo.columnas.index('Nombre de la Especie')) == 'TOTALES'
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        modelo = self.sourceModel()
+        if not (self.agrupar or self.texto or self.tipo):
+            return not modelo.es_grupo(source_row)
+        grupo = modelo.grupo_de_fila(source_row)
+        if modelo.es_grupo(source_row):
+            if not self.agrupar or not modelo.subtotales.cantidades[grupo]:
+                return False
+            if self.tipo and modelo.nombre_grupo(grupo) != self.tipo:
+                return False
+            return not self.texto or grupo in modelo.filtrar_texto(self.texto)[1]
+        
+        if grupo == SIN_GRUPO:
+            return True  # TOTALES
+        if self.tipo and modelo.nombre_grupo(grupo) != self.tipo:
+            return False
+        if self.texto and not modelo.filtrar_texto(self.texto)[0][source_row]:
+            return False
+        return not (self.agrupar and modelo.nombre_grupo(grupo) in modelo.plegados)
+    
+    def lessThan(self, left, right):
+        # TOTALES siempre abajo, sin importar el sentido del orden
+        totales_izq = self.es_totales(left.row())
+        totales_der = self.es_totales(right.row())
+        if totales_izq or totales_der:
+            if self.sortOrder() == Qt.AscendingOrder:
+                return totales_der and not totales_izq
+            return totales_izq and not totales_der
+        
+        if self.agrupar:
+            # Grupos por nombre y su subtotal primero, sin importar el sentido del orden
+            modelo = self.sourceModel()
+            rangos = modelo.subtotales.rangos
+            grupo_izq = int(rangos[modelo.grupo_de_fila(left.row())])
+            grupo_der = int(rangos[modelo.grupo_de_fila(right.row())])
+            ascendente = self.sortOrder() == Qt.AscendingOrder
+            if grupo_izq != grupo_der:
+                return grupo_izq < grupo_der if ascendente else grupo_izq > grupo_der
+            subtotal_izq = modelo.es_grupo(left.row())
+            subtotal_der = modelo.es_grupo(right.row())
+            if subtotal_izq or subtotal_der:
+                if ascendente:
+                    return subtotal_izq and not subtotal_der
+                return subtotal_der and not subtotal_izq
+        
+        valor_izq = left.data(ROL_ORDEN)
+        valor_der = right.data(ROL_ORDEN)
+        
+        # Los números se comparan como números; vacíos y NaN quedan primero
+        izq_num = isinstance(valor_izq, (int, float, np.integer, np.floating)) and not pd.isna(valor_izq)
+        der_num = isinstance(valor_der, (int, float, np.integer, np.floating)) and not pd.isna(valor_der)
+        if izq_num and der_num:
+            return bool(valor_izq < valor_der)
+        if izq_num != der_num:
+            return der_num
+        return str(valor_izq) < str(valor_der)
+
+
+class DelegadoTendencia(QStyledItemDelegate):
+    """Dibuja los últimos precios del ticker como una línea (verde si sube, roja si baja)"""
+    def paint(self, painter, option, index):
+        # Fondo y selección como cualquier otra celda, sin texto
+        opcion = QStyleOptionViewItem(option)
+        self.initStyleOption(opcion, index)
+        estilo = opcion.widget.style() if opcion.widget is not None else QApplication.style()
+        estilo.drawControl(QStyle.CE_ItemViewItem, opcion, painter, opcion.widget)
+        
+        precios = index.data(ROL_TENDENCIA)
+        if precios is None or len(precios) < 2:
+            return
+        
+        rect = option.rect.adjusted(3, 3, -3, -3)
+        minimo, maximo = float(precios.min()), float(precios.max())
+        rango = maximo - minimo or 1.0
+        paso = rect.width() / (len(precios) - 1)
+        x = rect.left() + np.arange(len(precios)) * paso
+        y = rect.bottom() - (precios - minimo) / rango * rect.height()
+        linea = QPolygonF([QPointF(float(px), float(py)) for px, py in zip(x, y)])
+        
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(COLOR_SUBE if precios[-1] >= precios[0] else COLOR_BAJA, 1.5))
+        painter.drawPolyline(linea)
+        painter.restore()
+
+
+class TablaDataFrame(QTableView):
+    def __init__(self, df=None):
+        super().__init__()
+        self.modelo = ModeloTenencias(self)
+        self.proxy = ProxyOrdenTenencias(self)
+        self.proxy.setSourceModel(self.modelo)
+        self.setModel(self.proxy)
+        self.setSortingEnabled(True)  # Habilitar ordenamiento
+        self.detalle_col_idx = None  # Índice de la columna de detalles
+        self.tendencia_col_idx = None
+        self.delegado_tendencia = DelegadoTendencia(self)
+        self.detalles = {}  # Ticker -> DetalleOperacionesDialog abierto
+        
+        # Estilizar encabezados - fondo azul y texto en negrita
+        self.horizontalHeader().setStyleSheet("""
+            QHeaderView::section {
+                background-color: #265A7C;
+                color: white;
+                font-weight: bold;
+                border: 1px solid #666666;
+                padding: 4px;
+            }
+        """)
+        
+        # Conectar evento de click una sola vez
+        self.clicked.connect(self.on_cell_clicked)
+        
+        if df is not None:
+            self.actualizar_df(df)
+            
+    def actualizar_df(self, df, operaciones=None, tendencias=None):
+        columnas_cambiaron = list(df.columns) != self.modelo.columnas_df
+        
+        self.modelo.actualizar_df(df, operaciones, tendencias)
+        if self.modelo.cambio_total_peso:
+            self.viewport().update()  # % Cartera de todas las filas visibles
+        
+        # Los detalles abiertos siguen al cache de operaciones del modelo
+        for ticker, dialogo in self.detalles.items():
+            dialogo.actualizar(self.modelo.operaciones.get(ticker))
+        
+        if columnas_cambiaron:
+            # Encontrar y ocultar la columna de detalles
+            self.detalle_col_idx = None
+            for col in range(self.modelo.columnCount()):
+                self.setColumnHidden(col, False)
+            if COLUMNA_DETALLE in self.modelo.columnas:
+                self.detalle_col_idx = self.modelo.columnas.index(COLUMNA_DETALLE)
+                self.setColumnHidden(self.detalle_col_idx, True)  # Ocultar la columna
+            
+            # Línea de precios recientes en la columna Tendencia
+            if self.tendencia_col_idx is not None:
+                self.setItemDelegateForColumn(self.tendencia_col_idx, None)
+            self.tendencia_col_idx = self.modelo.col_tendencia
+            if self.tendencia_col_idx is not None:
+                self.setItemDelegateForColumn(self.tendencia_col_idx, self.delegado_tendencia)
+            
+            # Ajustar anchos solo cuando cambia la estructura, no en cada actualización
+            self.resizeColumnsToContents()
+            if self.tendencia_col_idx is not None:
+                self.setColumnWidth(self.tendencia_col_idx, ANCHO_TENDENCIA)
+    
+    def filtrar(self, texto='', tipo='', agrupar=False):
+        """Filtra por texto y TIPO y agrupa por TIPO, sobre las filas ya cargadas"""
+        self.proxy.filtrar(texto, tipo, agrupar)
+        if agrupar:
+            if self.proxy.sortColumn() < 0:
+                self.sortByColumn(0, Qt.AscendingOrder)
+            self.resizeColumnToContents(self.modelo.col_etiqueta_grupo)
+    
+    def on_cell_clicked(self, index):
+        """Maneja el click en las celdas"""
+        source = self.proxy.mapToSource(index)
+        if not source.isValid():
+            return
+        
+        # Click en un subtotal: pliega o despliega el grupo
+        if self.modelo.es_grupo(source.row()):
+            self.modelo.alternar_grupo(self.modelo.grupo_de_fila(source.row()))
+            self.proxy.invalidateFilter()
+            return
+        
+        # Verificar si es la columna Ticker y tiene datos de operaciones
+        nombre_columna = self.modelo.columnas[source.column()]
+        if nombre_columna == 'Ticker':
+            operaciones = self.modelo.data(source, Qt.UserRole)
+            if operaciones is not None and len(operaciones):
+                ticker = self.modelo.data(source, Qt.DisplayRole)
+                self.mostrar_detalle(ticker, operaciones)
+    
+    def mostrar_detalle(self, ticker, operaciones):
+        """Abre el detalle del ticker sin pausar el sondeo (o trae al frente el que ya está abierto)"""
+        dialogo = self.detalles.get(ticker)
+        if dialogo is None:
+            dialogo = DetalleOperacionesDialog(ticker, operaciones, self)
+            dialogo.destroyed.connect(lambda *args, ticker=ticker: self.detalles.pop(ticker, None))
+            if self.detalles:
+                # Escalonados, para que no queden uno exactamente encima del otro
+                desplazamiento = 30 * (len(self.detalles) % 10)
+                dialogo.move(dialogo.pos().x() + desplazamiento, dialogo.pos().y() + desplazamiento)
+            self.detalles[ticker] = dialogo
+            dialogo.show()
+        dialogo.raise_()
+        dialogo.activateWindow()
+
+
+class TrabajadorSondeo(QObject):
+    """Sondea una cuenta: programa sus consultas y las ejecuta en el pool de hilos compartido.
+    
+    Vive en el hilo de la interfaz; solo consultar() corre en el pool, y su
+    resultado vuelve por una señal encolada.
+    """
+    datos_listos = pyqtSignal(object, object, object)  # DataFrame normalizado, operaciones y tendencias por ticker
+    error = pyqtSignal(str)  # mensaje
+    estado = pyqtSignal(str)  # resumen del planificador
+    conexion = pyqtSignal(object)  # SondeoCuenta.estado_conexion()
+    consulta_hecha = pyqtSignal(int, object, object, object, str, float, str, object)  # uso interno, desde el pool
+    
+    def __init__(self, sondeo, executor, parent=None):
+        super().__init__(parent)
+        self.cuenta = sondeo.cuenta
+        self.sondeo = sondeo
+        self.executor = executor
+        self.sesiones = None
+        self.conectado = False
+        self.consulta_en_curso = False  # Hay una llamada a hb.account en vuelo
+        self.generacion = 0  # Se incrementa al (des)conectar para descartar respuestas viejas
+        self.generacion_sondeo = None  # Última generación vista por el pool
+        
+        # Timer de una sola vez: se reprograma al terminar cada consulta con el intervalo del planificador
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.actualizar_datos)
+        self.consulta_hecha.connect(self.on_consulta_hecha)
+    
+    def iniciar(self, sesiones):
+        """Empieza a sondear; el login se hace en el pool con la primera consulta"""
+        self.generacion += 1
+        self.sesiones = sesiones
+        self.conectado = True
+        self.actualizar_datos()
+    
+    def detener(self):
+        self.generacion += 1
+        self.conectado = False
+        self.sesiones = None
+        self.timer.stop()
+    
+    def actualizar_datos(self):
+        """Manda una consulta al pool si no hay otra en curso"""
+        if not self.conectado or self.sesiones is None:
+            return
+        
+        # Nunca más de una consulta en vuelo: al terminar la actual se reprograma el timer
+        if self.consulta_en_curso:
+            return
+        
+        self.consulta_en_curso = True
+        self.executor.submit(self.consultar, self.generacion, self.sesiones)
+    
+    def consultar(self, generacion, sesiones):
+        """Corre en el pool: (re)hace el login si hace falta, consulta SHDA y normaliza la tenencia"""
+        planificador = self.sondeo.planificador
+        if generacion != self.generacion_sondeo:
+            # Nueva conexión: el planificador y el estado de conexión arrancan de cero
+            self.generacion_sondeo = generacion
+            self.sondeo.reiniciar()
+        
+        df, operaciones, tendencias, mensaje = None, None, None, ''
+        try:
+            df = self.sondeo.consultar_con_sesion(sesiones)
+            operaciones = self.sondeo.operaciones
+            tendencias = self.sondeo.tendencias
+        except Exception as e:
+            mensaje = str(e) or e.__class__.__name__
+        
+        self.consulta_hecha.emit(generacion, df, operaciones, tendencias, mensaje, planificador.intervalo,
+                                 planificador.resumen(), self.sondeo.estado_conexion())
+    
+    @pyqtSlot(int, object, object, object, str, float, str, object)
+    def on_consulta_hecha(self, generacion, df, operaciones, tendencias, mensaje, intervalo, resumen, conexion):
+        """De vuelta en el hilo de la interfaz: publica el resultado y reprograma"""
+        self.consulta_en_curso = False
+        if not self.conectado:
+            return
+        
+        if generacion != self.generacion:
+            # Terminó una consulta de la conexión anterior: arrancar ya con la nueva
+            self.actualizar_datos()
+            return
+        
+        self.conexion.emit(conexion)
+        if mensaje:
+            # Se sigue reintentando con backoff exponencial (y login nuevo si la sesión venció)
+            self.error.emit(mensaje)
+        elif df is not None:
+            self.datos_listos.emit(df, operaciones, tendencias)
+        
+        self.estado.emit(resumen)
+        self.timer.start(int(intervalo * 1000))
+    
+    def cambiar_base(self, base):
+        self.sondeo.pipeline.base = base
+    
+    def con_base(self, df):
+        """La tenencia con Var % Base y Resultado Base contra la base actual (recalcula si se procesó con otra)"""
+        pipeline = self.sondeo.pipeline
+        if df.attrs.get('base') != pipeline.base:
+            df = pipeline.con_base(df)
+        return df
+    
+    def cerrar(self):
+        self.sondeo.cerrar()
+
+
+class TrabajadorProceso(QObject):
+    """Sondea una cuenta con el motor en un proceso aparte (motor.ClienteMotor), con las señales de TrabajadorSondeo.
+    
+    Un QSocketNotifier sobre el pipe avisa en el hilo de la interfaz cuando el
+    motor manda algo; las tenencias llegan armadas sobre la memoria compartida.
+    Cada segundo se verifica que el proceso siga vivo y respondiendo; si no,
+    se detiene y se vuelve a arrancar con backoff.
+    """
+    datos_listos = pyqtSignal(object, object, object)  # DataFrame normalizado, None (operaciones) y tendencias
+    error = pyqtSignal(str)  # mensaje
+    estado = pyqtSignal(str)  # resumen del planificador
+    conexion = pyqtSignal(object)  # SondeoCuenta.estado_conexion()
+    alertas = pyqtSignal(object)  # Lista de alertas disparadas en el motor
+    
+    def __init__(self, cuenta, config, parent=None):
+        super().__init__(parent)
+        self.cuenta = cuenta
+        self.config = config
+        self.cliente = ClienteMotor(cuenta, config)
+        self.notificador = None
+        self.conectado = False
+        self.base = None  # Última base elegida, para mandarla de nuevo si el motor se reinicia
+        self.ultima_conexion = {}  # Último estado de conexión informado por el motor
+        self.deteniendo = []  # Hilos que esperan a que terminen los motores anteriores
+        
+        self.timer_supervision = QTimer(self)
+        self.timer_supervision.timeout.connect(self.supervisar)
+        self.timer_reinicio = QTimer(self)
+        self.timer_reinicio.setSingleShot(True)
+        self.timer_reinicio.timeout.connect(self.arrancar)
+    
+    def iniciar(self, sesiones):
+        """Arranca el motor; el login lo hace el propio proceso (no usa las sesiones de la interfaz)"""
+        self.detener()
+        self.conectado = True
+        self.arrancar()
+    
+    def arrancar(self):
+        if not self.conectado:
+            return
+        self.cliente.iniciar()
+        self.notificador = QSocketNotifier(self.cliente.fileno(), QSocketNotifier.Read, self)
+        self.notificador.activated.connect(self.leer)
+        if self.base is not None:
+            self.cliente.enviar(('base', self.base))
+        self.timer_supervision.start(1000)
+    
+    def soltar_notificador(self):
+        if self.notificador is not None:
+            self.notificador.setEnabled(False)
+            self.notificador.deleteLater()
+            self.notificador = None
+    
+    def detener(self):
+        """Detiene el motor sin esperarlo: termina (guardando su estado) en un hilo aparte"""
+        self.conectado = False
+        self.timer_supervision.stop()
+        self.timer_reinicio.stop()
+        self.soltar_notificador()
+        if self.cliente.proceso is not None:
+            hilo = threading.Thread(target=self.cliente.detener, name=f"detener-{self.cuenta.nombre}", daemon=True)
+            hilo.start()
+            self.deteniendo = [h for h in self.deteniendo if h.is_alive()] + [hilo]
+            self.cliente = ClienteMotor(self.cuenta, self.config)
+    
+    def leer(self, *args):
+        """Mensajes del motor; de varias tenencias pendientes solo se muestra la última"""
+        tenencia = None
+        for evento in self.cliente.recibir():
+            tipo = evento[0]
+            if tipo == 'tenencia':
+                tenencia = evento
+            elif tipo == 'estado':
+                _, mensaje, (intervalo, resumen, conexion) = evento
+                self.ultima_conexion = conexion
+                self.conexion.emit(conexion)
+                if mensaje:
+                    self.error.emit(mensaje)
+                self.estado.emit(resumen)
+            elif tipo == 'alertas':
+                self.alertas.emit(evento[1])
+        
+        if tenencia is not None:
+            _, df, tendencias, (intervalo, resumen, conexion) = tenencia
+            self.ultima_conexion = conexion
+            self.conexion.emit(conexion)
+            self.datos_listos.emit(df, None, tendencias)
+            self.estado.emit(resumen)
+        self.cliente.enviar_liberadas()  # La tenencia anterior ya se soltó
+        if self.cliente.cerrada:
+            self.supervisar()
+    
+    def supervisar(self):
+        """Si el motor terminó o no responde, lo detiene y programa el reinicio"""
+        motivo = self.cliente.verificar()
+        if motivo is None:
+            self.cliente.enviar_liberadas()
+            return
+        self.timer_supervision.stop()
+        self.soltar_notificador()
+        espera = self.cliente.espera_reinicio()
+        log.warning("El motor de %s %s; se reinicia en %.0f s", self.cuenta.nombre, motivo, espera)
+        self.cliente.detener(esperar=0)
+        self.conexion.emit(dict(self.ultima_conexion, estado=REINTENTANDO, reintentos=self.cliente.reinicios,
+                                tipo_error=None, ultimo_error=f"El motor {motivo}"))
+        self.timer_reinicio.start(int(espera * 1000))
+    
+    def cambiar_base(self, base):
+        # El motor recalcula su última tenencia y la vuelve a mandar
+        self.base = base
+        self.cliente.enviar(('base', base))
+    
+    def con_base(self, df):
+        return df  # El motor ya la calcula con la última base que recibió
+    
+    def cerrar(self):
+        self.detener()
+        for hilo in self.deteniendo:
+            hilo.join()
+        self.deteniendo = []
+
+
+class PanelRendimiento(QWidget):
+    """Tiempos por etapa del ciclo de actualización (p50/p95/p99), con exportación y perfilado"""
+    COLUMNAS = ['Etapa', 'Muestras', 'Último ms', 'p50 ms', 'p95 ms', 'p99 ms']
+    
+    def __init__(self, metricas, perfil, parent=None):
+        super().__init__(parent)
+        self.metricas = metricas
+        self.perfil = perfil
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabla.verticalHeader().setVisible(False)
+        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabla.setMaximumHeight(220)
+        layout.addWidget(self.tabla)
+        
+        botones = QHBoxLayout()
+        self.btn_exportar = QPushButton("Exportar métricas")
+        self.btn_exportar.clicked.connect(self.exportar)
+        botones.addWidget(self.btn_exportar)
+        
+        botones.addWidget(QLabel("Ciclos:"))
+        self.spin_ciclos = QSpinBox()
+        self.spin_ciclos.setRange(1, 1000)
+        self.spin_ciclos.setValue(20)
+        botones.addWidget(self.spin_ciclos)
+        self.btn_perfilar = QPushButton("Perfilar (cProfile)")
+        self.btn_perfilar.clicked.connect(lambda: self.perfil.iniciar(self.spin_ciclos.value()))
+        botones.addWidget(self.btn_perfilar)
+        
+        self.lbl_mensaje = QLabel("")
+        botones.addWidget(self.lbl_mensaje)
+        botones.addStretch()
+        layout.addLayout(botones)
+        
+        # Solo se refresca mientras está visible
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refrescar)
+    
+    def showEvent(self, event):
+        self.refrescar()
+        self.timer.start(1000)
+        super().showEvent(event)
+    
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+    
+    def refrescar(self):
+        filas = self.metricas.resumen()
+        self.tabla.setRowCount(len(filas))
+        for row, (etapa, muestras, *tiempos) in enumerate(filas):
+            textos = [etapa, str(muestras)] + [f"{tiempo * 1000:.2f}" for tiempo in tiempos]
+            for col, texto in enumerate(textos):
+                item = QTableWidgetItem(texto)
+                if col:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.tabla.setItem(row, col, item)
+        
+        if self.perfil.activa:
+            self.lbl_mensaje.setText(f"Perfilando: faltan {self.perfil.restantes} ciclos")
+        elif self.lbl_mensaje.text().startswith("Perfilando"):
+            self.lbl_mensaje.setText(f"Perfil guardado en {self.perfil.archivo}")
+    
+    def exportar(self):
+        try:
+            self.metricas.exportar(ARCHIVO_METRICAS)
+            self.lbl_mensaje.setText(f"Métricas exportadas a {ARCHIVO_METRICAS}")
+        except OSError as e:
+            self.lbl_mensaje.setText(f"Error al exportar métricas: {e}")
+
+
+class PanelAlertas(QWidget):
+    """Últimas alertas disparadas, la más reciente arriba"""
+    COLUMNAS = ['Hora', 'Cuenta', 'Ticker', 'Regla', 'Valor']
+    MAXIMO_FILAS = 500
+    
+    def __init__(self, archivo, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabla.horizontalHeader().setStretchLastSection(True)
+        self.tabla.verticalHeader().setVisible(False)
+        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabla.setMaximumHeight(220)
+        layout.addWidget(self.tabla)
+        
+        botones = QHBoxLayout()
+        btn_limpiar = QPushButton("Limpiar")
+        btn_limpiar.clicked.connect(lambda: self.tabla.setRowCount(0))
+        botones.addWidget(btn_limpiar)
+        botones.addWidget(QLabel(f"Registro completo en {archivo}"))
+        botones.addStretch()
+        layout.addLayout(botones)
+    
+    def agregar(self, alertas):
+        self.tabla.setUpdatesEnabled(False)
+        for alerta in alertas:
+            self.tabla.insertRow(0)
+            ticker = 'Total' if alerta['ticker'] == CLAVE_AGREGADO else alerta['ticker']
+            valor = '' if alerta['valor'] is None else f"{alerta['valor']:.2f}"
+            for col, texto in enumerate([alerta['hora'][11:], alerta['cuenta'], ticker, alerta['regla'], valor]):
+                self.tabla.setItem(0, col, QTableWidgetItem(texto))
+        if self.tabla.rowCount() > self.MAXIMO_FILAS:
+            self.tabla.setRowCount(self.MAXIMO_FILAS)
+        self.tabla.setUpdatesEnabled(True)
+
+
+class InterfazSHDA(QMainWindow):
+    consolidado_listo = pyqtSignal(object, object, object)  # DataFrame, operaciones y tendencias consolidados, desde el pool
+    alertas_disparadas = pyqtSignal(object)  # Lista de alertas, desde el pool
+    primeros_datos = pyqtSignal(str)  # Primer dato en vivo desde que arrancó la ventana (nombre de la cuenta)
+    
+    def __init__(self, grabar=None, reproducir=None, velocidad=1.0):
+        super().__init__()
+        self.setWindowTitle("Monitoreo Tenencias IEB+")
+        
+        # Cargar configuración desde archivo
+        self.cargar_configuracion()
+        
+        # Reproduciendo, la grabación reemplaza al cliente de SHDA
+        self.reproductor = ReproductorSHDA(reproducir, velocidad) if reproducir else None
+        self.reproduccion_informada = False
+        self.grabador = GrabadorRespuestas(grabar) if grabar else None
+        if self.reproductor is not None:
+            ritmo = f"x{velocidad:g}" if velocidad else "sin esperas"
+            self.setWindowTitle(f"Monitoreo Tenencias IEB+ (reproduciendo {os.path.basename(reproducir)}, {ritmo})")
+        if self.motor_en_proceso and (self.reproductor is not None or self.grabador is not None):
+            # Grabar y reproducir necesitan el cliente de SHDA en este proceso
+            log.info("motor_en_proceso se ignora al grabar o reproducir: el sondeo corre en la interfaz")
+            self.motor_en_proceso = False
+        self.sesiones = GestorSesiones(fabrica=self.reproductor.fabrica if self.reproductor is not None else None)
+        self.metricas = Metricas()  # Tiempos por etapa de todas las cuentas
+        self.perfil = CapturaPerfil()
+        self.servidor_metricas = None
+        self.publicador = None
+        if self.puerto_publicacion:
+            try:
+                self.publicador = PublicadorTenencias(int(self.puerto_publicacion))
+            except OSError as e:
+                log.error("No se pudo iniciar la publicación de tenencias: %s", e)
+        self.conectado = False
+        self.df = pd.DataFrame()
+        self.dfs = {}  # Última tenencia normalizada de cada cuenta
+        self.operaciones = {}  # Operaciones del día de cada cuenta (ticker -> array)
+        self.tendencias = {}  # Últimos precios por ticker de cada cuenta (series.Tendencias)
+        self.conexiones = {}  # Estado de conexión de cada cuenta (SondeoCuenta.estado_conexion())
+        self.resumenes = {}  # Resumen del planificador de cada cuenta
+        self.restauradas = {}  # Cuentas que muestran la tenencia guardada en disco -> fecha de esa tenencia
+        self.hubo_datos_en_vivo = False
+        self.consolidacion_en_curso = False
+        self.consolidacion_pendiente = False
+        
+        # Pool acotado compartido por todas las cuentas (y la consolidación)
+        self.executor = ThreadPoolExecutor(max_workers=min(self.max_hilos, len(self.cuentas) + 1),
+                                           thread_name_prefix='sondeo')
+        self.trabajadores = []
+        self.registro_alertas = RegistroAlertas()
+        self.alertas_sin_ver = 0
+        for cuenta in self.cuentas:
+            # Reglas compiladas una sola vez; cada cuenta lleva su propio estado de flancos
+            alertas = None
+            if len(self.reglas_alertas) and not self.motor_en_proceso:
+                alertas = MotorAlertas(self.reglas_alertas, cuenta.nombre if len(self.cuentas) > 1 else '',
+                                       self.registro_alertas, self.alertas_disparadas.emit)
+            if self.motor_en_proceso:
+                # Pipeline, historial y alertas viven en el proceso del motor
+                trabajador = TrabajadorProceso(cuenta, self.config, self)
+                trabajador.alertas.connect(self.on_alertas)
+            else:
+                sondeo = SondeoCuenta(cuenta, columnas_operaciones=self.columnas_operaciones, fecha_base=self.fecha_base,
+                                      metricas=self.metricas, perfil=self.perfil,
+                                      columnas_intradiarias=self.columnas_intradiarias,
+                                      ventana_minutos=self.ventana_minutos, alertas=alertas, publicador=self.publicador,
+                                      grabador=self.grabador,
+                                      planificador=self.reproductor.planificador() if self.reproductor is not None else None,
+                                      persistir=self.reproductor is None, columnas_base=self.columnas_base)
+                trabajador = TrabajadorSondeo(sondeo, self.executor, self)
+            trabajador.datos_listos.connect(lambda df, operaciones, tendencias, nombre=cuenta.nombre:
+                                            self.on_datos_listos(nombre, df, operaciones, tendencias))
+            trabajador.error.connect(lambda mensaje, nombre=cuenta.nombre: self.on_error_consulta(nombre, mensaje))
+            trabajador.estado.connect(lambda resumen, nombre=cuenta.nombre: self.on_estado_sondeo(nombre, resumen))
+            trabajador.conexion.connect(lambda conexion, nombre=cuenta.nombre: self.on_conexion(nombre, conexion))
+            self.trabajadores.append(trabajador)
+        self.consolidado_listo.connect(self.on_consolidado_listo)
+        self.alertas_disparadas.connect(self.on_alertas)
+        
+        # Configurar interfaz
+        self.inicializar_ui()
+        
+        # Mostrar la última tenencia guardada mientras llega el primer dato en vivo
+        self.restaurar_instantaneas()
+        
+        # Intentar conectar al inicio
+        self.conectar()
+    
+    def cargar_configuracion(self):
+        """Carga la configuración desde el archivo config.json"""
+        config, aviso = cargar_configuracion()
+        
+        # Asignar valores de configuración
+        self.config = config
+        self.cuentas = cuentas_desde_config(config)
+        self.max_hilos = config.get('max_hilos', MAX_HILOS)
+        self.columnas_operaciones = config.get('columnas_operaciones', False)
+        self.columnas_intradiarias = config.get('columnas_intradiarias', False)
+        self.ventana_minutos = config.get('ventana_minutos', VENTANA_MINUTOS)
+        self.columnas_base = config.get('columnas_base', False)  # Var % Base y Resultado Base, con selector de base
+        self.reglas_alertas = ReglasCompiladas(config.get('alertas'))
+        self.fecha_base = config.get('fecha_base')  # AAAA-MM-DD; por defecto, el último cierre anterior a hoy
+        self.puerto_metricas = config.get('puerto_metricas')  # Endpoint HTTP en localhost, opcional
+        self.puerto_publicacion = config.get('puerto_publicacion')  # Publicación para lectores locales, opcional
+        self.motor_en_proceso = config.get('motor_en_proceso', False)  # Sondeo y normalización en otro proceso
+        
+        if aviso:
+            titulo, mensaje, es_error = aviso
+            if es_error:
+                QMessageBox.warning(self, titulo, mensaje)
+            else:
+                QMessageBox.information(self, titulo, mensaje)
+    
+    def inicializar_ui(self):
+        # Widget central
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        
+        # Layout principal
+        layout_principal = QVBoxLayout(central_widget)
+        
+        # Panel superior con indicador LED y botones
+        panel_superior = QHBoxLayout()
+        
+        # Indicador LED
+        self.led_conexion = ConexionLED()
+        panel_superior.addWidget(QLabel("Estado de conexión:"))
+        panel_superior.addWidget(self.led_conexion)
+        
+        # Botones
+        self.btn_conectar = QPushButton("Conectar")
+        self.btn_conectar.clicked.connect(self.conectar)
+        panel_superior.addWidget(self.btn_conectar)
+        
+        self.btn_desconectar = QPushButton("Desconectar")
+        self.btn_desconectar.clicked.connect(self.desconectar)
+        panel_superior.addWidget(self.btn_desconectar)
+        
+        panel_superior.addStretch()
+        
+        # Intervalo actual y proporción de consultas sin cambios
+        self.lbl_planificador = QLabel("")
+        panel_superior.addWidget(self.lbl_planificador)
+        
+        # Mostrar u ocultar el panel de rendimiento
+        self.btn_rendimiento = QPushButton("Rendimiento")
+        self.btn_rendimiento.setCheckable(True)
+        panel_superior.addWidget(self.btn_rendimiento)
+        
+        # Mostrar u ocultar el panel de alertas
+        self.btn_alertas = QPushButton("Alertas")
+        self.btn_alertas.setCheckable(True)
+        self.btn_alertas.setVisible(len(self.reglas_alertas) > 0)
+        panel_superior.addWidget(self.btn_alertas)
+        
+        # Agregar panel superior al layout principal
+        layout_principal.addLayout(panel_superior)
+        
+        # Filtro por texto y TIPO, y agrupado por TIPO con subtotales (sin volver a consultar)
+        panel_filtro = QHBoxLayout()
+        self.txt_filtro = QLineEdit()
+        self.txt_filtro.setPlaceholderText("Filtrar por ticker o especie")
+        self.txt_filtro.setClearButtonEnabled(True)
+        self.txt_filtro.textChanged.connect(self.aplicar_filtro)
+        panel_filtro.addWidget(self.txt_filtro, 1)
+        
+        self.cmb_tipo = QComboBox()
+        self.cmb_tipo.addItem("Todos los tipos", '')
+        for tipo in list(TIPO_ACTIVO.values()) + [TIPO_EFECTIVO]:
+            self.cmb_tipo.addItem(tipo, tipo)
+        self.cmb_tipo.currentIndexChanged.connect(self.aplicar_filtro)
+        panel_filtro.addWidget(self.cmb_tipo)
+        
+        self.chk_agrupar = QCheckBox("Agrupar por tipo")
+        self.chk_agrupar.toggled.connect(self.aplicar_filtro)
+        panel_filtro.addWidget(self.chk_agrupar)
+        
+        # Base de Var % Base y Resultado Base
+        if self.columnas_base:
+            panel_filtro.addWidget(QLabel("Base:"))
+            self.cmb_base = QComboBox()
+            for tipo, descripcion in DESCRIPCION_BASE.items():
+                self.cmb_base.addItem(descripcion, tipo)
+            panel_filtro.addWidget(self.cmb_base)
+            self.spn_minutos_base = QSpinBox()
+            self.spn_minutos_base.setRange(1, 24 * 60)
+            self.spn_minutos_base.setValue(MINUTOS_BASE)
+            self.spn_minutos_base.setSuffix(" min")
+            panel_filtro.addWidget(self.spn_minutos_base)
+            self.hora_base = QTimeEdit(QTime(11, 0))
+            self.hora_base.setDisplayFormat("HH:mm")
+            panel_filtro.addWidget(self.hora_base)
+            self.cmb_base.currentIndexChanged.connect(self.cambiar_base)
+            self.spn_minutos_base.valueChanged.connect(self.cambiar_base)
+            self.hora_base.timeChanged.connect(self.cambiar_base)
+            self.mostrar_parametros_base()
+        panel_filtro.addStretch(2)
+        layout_principal.addLayout(panel_filtro)
+        
+        # Una pestaña por cuenta y, si hay más de una, la consolidada
+        self.pestanas = QTabWidget()
+        self.pestanas.setTabBarAutoHide(True)
+        self.pestanas.currentChanged.connect(self.mostrar_resumen_sondeo)
+        self.tablas = {}
+        self.tabla_consolidada = None
+        if len(self.cuentas) > 1:
+            self.tabla_consolidada = TablaDataFrame()
+            self.pestanas.addTab(self.tabla_consolidada, "Consolidado")
+        for cuenta in self.cuentas:
+            self.tablas[cuenta.nombre] = TablaDataFrame()
+            self.pestanas.addTab(self.tablas[cuenta.nombre], cuenta.nombre)
+        self.tabla = self.tablas[self.cuentas[0].nombre]
+        layout_principal.addWidget(self.pestanas)
+        
+        # Panel de rendimiento, plegado por defecto
+        self.panel_rendimiento = PanelRendimiento(self.metricas, self.perfil)
+        self.panel_rendimiento.setVisible(False)
+        self.btn_rendimiento.toggled.connect(self.panel_rendimiento.setVisible)
+        layout_principal.addWidget(self.panel_rendimiento)
+        
+        # Panel de alertas, plegado por defecto
+        self.panel_alertas = PanelAlertas(self.registro_alertas.archivo)
+        self.panel_alertas.setVisible(False)
+        self.btn_alertas.toggled.connect(self.mostrar_panel_alertas)
+        layout_principal.addWidget(self.panel_alertas)
+        
+        # Notificaciones en la bandeja del sistema, si hay
+        self.bandeja = None
+        if len(self.reglas_alertas) and QSystemTrayIcon.isSystemTrayAvailable():
+            icono = QPixmap(16, 16)
+            icono.fill(QColor('#265A7C'))
+            self.bandeja = QSystemTrayIcon(QIcon(icono), self)
+            self.bandeja.setToolTip(self.windowTitle())
+            self.bandeja.show()
+        
+        if self.puerto_metricas:
+            try:
+                self.servidor_metricas = ServidorMetricas(self.metricas, int(self.puerto_metricas))
+            except OSError as e:
+                log.error("No se pudo iniciar el endpoint de métricas: %s", e)
+        
+        # Barra de estado: conexión, reintentos y antigüedad del último dato de cada cuenta
+        self.lbl_conexion = QLabel("")
+        self.statusBar().addWidget(self.lbl_conexion, 1)
+        self.timer_estado = QTimer(self)
+        self.timer_estado.timeout.connect(self.mostrar_estado_conexion)
+        self.timer_estado.start(1000)
+        
+        # Configuración de la ventana
+        self.resize(1500, 950)
+    
+    def aplicar_filtro(self, *args):
+        """Aplica el filtro y el agrupado a todas las tablas, sobre los datos que ya muestran"""
+        texto = self.txt_filtro.text()
+        tipo = self.cmb_tipo.currentData()
+        agrupar = self.chk_agrupar.isChecked()
+        for tabla in self.todas_las_tablas():
+            tabla.filtrar(texto, tipo, agrupar)
+    
+    def mostrar_parametros_base(self):
+        tipo = self.cmb_base.currentData()
+        self.spn_minutos_base.setVisible(tipo == BASE_MINUTOS)
+        self.hora_base.setVisible(tipo == BASE_HORA)
+    
+    def base_elegida(self):
+        """BaseComparacion según el selector; la hora elegida se toma en el día de hoy"""
+        tipo = self.cmb_base.currentData()
+        t = None
+        if tipo == BASE_HORA:
+            hora = self.hora_base.time()
+            hoy = time.localtime()
+            t = time.mktime((hoy.tm_year, hoy.tm_mon, hoy.tm_mday, hora.hour(), hora.minute(), 0, 0, 0, -1))
+        return BaseComparacion(tipo, self.spn_minutos_base.value(), t)
+    
+    def cambiar_base(self, *args):
+        """Recalcula Var % Base y Resultado Base de las tenencias que ya se muestran, sin esperar la próxima consulta"""
+        self.mostrar_parametros_base()
+        base = self.base_elegida()
+        for trabajador in self.trabajadores:
+            trabajador.cambiar_base(base)
+            nombre = trabajador.cuenta.nombre
+            if nombre in self.dfs:
+                df = trabajador.con_base(self.dfs[nombre])
+                if df is self.dfs[nombre]:
+                    continue  # Con el motor en otro proceso la tenencia recalculada llega del motor
+                self.dfs[nombre] = df
+                self.tablas[nombre].actualizar_df(self.dfs[nombre], self.operaciones.get(nombre),
+                                                  self.tendencias.get(nombre))
+                if nombre == self.cuentas[0].nombre:
+                    self.df = self.dfs[nombre]
+        log.info("Base de comparación: %s", base.descripcion())
+        if self.tabla_consolidada is not None:
+            self.programar_consolidacion()
+    
+    def todas_las_tablas(self):
+        tablas = list(self.tablas.values())
+        if self.tabla_consolidada is not None:
+            tablas.append(self.tabla_consolidada)
+        return tablas
+    
+    def restaurar_instantaneas(self):
+        """Carga en las tablas la última tenencia guardada de cada cuenta"""
+        for trabajador in self.trabajadores:
+            nombre = trabajador.cuenta.nombre
+            df, t = cargar_ultima(trabajador.cuenta.archivo_ultima)
+            if df is None or df.empty:
+                continue
+            self.tablas[nombre].actualizar_df(df)
+            self.dfs[nombre] = df
+            self.operaciones[nombre] = self.tablas[nombre].modelo.operaciones
+            self.restauradas[nombre] = t
+            if nombre == self.cuentas[0].nombre:
+                self.df = df
+        
+        if self.restauradas and self.tabla_consolidada is not None:
+            self.programar_consolidacion()
+    
+    def conectar(self):
+        """Arranca el sondeo de todas las cuentas sin bloquear la interfaz.
+        
+        Volver a conectar siempre hace un login nuevo; el login corre en el pool
+        junto con la primera consulta de cada cuenta.
+        """
+        self.sesiones.cerrar()
+        self.conexiones = {cuenta.nombre: {'estado': CONECTANDO} for cuenta in self.cuentas}
+        for trabajador in self.trabajadores:
+            trabajador.iniciar(self.sesiones)
+        
+        self.conectado = True
+        self.actualizar_led()
+        self.mostrar_estado_conexion()
+    
+    def desconectar(self):
+        for trabajador in self.trabajadores:
+            trabajador.detener()
+        self.sesiones.cerrar()
+        self.conectado = False
+        self.conexiones = {}
+        self.actualizar_led()
+        self.mostrar_estado_conexion()
+        log.info("Desconectado")
+
+    def actualizar_led(self):
+        """Verde si todas las cuentas tienen datos, amarillo si alguna está (re)conectando, rojo si no hay conexión"""
+        if not self.conectado:
+            self.led_conexion.actualizar_estado(False)
+            return
+        todas_conectadas = all(conexion['estado'] == CONECTADO for conexion in self.conexiones.values())
+        self.led_conexion.actualizar_estado(True, reintentando=not todas_conectadas)
+    
+    def on_conexion(self, nombre, conexion):
+        """Actualiza el estado de conexión de una cuenta"""
+        anterior = self.conexiones.get(nombre, {}).get('estado')
+        self.conexiones[nombre] = conexion
+        if conexion['estado'] == CONECTADO and anterior != CONECTADO:
+            log.info("Conexión establecida con éxito (%s)", nombre)
+        self.actualizar_led()
+        self.mostrar_estado_conexion()
+    
+    def mostrar_estado_conexion(self):
+        """Texto de la barra de estado; se refresca cada segundo para la antigüedad del último dato"""
+        if not self.conectado:
+            self.lbl_conexion.setText("Desconectado")
+            self.led_conexion.setToolTip("Desconectado")
+            return
+        ahora = time.time()
+        if len(self.cuentas) == 1:
+            texto = describir_estado(self.conexiones[self.cuentas[0].nombre], ahora)
+        else:
+            texto = '   '.join(f"{nombre}: {describir_estado(conexion, ahora)}"
+                               for nombre, conexion in self.conexiones.items())
+        if self.restauradas:
+            guardada = time.strftime('%d/%m %H:%M:%S', time.localtime(min(self.restauradas.values())))
+            texto += f"   (mostrando datos guardados del {guardada} hasta recibir datos en vivo)"
+        if self.reproductor is not None and self.reproductor.terminado:
+            procesadas = sum(t.sondeo.planificador.consultas - t.sondeo.planificador.salteadas for t in self.trabajadores)
+            resumen = self.reproductor.resumen(procesadas)
+            if not self.reproduccion_informada:
+                self.reproduccion_informada = True
+                log.info("%s", resumen)
+            texto = f"Reproducción terminada: {resumen}"
+        self.lbl_conexion.setText(texto)
+        
+        errores = [f"{nombre}: {DESCRIPCION_ERROR.get(conexion.get('tipo_error'), 'error')} - {conexion['ultimo_error']}"
+                   for nombre, conexion in self.conexiones.items() if conexion.get('ultimo_error')]
+        self.led_conexion.setToolTip('\n'.join(errores) if errores else texto)
+
+    def on_datos_listos(self, nombre, df, operaciones, tendencias=None):
+        """Recibe la tenencia normalizada de una cuenta, sus operaciones ya parseadas y sus tendencias"""
+        if self.columnas_base:
+            # La consulta pudo haberse procesado antes de un cambio de base
+            df = self.trabajador_de(nombre).con_base(df)
+        self.dfs[nombre] = df
+        self.tendencias[nombre] = tendencias
+        if nombre == self.cuentas[0].nombre:
+            self.df = df
+        with self.perfil.seccion(), self.metricas.medir('tabla'):
+            self.tablas[nombre].actualizar_df(df, operaciones, tendencias)
+        # Del motor en otro proceso llegan sin parsear: las arma la tabla desde la columna de detalle
+        self.operaciones[nombre] = operaciones if operaciones is not None else self.tablas[nombre].modelo.operaciones
+        if self.motor_en_proceso and self.publicador is not None:
+            try:
+                self.publicador.publicar(nombre, df)
+            except Exception as e:
+                log.error("Error al publicar tenencia (%s): %s", nombre, e)
+        
+        if self.restauradas.pop(nombre, None) is not None:
+            self.mostrar_estado_conexion()
+        if not self.hubo_datos_en_vivo:
+            self.hubo_datos_en_vivo = True
+            self.primeros_datos.emit(nombre)
+        
+        if self.tabla_consolidada is not None:
+            self.programar_consolidacion()
+    
+    def trabajador_de(self, nombre):
+        for trabajador in self.trabajadores:
+            if trabajador.cuenta.nombre == nombre:
+                return trabajador
+    
+    def on_error_consulta(self, nombre, mensaje):
+        """Recibe los errores de consulta de una cuenta"""
+        # Se sigue reintentando con backoff; el LED queda en amarillo hasta que haya datos
+        conexion = self.conexiones.get(nombre, {})
+        motivo = DESCRIPCION_ERROR.get(conexion.get('tipo_error'), 'error')
+        log.error("Error al actualizar datos (%s, %s): %s", nombre, motivo, mensaje)
+    
+    def on_estado_sondeo(self, nombre, resumen):
+        self.resumenes[nombre] = resumen
+        self.mostrar_resumen_sondeo()
+    
+    def mostrar_resumen_sondeo(self, *args):
+        """Muestra el estado del planificador de la cuenta visible (o de todas en el consolidado)"""
+        widget = self.pestanas.currentWidget()
+        if len(self.cuentas) == 1:
+            self.lbl_planificador.setText(self.resumenes.get(self.cuentas[0].nombre, ''))
+        elif widget is self.tabla_consolidada:
+            self.lbl_planificador.setText(' | '.join(f"{nombre}: {resumen.split(' |')[0]}"
+                                                     for nombre, resumen in self.resumenes.items()))
+        else:
+            nombre = self.pestanas.tabText(self.pestanas.currentIndex())
+            self.lbl_planificador.setText(self.resumenes.get(nombre, ''))
+    
+    def on_alertas(self, alertas):
+        """Muestra las alertas disparadas en el panel y en la bandeja del sistema"""
+        for alerta in alertas:
+            log_alertas.warning("ALERTA %s", texto_alerta(alerta))
+        self.panel_alertas.agregar(alertas)
+        
+        if not self.panel_alertas.isVisible():
+            self.alertas_sin_ver += len(alertas)
+            self.btn_alertas.setText(f"Alertas ({self.alertas_sin_ver})")
+        
+        if self.bandeja is not None:
+            titulo = "Alerta" if len(alertas) == 1 else f"{len(alertas)} alertas"
+            self.bandeja.showMessage(titulo, '\n'.join(texto_alerta(alerta) for alerta in alertas[:5]),
+                                     QSystemTrayIcon.Warning, 5000)
+    
+    def mostrar_panel_alertas(self, visible):
+        self.panel_alertas.setVisible(visible)
+        if visible:
+            self.alertas_sin_ver = 0
+            self.btn_alertas.setText("Alertas")
+    
+    def programar_consolidacion(self):
+        """Consolida las cuentas en el pool; si ya hay una en curso, se repite al terminar"""
+        if self.consolidacion_en_curso:
+            self.consolidacion_pendiente = True
+            return
+        
+        self.consolidacion_en_curso = True
+        self.consolidacion_pendiente = False
+        dfs = list(self.dfs.values())
+        operaciones = list(self.operaciones.values())
+        tendencias = list(self.tendencias.values())
+        self.executor.submit(self.consolidar, dfs, operaciones, tendencias)
+    
+    def consolidar(self, dfs, operaciones, tendencias):
+        """Corre en el pool"""
+        try:
+            self.consolidado_listo.emit(consolidar_tenencias(dfs), unir_operaciones(operaciones),
+                                        unir_tendencias(tendencias))
+        except Exception as e:
+            log.exception("Error al consolidar cuentas: %s", e)
+            self.consolidado_listo.emit(None, None, None)
+    
+    @pyqtSlot(object, object, object)
+    def on_consolidado_listo(self, df, operaciones, tendencias):
+        self.consolidacion_en_curso = False
+        if df is not None:
+            self.tabla_consolidada.actualizar_df(df, operaciones, tendencias)
+        if self.consolidacion_pendiente:
+            self.programar_consolidacion()
+    
+    def closeEvent(self, event):
+        """Detiene el sondeo de todas las cuentas antes de cerrar la ventana"""
+        for trabajador in self.trabajadores:
+            trabajador.detener()
+        # Sin esperar al pool: una consulta o un login colgados no deben congelar la ventana. Lo que termine
+        # después corresponde a una generación vieja y se descarta
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.sesiones.cerrar()
+        for trabajador in self.trabajadores:
+            trabajador.cerrar()
+        if self.grabador is not None:
+            self.grabador.cerrar()
+        if self.servidor_metricas is not None:
+            self.servidor_metricas.cerrar()
+        if self.publicador is not None:
+            self.publicador.cerrar()
+        if self.bandeja is not None:
+            self.bandeja.hide()
+        super().closeEvent(event)
+
+
+def main():
+    # El arranque (splash, importaciones diferidas y medición de tiempos) vive en arranque.py
+    from arranque import main as main_arranque
+    main_arranque()
@@ -0,0 +1,124 @@
+"""Lector de la tenencia publicada por otra instancia (ver publicacion.py).
+
+Muestra cada cuenta publicada en su pestaña con la misma TablaDataFrame de la
+aplicación, sin hacer login en SHDA: solo lee del publicador local. Si la
+conexión se corta, reintenta cada pocos segundos.
+
+    python lector.py [--puerto 8765] [--host 127.0.0.1]
+"""
+import argparse
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QLabel
+
+from bitacora import obtener
+from configuracion import CONFIG_FILE
+from interfaz import TablaDataFrame
+from publicacion import ClienteTenencias, PUERTO_PUBLICACION
+
+
+log = obtener('lector')
+
+
+ESPERA_RECONEXION = 3  # Segundos entre intentos de conexión
+
+
+class ReceptorTenencias(QObject):
+    """Lee del publicador en un hilo de fondo y entrega cada tenencia por señal"""
+    tenencia = pyqtSignal(str, object)  # cuenta, DataFrame
+    estado = pyqtSignal(str)
+    
+    def __init__(self, puerto, host, parent=None):
+        super().__init__(parent)
+        self.puerto = puerto
+        self.host = host
+        self.cliente = None
+        self.activo = True
+        self.hilo = threading.Thread(target=self.recibir, name='lector', daemon=True)
+    
+    def iniciar(self):
+        self.hilo.start()
+    
+    def recibir(self):
+        while self.activo:
+            self.estado.emit(f"Conectando a {self.host}:{self.puerto}...")
+            try:
+                self.cliente = ClienteTenencias(self.puerto, self.host)
+                self.estado.emit(f"Conectado a {self.host}:{self.puerto}")
+                for cuenta, df in self.cliente.recibir():
+                    self.tenencia.emit(cuenta, df)
+                self.estado.emit("El publicador cerró la conexión")
+            except (OSError, ValueError) as e:
+                self.estado.emit(f"Sin conexión con {self.host}:{self.puerto}: {e}")
+            except Exception as e:
+                # Un mensaje que no se pudo aplicar no debe terminar el hilo: se reconecta y llega una tenencia completa
+                log.exception("Error leyendo tenencias de %s:%s", self.host, self.puerto)
+                self.estado.emit(f"Error leyendo tenencias de {self.host}:{self.puerto}: {e}")
+            finally:
+                if self.cliente is not None:
+                    self.cliente.cerrar()
+                    self.cliente = None
+            time.sleep(ESPERA_RECONEXION)
+    
+    def detener(self):
+        self.activo = False
+        if self.cliente is not None:
+            self.cliente.cerrar()
+
+
+class VentanaLector(QMainWindow):
+    def __init__(self, puerto, host):
+        super().__init__()
+        self.setWindowTitle(f"Monitoreo Tenencias IEB+ (lector {host}:{puerto})")
+        self.pestanas = QTabWidget()
+        self.pestanas.setTabBarAutoHide(True)
+        self.setCentralWidget(self.pestanas)
+        self.tablas = {}
+        self.lbl_estado = QLabel("")
+        self.statusBar().addWidget(self.lbl_estado, 1)
+        self.resize(1500, 950)
+        
+        self.receptor = ReceptorTenencias(puerto, host, self)
+        self.receptor.tenencia.connect(self.on_tenencia)
+        self.receptor.estado.connect(self.lbl_estado.setText)
+        self.receptor.iniciar()
+    
+    def on_tenencia(self, cuenta, df):
+        tabla = self.tablas.get(cuenta)
+        if tabla is None:
+            tabla = self.tablas[cuenta] = TablaDataFrame()
+            self.pestanas.addTab(tabla, cuenta or "Tenencia")
+        tabla.actualizar_df(df)
+    
+    def closeEvent(self, event):
+        self.receptor.detener()
+        super().closeEvent(event)
+
+
+def puerto_configurado():
+    """Puerto de publicación de config.json, si existe"""
+    try:
+        import json
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return int(json.load(f).get('puerto_publicacion') or PUERTO_PUBLICACION)
+    except (OSError, ValueError, TypeError):
+        return PUERTO_PUBLICACION
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lector de tenencias publicadas en localhost")
+    parser.add_argument('--puerto', type=int, help="Puerto del publicador (por defecto, puerto_publicacion de config.json o 8765)")
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+    
+    app = QApplication(sys.argv)
+    ventana = VentanaLector(args.puerto or puerto_configurado(), args.host)
+    ventana.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
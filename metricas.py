@@ -0,0 +1,209 @@
+"""Métricas de tiempo del ciclo de actualización, sin dependencias de interfaz.
+
+Cada etapa (red, construcción del DataFrame, etapas de normalización,
+historial, tabla) registra su duración en un histograma rodante de tamaño
+fijo, del que se obtienen p50/p95/p99. Las métricas se pueden exportar como
+texto (formato de exposición de Prometheus) a un archivo o servir en un
+endpoint HTTP que solo escucha en localhost. CapturaPerfil permite correr
+cProfile durante N ciclos consecutivos.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from bitacora import obtener
+
+
+log = obtener('metricas')
+
+
+MUESTRAS_POR_ETAPA = 1000  # Tamaño de la ventana de cada histograma
+ARCHIVO_METRICAS = 'metricas.txt'
+ARCHIVO_PERFIL = 'perfil.prof'
+PERCENTILES = (50, 95, 99)
+
+
+class HistogramaRodante:
+    """Últimas N duraciones de una etapa en un buffer circular"""
+    def __init__(self, capacidad=MUESTRAS_POR_ETAPA):
+        self.valores = np.zeros(capacidad)
+        self.posicion = 0
+        self.total = 0  # Muestras registradas desde el inicio
+
+    def registrar(self, segundos):
+        self.valores[self.posicion] = segundos
+        self.posicion = (self.posicion + 1) % len(self.valores)
+        self.total += 1
+
+    @property
+    def ultimo(self):
+        return self.valores[self.posicion - 1] if self.total else np.nan
+
+    def percentiles(self):
+        """p50, p95 y p99 (segundos) de la ventana actual"""
+        if not self.total:
+            return (np.nan,) * len(PERCENTILES)
+        return tuple(np.percentile(self.valores[:min(self.total, len(self.valores))], PERCENTILES))
+
+
+class Metricas:
+    """Histogramas por etapa; se puede registrar desde cualquier hilo"""
+    def __init__(self, capacidad=MUESTRAS_POR_ETAPA):
+        self.capacidad = capacidad
+        self.histogramas = {}  # etapa -> HistogramaRodante, en orden de aparición
+        self.lock = threading.Lock()
+
+    def registrar(self, etapa, segundos):
+        with self.lock:
+            histograma = self.histogramas.get(etapa)
+            if histograma is None:
+                histograma = self.histogramas[etapa] = HistogramaRodante(self.capacidad)
+            histograma.registrar(segundos)
+
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def resumen(self):
+        """Lista de (etapa, muestras, último, p50, p95, p99), tiempos en segundos"""
+        with self.lock:
+            return [(etapa, histograma.total, histograma.ultimo) + histograma.percentiles()
+                    for etapa, histograma in self.histogramas.items()]
+
+    def texto(self):
+        """Métricas en formato de exposición de Prometheus"""
+        lineas = ['# HELP shda_etapa_segundos Duración de cada etapa del ciclo de actualización',
+                  '# TYPE shda_etapa_segundos summary']
+        for etapa, muestras, _, *valores in self.resumen():
+            for percentil, valor in zip(PERCENTILES, valores):
+                lineas.append(f'shda_etapa_segundos{{etapa="{etapa}",quantile="{percentil / 100:g}"}} {valor:.6f}')
+            lineas.append(f'shda_etapa_segundos_count{{etapa="{etapa}"}} {muestras}')
+        return '\n'.join(lineas) + '\n'
+
+    def exportar(self, archivo=ARCHIVO_METRICAS):
+        """Escribe las métricas en un archivo de texto (temporal + rename)"""
+        temporal = archivo + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(self.texto())
+        os.replace(temporal, archivo)
+
+
+class ServidorMetricas:
+    """Sirve las métricas en http://127.0.0.1:<puerto>/metrics desde un hilo de fondo"""
+    def __init__(self, metricas, puerto):
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                cuerpo = metricas.texto().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass  # Sin una línea por request en la consola
+
+        # Solo localhost: las métricas no se exponen a la red
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', puerto), Manejador)
+        self.servidor.daemon_threads = True
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, name='metricas', daemon=True)
+        self.hilo.start()
+        log.info("Métricas en http://127.0.0.1:%d/metrics", self.servidor.server_address[1])
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class CapturaPerfil:
+    """Corre cProfile durante los próximos N ciclos y guarda el resultado.
+
+    Cada hilo usa su propio perfilador (cProfile es por hilo); al completar
+    los ciclos se combinan y se guardan en archivo (para snakeviz, pstats, etc.),
+    junto con un .txt con las funciones de más tiempo acumulado. Con imprimir
+    (modo sin interfaz) esa tabla además se imprime por consola.
+    """
+    def __init__(self):
+        self.restantes = 0
+        self.archivo = ARCHIVO_PERFIL
+        self.imprimir = False
+        self.perfiles = {}  # id de hilo -> cProfile.Profile
+        self.lock = threading.Lock()
+
+    @property
+    def activa(self):
+        return self.restantes > 0
+
+    def iniciar(self, ciclos, archivo=ARCHIVO_PERFIL, imprimir=False):
+        with self.lock:
+            self.restantes = ciclos
+            self.archivo = archivo
+            self.imprimir = imprimir
+            self.perfiles = {}
+        log.info("Perfilando los próximos %d ciclos", ciclos)
+
+    def perfil_del_hilo(self):
+        with self.lock:
+            return self.perfiles.setdefault(threading.get_ident(), cProfile.Profile())
+
+    @contextmanager
+    def seccion(self):
+        """Perfila el bloque si hay una captura activa (sin contar un ciclo)"""
+        if not self.activa:
+            yield
+            return
+        perfil = self.perfil_del_hilo()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otro perfilador ya activo (en Python 3.12+ solo puede haber uno a la vez)
+            yield
+            return
+        try:
+            yield
+        finally:
+            perfil.disable()
+
+    @contextmanager
+    def ciclo(self):
+        """Perfila un ciclo completo y lo descuenta; al llegar a cero guarda el resultado"""
+        if not self.activa:
+            yield
+            return
+        with self.seccion():
+            yield
+        with self.lock:
+            self.restantes -= 1
+            terminada = self.restantes == 0
+            perfiles = list(self.perfiles.values()) if terminada else []
+        if terminada:
+            self.guardar(perfiles)
+
+    def guardar(self, perfiles):
+        estadisticas = pstats.Stats(perfiles[0])
+        for perfil in perfiles[1:]:
+            estadisticas.add(perfil)
+        estadisticas.dump_stats(self.archivo)
+
+        salida = io.StringIO()
+        pstats.Stats(self.archivo, stream=salida).sort_stats('cumulative').print_stats(25)
+        resumen = os.path.splitext(self.archivo)[0] + '.txt'
+        with open(resumen, 'w', encoding='utf-8') as f:
+            f.write(salida.getvalue())
+        if self.imprimir:
+            print(salida.getvalue())
+        log.info("Perfil guardado en %s (resumen en %s)", self.archivo, resumen)
@@ -0,0 +1,482 @@
+"""Motor de sondeo en un proceso aparte, con la tenencia entregada por memoria compartida.
+
+Opcional (config.json: "motor_en_proceso": true). Cada cuenta se consulta y
+normaliza en su propio proceso (un SondeoCuenta completo: pipeline, historial
+y alertas), así que ni pandas ni el cliente de SHDA compiten por el GIL con
+la interfaz, y si el cliente se cuelga o el proceso se cae la ventana sigue
+viva: el supervisor (ClienteMotor) lo detecta y lo vuelve a arrancar.
+
+Cada tenencia se escribe en un segmento de memoria compartida con dos
+ranuras (doble buffer), cada una con su número de versión:
+
+- columnas numéricas: matriz float64 columnas x filas; la interfaz arma el
+  DataFrame directamente sobre la memoria compartida, sin copiar
+- columnas categóricas (TIPO): códigos int16
+- textos: UTF-8, separados por SEPARADOR_TEXTO
+
+Por el pipe solo viajan mensajes chicos: en qué ranura quedó cada versión,
+el esquema cuando cambia, el estado del planificador y las alertas. Una
+ranura no se reescribe mientras la interfaz la usa: se libera sola cuando se
+descartan todos los arrays armados sobre ella. Si no hay ranura libre el
+motor se queda solo con la última tenencia y la escribe apenas se libere una.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import bitacora
+from bitacora import obtener
+
+
+log = obtener('motor')
+
+
+SEPARADOR_TEXTO = '\x1f'  # Separador de unidades ASCII; no aparece en los textos de SHDA
+CABECERA_RANURA = 64  # Bytes al inicio de cada ranura: versión, filas y bytes de texto
+TAMANO_INICIAL = 1 << 20  # Bytes del segmento (las dos ranuras); se duplica al hacer falta
+
+PLAZO_COLGADO = 90.0  # Segundos sin noticias del motor para darlo por colgado
+ESPERA_DETENER = 5.0  # Segundos para que el motor termine solo antes de forzarlo
+ESPERA_REINICIO_INICIAL = 1.0
+ESPERA_REINICIO_MAXIMA = 30.0
+
+# Clases de columna en la memoria compartida
+NUMERO = 'numero'
+CATEGORIA = 'categoria'
+TEXTO = 'texto'
+
+
+def alinear(n, a=8):
+    return (n + a - 1) // a * a
+
+
+class EsquemaTenencia:
+    """Columnas de la tenencia, su clase de almacenamiento y el dtype con que se reconstruyen"""
+    def __init__(self, columnas, clases, dtypes):
+        self.columnas = list(columnas)
+        self.clases = list(clases)
+        self.dtypes = list(dtypes)
+        self.numericas = [col for col, clase in zip(self.columnas, self.clases) if clase == NUMERO]
+        self.categoricas = [col for col, clase in zip(self.columnas, self.clases) if clase == CATEGORIA]
+        self.textos = [col for col, clase in zip(self.columnas, self.clases) if clase == TEXTO]
+
+    @classmethod
+    def de(cls, df):
+        clases = []
+        for col in df.columns:
+            tipo = df[col].dtype
+            if isinstance(tipo, pd.CategoricalDtype):
+                clases.append(CATEGORIA)
+            elif pd.api.types.is_numeric_dtype(tipo) and not pd.api.types.is_bool_dtype(tipo):
+                clases.append(NUMERO)
+            else:
+                clases.append(TEXTO)
+        return cls(df.columns, clases, df.dtypes)
+
+    def __eq__(self, otro):
+        return (isinstance(otro, EsquemaTenencia) and self.columnas == otro.columnas
+                and self.clases == otro.clases and self.dtypes == otro.dtypes)
+
+    def bytes_necesarios(self, filas, bytes_texto):
+        return (CABECERA_RANURA + len(self.numericas) * filas * 8 + alinear(len(self.categoricas) * filas * 2)
+                + bytes_texto)
+
+
+class SegmentoCompartido:
+    """Segmento de memoria compartida con dos ranuras de igual tamaño.
+
+    numpy no retiene el buffer del mapeo: cerrarlo con arrays vivos los dejaría
+    apuntando a memoria liberada. Por eso se cuentan las lecturas vivas y, si
+    hay alguna, el cierre se hace cuando se descarta la última.
+    """
+    def __init__(self, memoria):
+        self.memoria = memoria
+        self.nombre = memoria.name
+        self.tamano_ranura = memoria.size // 2
+        self.lock = threading.Lock()
+        self.en_uso = 0  # Lecturas con arrays vivos
+        self.cerrar_al_soltar = False
+
+    @classmethod
+    def crear(cls, tamano):
+        return cls(shared_memory.SharedMemory(create=True, size=tamano))
+
+    @classmethod
+    def abrir(cls, nombre):
+        return cls(shared_memory.SharedMemory(name=nombre))
+
+    def escribir(self, ranura, version, esquema, df, texto):
+        """Escribe la tenencia en la ranura (el motor sabe que la interfaz no la está usando)"""
+        filas = len(df)
+        crudo = np.ndarray(self.tamano_ranura, dtype=np.uint8, buffer=self.memoria.buf,
+                           offset=ranura * self.tamano_ranura)
+        inicio = CABECERA_RANURA
+        numeros = crudo[inicio:inicio + len(esquema.numericas) * filas * 8].view(np.float64)
+        numeros = numeros.reshape(len(esquema.numericas), filas)
+        for j, col in enumerate(esquema.numericas):
+            numeros[j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        inicio += numeros.nbytes
+
+        codigos = crudo[inicio:inicio + len(esquema.categoricas) * filas * 2].view(np.int16)
+        codigos = codigos.reshape(len(esquema.categoricas), filas)
+        for j, col in enumerate(esquema.categoricas):
+            codigos[j] = df[col].cat.codes.to_numpy()
+        inicio += alinear(codigos.nbytes)
+
+        crudo[inicio:inicio + len(texto)] = np.frombuffer(texto, dtype=np.uint8)
+        crudo[:24].view(np.int64)[:] = (version, filas, len(texto))
+        del numeros, codigos, crudo
+
+    def leer(self, ranura, version, esquema, al_soltar=None):
+        """DataFrame armado sobre la ranura; al_soltar(nombre, ranura) se llama cuando se descarta el último array"""
+        crudo = np.ndarray(self.tamano_ranura, dtype=np.uint8, buffer=self.memoria.buf,
+                           offset=ranura * self.tamano_ranura)
+        crudo.flags.writeable = False
+        version_escrita, filas, bytes_texto = (int(v) for v in crudo[:24].view(np.int64))
+        if version_escrita != version:
+            raise RuntimeError(f"La ranura {ranura} tiene la versión {version_escrita}, se esperaba {version}")
+
+        inicio = CABECERA_RANURA
+        numeros = crudo[inicio:inicio + len(esquema.numericas) * filas * 8].view(np.float64)
+        numeros = numeros.reshape(len(esquema.numericas), filas)
+        inicio += numeros.nbytes
+        codigos = crudo[inicio:inicio + len(esquema.categoricas) * filas * 2].view(np.int16)
+        codigos = codigos.reshape(len(esquema.categoricas), filas)
+        inicio += alinear(codigos.nbytes)
+        textos = bytes(crudo[inicio:inicio + bytes_texto]).decode('utf-8').split(SEPARADOR_TEXTO)
+
+        # Las numéricas quedan en un único bloque que es la propia matriz compartida; el resto
+        # se arma aparte y se une de una vez (insertar columna por columna cuesta más que leer)
+        numericas = pd.DataFrame(numeros.T, columns=esquema.numericas, copy=False)
+        resto = {}
+        for col, clase, tipo in zip(esquema.columnas, esquema.clases, esquema.dtypes):
+            if clase == CATEGORIA:
+                j = esquema.categoricas.index(col)
+                resto[col] = pd.Categorical.from_codes(codigos[j].astype(np.int64), dtype=tipo)
+            elif clase == TEXTO:
+                j = esquema.textos.index(col)
+                resto[col] = pd.array(textos[j * filas:(j + 1) * filas], dtype=tipo)
+        df = pd.concat([numericas, pd.DataFrame(resto, index=numericas.index)], axis=1)
+        if list(df.columns) != esquema.columnas:
+            df = df.reindex(columns=esquema.columnas)
+        for col, clase, tipo in zip(esquema.columnas, esquema.clases, esquema.dtypes):
+            if clase == NUMERO and tipo != np.float64:
+                df[col] = df[col].astype(tipo)  # Numéricas no float64 (no las arma el pipeline): copia
+
+        with self.lock:
+            self.en_uso += 1
+        weakref.finalize(crudo, self.soltar, ranura, al_soltar)
+        return df
+
+    def soltar(self, ranura, al_soltar):
+        """Finalizador de una lectura (corre en el hilo que descarta el último array)"""
+        with self.lock:
+            self.en_uso -= 1
+            cerrar = self.en_uso == 0 and self.cerrar_al_soltar
+        if cerrar:
+            self.memoria.close()
+        if al_soltar is not None:
+            al_soltar(self.nombre, ranura)
+
+    def cerrar(self):
+        """Cierra el mapeo, o lo deja para cuando se descarte la última lectura viva"""
+        with self.lock:
+            if self.en_uso:
+                self.cerrar_al_soltar = True
+                return
+        self.memoria.close()
+
+    def borrar(self):
+        try:
+            self.memoria.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def codificar_textos(df, esquema):
+    """Todos los textos, columna por columna, en un solo bloque UTF-8"""
+    if not esquema.textos or not len(df):
+        return b''
+    partes = []
+    for col in esquema.textos:
+        partes.extend(df[col].fillna('').astype(str).tolist())
+    texto = SEPARADOR_TEXTO.join(partes)
+    if texto.count(SEPARADOR_TEXTO) != len(partes) - 1:
+        texto = SEPARADOR_TEXTO.join(parte.replace(SEPARADOR_TEXTO, ' ') for parte in partes)
+    return texto.encode('utf-8')
+
+
+# Lado del motor (proceso aparte)
+
+class MotorProceso:
+    """Sondeo de una cuenta dentro del proceso del motor"""
+    def __init__(self, conexion, cuenta, config):
+        from alertas import ReglasCompiladas, MotorAlertas, RegistroAlertas
+        from cuentas import SondeoCuenta
+        from series import VENTANA_MINUTOS
+        from sesion import GestorSesiones
+
+        self.conexion = conexion
+        reglas = ReglasCompiladas(config.get('alertas'))
+        alertas = None
+        if len(reglas):
+            nombre = cuenta.nombre if len(config.get('cuentas') or []) > 1 else ''
+            alertas = MotorAlertas(reglas, nombre, RegistroAlertas(), self.notificar)
+        self.sondeo = SondeoCuenta(cuenta, columnas_operaciones=config.get('columnas_operaciones', False),
+                                   fecha_base=config.get('fecha_base'),
+                                   columnas_intradiarias=config.get('columnas_intradiarias', False),
+                                   ventana_minutos=config.get('ventana_minutos', VENTANA_MINUTOS),
+                                   columnas_base=config.get('columnas_base', False), alertas=alertas)
+        self.sesiones = GestorSesiones()
+        self.segmento = None
+        self.esquema = None  # Último esquema enviado
+        self.version = 0
+        self.ocupadas = set()  # Ranuras que la interfaz todavía usa
+        self.pendiente = None  # Última tenencia sin publicar por falta de ranura libre
+        self.ultimo_df = None
+
+    def notificar(self, alertas):
+        self.conexion.send(('alertas', alertas))
+
+    def estado(self):
+        planificador = self.sondeo.planificador
+        return planificador.intervalo, planificador.resumen(), self.sondeo.estado_conexion()
+
+    def publicar(self, df):
+        """Escribe la tenencia en una ranura libre y avisa en qué ranura quedó"""
+        libres = [ranura for ranura in (0, 1) if ranura not in self.ocupadas]
+        if not libres:
+            self.pendiente = df
+            return False
+        self.pendiente = None
+
+        esquema = EsquemaTenencia.de(df)
+        texto = codificar_textos(df, esquema)
+        necesarios = esquema.bytes_necesarios(len(df), len(texto))
+        if self.segmento is None or necesarios > self.segmento.tamano_ranura:
+            # Segmento nuevo: la interfaz borra el anterior cuando abre este
+            tamano = max(TAMANO_INICIAL, 2 * self.segmento.memoria.size if self.segmento is not None else 0)
+            while tamano // 2 < necesarios:
+                tamano *= 2
+            if self.segmento is not None:
+                self.segmento.cerrar()
+            self.segmento = SegmentoCompartido.crear(tamano)
+            self.ocupadas = set()
+            libres = [0, 1]
+
+        ranura = libres[0]
+        self.version += 1
+        self.segmento.escribir(ranura, self.version, esquema, df, texto)
+        self.ocupadas.add(ranura)
+        tendencias = self.sondeo.tendencias
+        self.conexion.send(('instantanea', {
+            'segmento': self.segmento.nombre,
+            'ranura': ranura,
+            'version': self.version,
+            'esquema': esquema if esquema != self.esquema else None,
+            'base': df.attrs.get('base'),
+            'tendencias': tendencias,
+            'estado': self.estado(),
+        }))
+        self.esquema = esquema
+        return True
+
+    def atender(self, mensaje):
+        """Mensaje de la interfaz; devuelve False para terminar"""
+        tipo = mensaje[0]
+        if tipo == 'liberar':
+            _, segmento, ranura = mensaje
+            if self.segmento is not None and segmento == self.segmento.nombre:
+                self.ocupadas.discard(ranura)
+                if self.pendiente is not None:
+                    self.publicar(self.pendiente)
+        elif tipo == 'base':
+            self.sondeo.pipeline.base = mensaje[1]
+            if self.ultimo_df is not None:
+                self.ultimo_df = self.sondeo.pipeline.con_base(self.ultimo_df)
+                self.publicar(self.ultimo_df)
+        elif tipo == 'detener':
+            return False
+        return True
+
+    def ejecutar(self):
+        proxima = 0.0
+        try:
+            while True:
+                espera = max(0.0, proxima - time.monotonic())
+                if self.conexion.poll(espera):
+                    if not self.atender(self.conexion.recv()):
+                        break
+                    continue
+
+                mensaje = ''
+                df = None
+                try:
+                    df = self.sondeo.consultar_con_sesion(self.sesiones)
+                except Exception as e:
+                    mensaje = str(e) or e.__class__.__name__
+                if df is not None:
+                    self.ultimo_df = df
+                if df is None or not self.publicar(df):
+                    # Sin tenencia nueva igual se informa: la interfaz sabe que el motor sigue vivo
+                    self.conexion.send(('estado', mensaje, self.estado()))
+                proxima = time.monotonic() + self.sondeo.planificador.intervalo
+        except (EOFError, BrokenPipeError):
+            pass  # La interfaz se cerró
+        finally:
+            self.sondeo.cerrar()
+            self.sesiones.cerrar()
+            if self.segmento is not None:
+                self.segmento.cerrar()
+
+
+def ejecutar_motor(conexion, cuenta, config, cola_log):
+    """Punto de entrada del proceso del motor"""
+    bitacora.configurar_proceso(cola_log, config)
+    try:
+        MotorProceso(conexion, cuenta, config).ejecutar()
+    except KeyboardInterrupt:
+        pass  # Ctrl+C en la consola llega también al motor; la interfaz decide qué hacer
+
+
+# Lado de la interfaz
+
+class ClienteMotor:
+    """Arranca, supervisa y lee el proceso del motor de una cuenta, sin dependencias de interfaz.
+
+    recibir() devuelve los eventos ya decodificados; verificar() indica si el
+    proceso terminó o dejó de responder, para detenerlo y volver a iniciarlo
+    después de espera_reinicio().
+    """
+    def __init__(self, cuenta, config):
+        self.cuenta = cuenta
+        self.config = config
+        self.contexto = multiprocessing.get_context('spawn')  # Sin fork: la interfaz tiene hilos y Qt
+        self.proceso = None
+        self.conexion = None
+        self.lock = threading.Lock()
+        # Ranuras liberadas: las encola el finalizador del último array (en cualquier hilo, incluso a mitad
+        # de un send) y se avisan al motor desde enviar_liberadas()
+        self.liberadas = queue.SimpleQueue()
+        self.segmento = None
+        self.esquema = None
+        self.intervalo = 0.0
+        self.ultimo_mensaje = None  # time.monotonic() del último mensaje del motor
+        self.cerrada = False  # El motor cerró su extremo del pipe
+        self.reinicios = 0
+
+    def iniciar(self):
+        self.conexion, extremo = self.contexto.Pipe()
+        self.proceso = self.contexto.Process(target=ejecutar_motor, name=f"motor-{self.cuenta.nombre}",
+                                             args=(extremo, self.cuenta, self.config, bitacora.cola_procesos()),
+                                             daemon=True)
+        self.proceso.start()
+        extremo.close()
+        self.esquema = None
+        self.cerrada = False
+        self.ultimo_mensaje = time.monotonic()
+        log.info("Motor de %s iniciado (pid %d)", self.cuenta.nombre, self.proceso.pid)
+
+    def enviar(self, mensaje):
+        with self.lock:
+            if self.conexion is None:
+                return
+            try:
+                self.conexion.send(mensaje)
+            except (OSError, ValueError):
+                pass  # El motor terminó; el supervisor lo reinicia
+
+    def liberar(self, segmento, ranura):
+        self.liberadas.put((segmento, ranura))
+
+    def enviar_liberadas(self):
+        while True:
+            try:
+                segmento, ranura = self.liberadas.get_nowait()
+            except queue.Empty:
+                return
+            self.enviar(('liberar', segmento, ranura))
+
+    def fileno(self):
+        return self.conexion.fileno()
+
+    def recibir(self):
+        """Eventos pendientes: ('tenencia', df, tendencias, estado), ('estado', mensaje, estado) o ('alertas', lista)"""
+        eventos = []
+        self.enviar_liberadas()
+        try:
+            while self.conexion is not None and self.conexion.poll():
+                tipo, *datos = self.conexion.recv()
+                self.ultimo_mensaje = time.monotonic()
+                if tipo == 'instantanea':
+                    eventos.append(self.leer_instantanea(datos[0]))
+                    self.intervalo = datos[0]['estado'][0]
+                elif tipo == 'estado':
+                    eventos.append(('estado', *datos))
+                    self.intervalo = datos[1][0]
+                else:
+                    eventos.append((tipo, *datos))
+        except (EOFError, OSError):
+            self.cerrada = True  # El proceso terminó; verificar() lo informa
+        return eventos
+
+    def leer_instantanea(self, datos):
+        if self.segmento is None or self.segmento.nombre != datos['segmento']:
+            self.cambiar_segmento(SegmentoCompartido.abrir(datos['segmento']))
+        if datos['esquema'] is not None:
+            self.esquema = datos['esquema']
+        # La ranura vuelve al motor cuando ya no queda ningún array armado sobre ella
+        df = self.segmento.leer(datos['ranura'], datos['version'], self.esquema, al_soltar=self.liberar)
+        if datos['base'] is not None:
+            df.attrs['base'] = datos['base']
+        self.reinicios = 0
+        return 'tenencia', df, datos['tendencias'], datos['estado']
+
+    def cambiar_segmento(self, segmento):
+        """El motor creó un segmento nuevo (o es otro proceso): el anterior se borra y se cierra cuando se pueda"""
+        if self.segmento is not None:
+            self.segmento.borrar()
+            self.segmento.cerrar()
+        self.segmento = segmento
+
+    def verificar(self):
+        """None si el motor anda; si no, el motivo"""
+        if self.proceso is None:
+            return None
+        if not self.proceso.is_alive():
+            return f"terminó con código {self.proceso.exitcode}"
+        if self.cerrada:
+            return "cerró la conexión"
+        silencio = time.monotonic() - self.ultimo_mensaje
+        if silencio > max(PLAZO_COLGADO, 3 * self.intervalo):
+            return f"no responde hace {silencio:.0f} s"
+        return None
+
+    def espera_reinicio(self):
+        """Backoff exponencial entre reinicios seguidos; se reinicia al recibir una tenencia"""
+        self.reinicios += 1
+        return min(ESPERA_REINICIO_INICIAL * 2 ** (self.reinicios - 1), ESPERA_REINICIO_MAXIMA)
+
+    def detener(self, esperar=ESPERA_DETENER):
+        """Pide al motor que termine (guardando su estado) y lo fuerza si no lo hace a tiempo"""
+        if self.proceso is None:
+            return
+        self.enviar(('detener',))
+        self.proceso.join(esperar)
+        if self.proceso.is_alive():
+            self.proceso.terminate()
+            self.proceso.join(1.0)
+            if self.proceso.is_alive():
+                self.proceso.kill()
+                self.proceso.join()
+        with self.lock:
+            self.conexion.close()
+            self.conexion = None
+        self.proceso = None
+        self.cambiar_segmento(None)
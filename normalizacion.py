@@ -0,0 +1,409 @@
+"""Normalización de la tenencia de SHDA, sin dependencias de interfaz gráfica.
+
+Convierte la respuesta cruda de hb.account en el DataFrame que se muestra,
+mediante etapas independientes que se pueden ejecutar, medir o reemplazar
+por separado. Las etapas trabajan en el lugar sobre una Cartera (ver
+cartera.py) y recién la última arma el DataFrame.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+from cartera import Cartera, COLUMNAS_TOTALES
+from cierres import AlmacenCierres
+from operaciones import CacheOperaciones, columnas_operaciones, parsear_detalle
+from series import SeriesIntradiarias, VENTANA_MINUTOS
+
+
+log = obtener('normalizacion')
+
+
+COLUMNAS_FINALES = ['TIPO', 'Nombre de la Especie', 'Ticker', 'Cantidad', 'Hora', 'Ultimo Precio', 'Resultado',
+                    'Costo Promedio', 'Sabe Dios', '% Var Total', 'Importe Actual', 'Actual en U$S', '% Diario',
+                    'Resultado del dia', 'Var % Base', 'Resultado Base', 'Operaciones', 'Cant. Operada', 'Neto Operado', 'VWAP',
+                    'Máx. Día', 'Mín. Día', 'Var % Ventana', 'Volatilidad', 'Tendencia',
+                    "Detalle de operaciones diarias"]
+
+ARCHIVO_ANTERIOR = 'anterior.json'  # Formato anterior a cierres/, se sigue leyendo si no hay cierres
+
+COLUMNA_DETALLE = 'Detalle de operaciones diarias'
+
+# Al consolidar cuentas estas columnas se suman; los porcentajes y el costo se ponderan
+COLUMNAS_SUMA = ['Cantidad', 'Resultado', 'Importe Actual', 'Actual en U$S', 'Resultado del dia', 'Resultado Base',
+                 'Operaciones', 'Cant. Operada', 'Neto Operado']
+COLUMNAS_PONDERADAS = {
+    'Costo Promedio': 'Cantidad',
+    '% Var Total': 'Importe Actual',
+    '% Diario': 'Importe Actual',
+    'Var % Base': 'Importe Actual',
+    'VWAP': 'Cant. Operada',
+}
+
+
+def columna_numerica(df, columna):
+    """Devuelve la columna como array float, con 0 para vacíos o faltantes"""
+    if columna not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[columna], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+def hay_cierre(df):
+    """Indica si alguna fila de la respuesta cruda tiene "CIERRE" en la columna "Hora" """
+    if 'Hora' not in df.columns:
+        return False
+    return bool((df['Hora'].astype(str).str.upper() == 'CIERRE').any())
+
+
+class CacheAnterior:
+    """Mantiene en memoria el cierre base de las variaciones, indexado por Ticker.
+
+    La base es el cierre de fecha (AAAA-MM-DD) o, si no se indica, el último
+    cierre anterior a hoy. Sin cierres guardados se usa anterior.json. El
+    archivo se vuelve a leer solo cuando cambia (ruta o fecha de modificación),
+    así que en régimen normal no hay lectura de disco en cada consulta.
+    """
+    def __init__(self, archivo=ARCHIVO_ANTERIOR, almacen=None, fecha=None):
+        self.archivo = archivo
+        self.almacen = almacen if almacen is not None else AlmacenCierres()
+        self.fecha = fecha
+        self.clave = None  # (ruta, mtime) de la base cargada
+        self.base = None
+
+    def obtener(self):
+        """Devuelve el DataFrame base (PCIO_anterior, IMPO_anterior) o None si no hay cierre"""
+        fecha = self.fecha or self.almacen.fecha_base()
+        ruta = self.almacen.ruta(fecha) if fecha else self.archivo
+        try:
+            clave = (ruta, os.stat(ruta).st_mtime_ns)
+        except FileNotFoundError:
+            self.clave = None
+            self.base = None
+            return None
+
+        if clave != self.clave:
+            self.base = self.almacen.cargar(fecha) if fecha else self.cargar()
+            self.clave = clave
+        return self.base
+
+    def cargar(self):
+        """Lee anterior.json (formato anterior)"""
+        with open(self.archivo, 'r', encoding='utf-8') as f:
+            datos_anteriores = json.load(f)
+
+        df_anterior = pd.DataFrame(datos_anteriores)
+
+        # anterior.json puede tener las columnas crudas de SHDA o las ya renombradas
+        df_anterior = df_anterior.rename(columns={'TICK': 'Ticker', 'PCIO': 'Ultimo Precio', 'IMPO': 'Importe Actual'})
+        if 'Ticker' not in df_anterior.columns:
+            return pd.DataFrame(columns=['PCIO_anterior', 'IMPO_anterior'])
+
+        ticker = df_anterior['Ticker'].astype(str)
+        base = pd.DataFrame({
+            'PCIO_anterior': columna_numerica(df_anterior, 'Ultimo Precio'),
+            'IMPO_anterior': columna_numerica(df_anterior, 'Importe Actual'),
+        })
+        base.index = ticker
+
+        # Excluir fila de totales y tickers vacíos; ante repetidos gana el último
+        base = base[((ticker != '') & (ticker != 'TOTALES')).to_numpy()]
+        base = base[~base.index.duplicated(keep='last')]
+
+        log.info("Datos anteriores cargados con %d tickers", len(base))
+        return base
+
+
+# Etapas de normalización: cada una recibe la Cartera de la cuenta, completa columnas en el lugar y la devuelve
+
+def calcular_usd(cartera):
+    """Completa 'Actual en U$S' usando el precio de DOLARUSA"""
+    if {'Ticker', 'Ultimo Precio', 'Importe Actual'} <= cartera.presentes:
+        fila = cartera.fila_de('DOLARUSA')
+        if fila is not None:
+            precio_dolar = cartera.datos['Ultimo Precio'][fila]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cartera.asignar('Actual en U$S', (cartera.columna('Importe Actual') / precio_dolar).round(2))
+    return cartera
+
+
+def calcular_variaciones_diarias(cartera, base):
+    """Calcula '% Diario' y 'Resultado del dia' contra la base del cierre anterior"""
+    # Inicializar SIEMPRE las columnas primero
+    cartera.asignar('% Diario', 0.0)
+    cartera.asignar('Resultado del dia', 0.0)
+
+    if base is None:
+        log.warning("No hay cierre anterior para comparar - columnas quedan en 0")
+        return cartera
+
+    if not len(cartera) or base.empty or 'Ticker' not in cartera.presentes:
+        return cartera
+
+    try:
+        # Alinear los valores anteriores con las filas actuales en una sola operación
+        posiciones = base.index.get_indexer(cartera.tickers)
+        encontrados = posiciones >= 0
+
+        pcio_anterior = np.where(encontrados, base['PCIO_anterior'].to_numpy()[posiciones], 0.0)
+        impo_anterior = np.where(encontrados, base['IMPO_anterior'].to_numpy()[posiciones], 0.0)
+        pcio_actual = cartera.numerica('Ultimo Precio')
+        impo_actual = cartera.numerica('Importe Actual')
+
+        # % Diario (variación en precio), solo donde hay precio anterior
+        con_precio = encontrados & (pcio_anterior != 0)
+        variacion = np.zeros(len(cartera))
+        np.divide(pcio_actual - pcio_anterior, pcio_anterior, out=variacion, where=con_precio)
+        cartera.asignar('% Diario', (variacion * 100).round(2))
+
+        # Resultado del día (diferencia en importe)
+        cartera.asignar('Resultado del dia', np.where(encontrados, impo_actual - impo_anterior, 0.0).round(2))
+
+        log.debug("Variaciones calculadas para %d tickers", encontrados.sum())
+
+    except Exception as e:
+        log.exception("Error al calcular variaciones diarias: %s", e)
+        cartera.asignar('% Diario', 0.0)
+        cartera.asignar('Resultado del dia', 0.0)
+
+    return cartera
+
+
+# Sobre DataFrames ya normalizados (por ejemplo, al consolidar cuentas)
+
+def agregar_totales(df):
+    """Agrega la fila TOTALES al final sin cambiar el tipo de ninguna columna"""
+    if 'Nombre de la Especie' not in df.columns:
+        return df
+
+    df_sin_totales = df[df['Nombre de la Especie'] != 'TOTALES']
+
+    fila_totales = {}
+    for col in df.columns:
+        tipo = df[col].dtype
+        if col == 'Nombre de la Especie':
+            fila_totales[col] = pd.Series(['TOTALES'], dtype=tipo)
+        elif col in COLUMNAS_TOTALES:
+            fila_totales[col] = pd.Series([df_sin_totales[col].sum()], dtype=float)
+        elif isinstance(tipo, pd.CategoricalDtype):
+            fila_totales[col] = pd.Series(pd.Categorical([None], dtype=tipo))
+        elif pd.api.types.is_numeric_dtype(tipo):
+            # No sumar porcentajes, precios ni cantidades: NaN se muestra vacío
+            fila_totales[col] = pd.Series([np.nan])
+        else:
+            fila_totales[col] = pd.Series([''], dtype=tipo)
+
+    return pd.concat([df, pd.DataFrame(fila_totales)], ignore_index=True)
+
+
+def seleccionar_columnas(df):
+    """Deja solo las columnas que se muestran, en el orden de la tabla"""
+    columnas_finales = [col for col in COLUMNAS_FINALES if col in df.columns]
+    if columnas_finales:
+        df = df[columnas_finales]
+    return df
+
+
+class PipelineTenencias:
+    """Encadena las etapas de normalización sobre la respuesta cruda de hb.account.
+
+    etapas es una lista de (nombre, función) que se aplican en orden; se puede
+    recorrer para medir o reemplazar etapas individuales. Con metricas (ver
+    metricas.Metricas) se registra la duración de cada etapa en cada consulta.
+    """
+    def __init__(self, cache_anterior=None, guardar_cierre=True, columnas_operaciones=False, metricas=None,
+                 columnas_intradiarias=False, ventana_minutos=VENTANA_MINUTOS, columnas_base=False, consultas=None):
+        self.cache_anterior = cache_anterior if cache_anterior is not None else CacheAnterior()
+        self.guardar_cierre = guardar_cierre
+        self.columnas_operaciones = columnas_operaciones
+        self.columnas_intradiarias = columnas_intradiarias
+        self.ventana_minutos = ventana_minutos
+        self.metricas = metricas
+        self.operaciones = CacheOperaciones()
+        self.series = SeriesIntradiarias()  # Solo se alimenta con columnas_intradiarias
+        self.tendencias = None  # series.Tendencias de la última respuesta procesada
+        self.columnas_base = columnas_base
+        self.consultas = consultas  # barras.ConsultasIntradiarias de la cuenta; necesarias para columnas_base
+        self.base = None  # barras.BaseComparacion de Var % Base y Resultado Base; None es el cierre anterior
+        self.cartera = Cartera()  # Filas tipadas por ticker, reutilizadas entre consultas
+        self.etapas = [
+            ('cartera', self.cartera.actualizar),
+            ('usd', calcular_usd),
+            ('operaciones', self.calcular_operaciones),
+            ('intradiario', self.calcular_intradiario),
+            ('variaciones', self.calcular_variaciones),
+            ('base', self.calcular_base),
+            ('totales', self.calcular_totales),
+            ('columnas', self.armar_tabla),
+        ]
+
+    def calcular_variaciones(self, cartera):
+        return calcular_variaciones_diarias(cartera, self.cache_anterior.obtener())
+
+    def calcular_operaciones(self, cartera):
+        """Parsea el detalle de operaciones por ticker y, si se pidieron, completa sus columnas de agregados"""
+        if 'Ticker' not in cartera.presentes or COLUMNA_DETALLE not in cartera.presentes:
+            self.operaciones.procesar([], [])
+            return cartera
+
+        por_ticker = self.operaciones.procesar(cartera.tickers, cartera.columna(COLUMNA_DETALLE))
+        if self.columnas_operaciones:
+            for col, valores in columnas_operaciones(cartera.tickers, por_ticker).items():
+                cartera.asignar(col, valores)
+        return cartera
+
+    def calcular_intradiario(self, cartera):
+        """Registra los precios en los buffers por ticker y completa máximo, mínimo, variación, volatilidad y tendencia"""
+        if not self.columnas_intradiarias or 'Ticker' not in cartera.presentes:
+            return cartera
+
+        ahora = time.time()
+        self.series.registrar(ahora, cartera.tickers, cartera.numerica('Ultimo Precio'))
+        for col, valores in self.series.estadisticas(cartera.tickers, ahora, self.ventana_minutos).items():
+            cartera.asignar(col, valores)
+        self.tendencias = self.series.tendencias(cartera.tickers)
+        return cartera
+
+    def calcular_base(self, cartera):
+        """Registra los precios por minuto y completa Var % Base y Resultado Base contra la base elegida"""
+        if not self.columnas_base or self.consultas is None or 'Ticker' not in cartera.presentes:
+            return cartera
+
+        ahora = time.time()
+        precios = cartera.numerica('Ultimo Precio')
+        self.consultas.registrar(ahora, cartera.tickers, precios)
+        columnas = self.consultas.columnas_base(cartera.tickers, precios, cartera.numerica('Importe Actual'),
+                                                self.base, ahora, self.cache_anterior.obtener())
+        for col, valores in columnas.items():
+            cartera.asignar(col, valores)
+        return cartera
+
+    def con_base(self, df):
+        """Copia de una tenencia ya armada con Var % Base y Resultado Base recalculados contra la base actual.
+
+        Sirve para cambiar de base sin esperar la próxima consulta: solo se
+        consultan los precios base (ya cargados) y se reescriben esas columnas.
+        """
+        if self.consultas is None or 'Ticker' not in df.columns or 'Var % Base' not in df.columns:
+            return df
+
+        df = df.copy()
+        filas = (df['Nombre de la Especie'] != 'TOTALES').to_numpy() if 'Nombre de la Especie' in df.columns \
+            else np.ones(len(df), dtype=bool)
+        tickers = df['Ticker'].to_numpy(dtype=object)[filas]
+        columnas = self.consultas.columnas_base(tickers, columna_numerica(df, 'Ultimo Precio')[filas],
+                                                columna_numerica(df, 'Importe Actual')[filas],
+                                                self.base, time.time(), self.cache_anterior.obtener())
+        for col, valores in columnas.items():
+            completa = df[col].to_numpy(dtype=float, copy=True)
+            completa[filas] = valores
+            if col in COLUMNAS_TOTALES:
+                completa[~filas] = np.nansum(valores)
+            df[col] = completa
+        df.attrs['base'] = self.base
+        return df
+
+    def calcular_totales(self, cartera):
+        """Sumas de la fila TOTALES, guardadas fuera de las filas de datos"""
+        cartera.calcular_totales()
+        return cartera
+
+    def armar_tabla(self, cartera):
+        """DataFrame que se muestra: columnas en el orden de la tabla y TOTALES al final"""
+        df = cartera.a_dataframe(COLUMNAS_FINALES)
+        if self.columnas_base:
+            df.attrs['base'] = self.base  # Con qué base se calcularon Var % Base y Resultado Base
+        return df
+
+    def construir(self, datos):
+        """Arma el DataFrame crudo y guarda el cierre si corresponde"""
+        df = pd.DataFrame(datos)
+
+        # Con "CIERRE" en la columna "Hora" se guarda el cierre del día (solo si cambió)
+        if self.guardar_cierre and hay_cierre(df):
+            try:
+                self.cache_anterior.almacen.guardar(df)
+            except Exception as e:
+                log.error("Error al guardar el cierre: %s", e)
+        return df
+
+    def procesar(self, datos):
+        """Devuelve el DataFrame listo para mostrar"""
+        if self.metricas is None:
+            df = self.construir(datos)
+            for _, etapa in self.etapas:
+                df = etapa(df)
+            return df
+
+        df = datos
+        for nombre, etapa in [('construir', self.construir)] + self.etapas:
+            inicio = time.perf_counter()
+            df = etapa(df)
+            self.metricas.registrar(nombre, time.perf_counter() - inicio)
+        return df
+
+
+def unir_detalles(detalles):
+    """Une los detalles de operaciones (listas serializadas) de un mismo ticker"""
+    operaciones = []
+    for detalle in detalles:
+        operaciones.extend(parsear_detalle(detalle))
+    return str(operaciones) if operaciones else ''
+
+
+def consolidar_tenencias(dfs):
+    """Une las tenencias normalizadas de varias cuentas en una sola, agrupando por Ticker"""
+    partes = []
+    for df in dfs:
+        if df.empty:
+            continue
+        if 'Nombre de la Especie' in df.columns:
+            df = df[df['Nombre de la Especie'] != 'TOTALES']
+        partes.append(df)
+    if not partes:
+        return pd.DataFrame()
+
+    df = pd.concat(partes, ignore_index=True)
+    if 'Ticker' not in df.columns:
+        return seleccionar_columnas(agregar_totales(df))
+
+    columnas = list(df.columns)
+    for col in COLUMNAS_SUMA:
+        if col in df.columns:
+            df[col] = columna_numerica(df, col)
+
+    # Promedios ponderados: se suma valor * peso y se divide después por la suma de pesos
+    for col, peso in COLUMNAS_PONDERADAS.items():
+        if col in df.columns and peso in df.columns:
+            df[col] = columna_numerica(df, col) * df[peso]
+
+    agregaciones = {col: ('sum' if col in COLUMNAS_SUMA or col in COLUMNAS_PONDERADAS else 'first')
+                    for col in columnas if col != 'Ticker'}
+    consolidado = df.groupby('Ticker', sort=False).agg(agregaciones)
+
+    for col, peso in COLUMNAS_PONDERADAS.items():
+        if col in consolidado.columns and peso in consolidado.columns:
+            pesos = consolidado[peso].to_numpy(dtype=float)
+            valores = np.zeros(len(consolidado))
+            np.divide(consolidado[col].to_numpy(dtype=float), pesos, out=valores, where=pesos != 0)
+            consolidado[col] = valores.round(2)
+
+    for col in COLUMNAS_SUMA:
+        if col in consolidado.columns:
+            consolidado[col] = consolidado[col].round(2)
+
+    # Operaciones: solo los tickers con detalle en más de una cuenta necesitan unirse
+    if COLUMNA_DETALLE in df.columns:
+        texto = df[COLUMNA_DETALLE].astype(str).str.strip()
+        con_detalle = df[(texto != '') & (texto.str.lower() != 'nan') & df[COLUMNA_DETALLE].notna()]
+        repetidos = con_detalle['Ticker'].duplicated(keep=False)
+        if repetidos.any():
+            unidos = con_detalle[repetidos].groupby('Ticker', sort=False)[COLUMNA_DETALLE].agg(unir_detalles)
+            consolidado.loc[unidos.index, COLUMNA_DETALLE] = unidos
+        primeros = con_detalle[~repetidos].set_index('Ticker')[COLUMNA_DETALLE]
+        consolidado.loc[primeros.index, COLUMNA_DETALLE] = primeros
+
+    consolidado = consolidado.reset_index()[columnas]
+    return seleccionar_columnas(agregar_totales(consolidado))
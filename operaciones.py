@@ -0,0 +1,176 @@
+"""Operaciones del día por ticker, parseadas una sola vez por consulta.
+
+SHDA devuelve el detalle de operaciones de cada tenencia como texto (JSON o
+una lista de Python serializada). Acá se convierte en un array estructurado
+(DETA, IMPO, CANT, PCIO) por ticker; cada texto distinto se parsea una sola
+vez y se reutiliza mientras siga apareciendo en las respuestas.
+"""
+import ast
+import json
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+
+
+log = obtener('operaciones')
+
+
+# DETA como objeto: un ancho fijo de texto recortaría las descripciones largas
+DTYPE_OPERACION = np.dtype([('DETA', object), ('IMPO', '<f8'), ('CANT', '<f8'), ('PCIO', '<f8')])
+
+SIN_OPERACIONES = np.zeros(0, dtype=DTYPE_OPERACION)
+SIN_OPERACIONES.flags.writeable = False
+
+# Columnas opcionales con agregados de las operaciones del día
+COLUMNAS_OPERACIONES = ['Operaciones', 'Cant. Operada', 'Neto Operado', 'VWAP']
+
+
+def tiene_detalle(valor):
+    """Indica si el valor de la columna de detalle tiene contenido"""
+    if valor is None:
+        return False
+    if isinstance(valor, float):
+        return not np.isnan(valor)
+    if isinstance(valor, str):
+        texto = valor.strip()
+        return texto != '' and texto.lower() != 'nan'
+    return True
+
+
+def parsear_detalle(valor):
+    """Devuelve la lista de operaciones (dicts) de un valor de la columna de detalle"""
+    if not tiene_detalle(valor):
+        return []
+    if isinstance(valor, list):
+        return valor
+    if not isinstance(valor, str):
+        return []
+    try:
+        return json.loads(valor)
+    except json.JSONDecodeError:
+        # Intentar parsear como literal de Python
+        try:
+            return ast.literal_eval(valor)
+        except (ValueError, SyntaxError):
+            return []
+
+
+def a_float(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def operaciones_desde_detalle(valor):
+    """Array estructurado (DETA, IMPO, CANT, PCIO) de solo lectura"""
+    try:
+        operaciones = [op for op in parsear_detalle(valor) if isinstance(op, dict)]
+    except Exception as e:
+        log.warning("Error parseando operaciones: %s", e)
+        return SIN_OPERACIONES
+    if not operaciones:
+        return SIN_OPERACIONES
+
+    registros = np.array([(str(op.get('DETA', '')), a_float(op.get('IMPO', 0)),
+                           a_float(op.get('CANT', 0)), a_float(op.get('PCIO', 0)))
+                          for op in operaciones], dtype=DTYPE_OPERACION)
+    registros.flags.writeable = False
+    return registros
+
+
+def concatenar(partes):
+    """Une los arrays de operaciones de un mismo ticker"""
+    if len(partes) == 1:
+        return partes[0]
+    registros = np.concatenate(partes)
+    registros.flags.writeable = False
+    return registros
+
+
+def unir_operaciones(operaciones):
+    """Une varios diccionarios ticker -> operaciones (por ejemplo, de varias cuentas)"""
+    partes = {}
+    for por_ticker in operaciones:
+        for ticker, registros in por_ticker.items():
+            partes.setdefault(ticker, []).append(registros)
+    return {ticker: concatenar(lista) for ticker, lista in partes.items()}
+
+
+def agregados_operaciones(por_ticker):
+    """DataFrame por ticker con cantidad de operaciones, cantidad operada, neto y VWAP"""
+    tickers = list(por_ticker)
+    if not tickers:
+        return pd.DataFrame(columns=COLUMNAS_OPERACIONES, dtype=float)
+
+    registros = np.concatenate([por_ticker[ticker] for ticker in tickers])
+    largos = np.array([len(por_ticker[ticker]) for ticker in tickers])
+    inicios = np.r_[0, np.cumsum(largos)[:-1]]
+
+    # Sumas por ticker de una sola vez sobre todos los registros
+    cantidad = np.abs(np.nan_to_num(registros['CANT']))
+    cantidad_operada = np.add.reduceat(cantidad, inicios)
+    neto = np.add.reduceat(np.nan_to_num(registros['IMPO']), inicios)
+    monto = np.add.reduceat(cantidad * np.nan_to_num(registros['PCIO']), inicios)
+    vwap = np.zeros(len(tickers))
+    np.divide(monto, cantidad_operada, out=vwap, where=cantidad_operada != 0)
+
+    return pd.DataFrame({
+        'Operaciones': largos,
+        'Cant. Operada': cantidad_operada,
+        'Neto Operado': neto.round(2),
+        'VWAP': vwap.round(2),
+    }, index=pd.Index(tickers))
+
+
+def columnas_operaciones(tickers, por_ticker):
+    """Columna -> array de agregados alineado con tickers, en 0 para los tickers sin operaciones"""
+    agregados = agregados_operaciones(por_ticker)
+    posiciones = agregados.index.get_indexer(tickers)
+    encontrados = posiciones >= 0
+    columnas = {}
+    for col in COLUMNAS_OPERACIONES:
+        valores = agregados[col].to_numpy()
+        if not len(valores):
+            # Ningún ticker operó todavía
+            columnas[col] = np.zeros(len(posiciones), dtype=valores.dtype)
+            continue
+        columnas[col] = np.where(encontrados, valores[posiciones], 0).astype(valores.dtype)
+    return columnas
+
+
+class CacheOperaciones:
+    """Parsea el detalle de operaciones de cada consulta reutilizando lo ya parseado.
+
+    Cada texto de detalle se parsea una sola vez: mientras siga apareciendo en
+    las respuestas se reutiliza su array. Los que dejan de aparecer se descartan
+    al final de cada consulta, así que la memoria no crece con el tiempo.
+    """
+    def __init__(self):
+        self.memo = {}  # texto del detalle -> array de operaciones
+        self.actual = {}  # ticker -> array de operaciones de la última consulta
+        self.parseados = 0  # Textos parseados desde cero (para medir la efectividad del cache)
+
+    def procesar(self, tickers, detalles):
+        """Devuelve un diccionario ticker -> operaciones, solo para tickers con operaciones"""
+        memo = {}
+        partes = {}
+        for ticker, detalle in zip(tickers, detalles):
+            if not tiene_detalle(detalle):
+                continue
+            clave = detalle if isinstance(detalle, str) else repr(detalle)
+            registros = memo.get(clave)
+            if registros is None:
+                registros = self.memo.get(clave)
+                if registros is None:
+                    registros = operaciones_desde_detalle(detalle)
+                    self.parseados += 1
+                memo[clave] = registros
+            if len(registros):
+                partes.setdefault(ticker, []).append(registros)
+
+        self.memo = memo
+        self.actual = {ticker: concatenar(lista) for ticker, lista in partes.items()}
+        return self.actual
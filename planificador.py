@@ -0,0 +1,110 @@
+"""Planificación adaptativa de las consultas a SHDA.
+
+El intervalo entre consultas se estira cuando el mercado está cerrado o los
+datos no cambian, crece exponencialmente (con jitter) ante errores y vuelve al valor base
+en cuanto aparecen cambios.
+"""
+import hashlib
+import json
+
+import pandas as pd
+
+from sesion import con_jitter
+
+
+INTERVALO_BASE = 2.0  # Segundos
+INTERVALO_ESTATICO = 10.0  # Tope cuando los datos no cambian
+INTERVALO_CIERRE = 60.0  # Mercado cerrado (Hora == CIERRE)
+INTERVALO_MAX_ERROR = 120.0  # Tope del backoff ante errores
+CONSULTAS_PARA_ESTATICO = 3  # Consultas sin cambios antes de empezar a estirar
+
+
+def hash_payload(datos):
+    """Huella de la respuesta cruda de hb.account, para detectar si cambió"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(datos, pd.DataFrame):
+        h.update(json.dumps([str(col) for col in datos.columns]).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(datos, index=False).to_numpy().tobytes())
+        except TypeError:
+            # Celdas no hasheables (por ejemplo, Detalle como lista): se hashea su texto
+            h.update(json.dumps(datos.to_dict('split')['data'], default=str).encode())
+    else:
+        h.update(json.dumps(datos, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class PlanificadorSondeo:
+    """Decide el intervalo hasta la próxima consulta y lleva la cuenta de las salteadas"""
+    def __init__(self, intervalo_base=INTERVALO_BASE, intervalo_estatico=INTERVALO_ESTATICO,
+                 intervalo_cierre=INTERVALO_CIERRE, intervalo_max_error=INTERVALO_MAX_ERROR,
+                 consultas_para_estatico=CONSULTAS_PARA_ESTATICO):
+        self.intervalo_base = intervalo_base
+        self.intervalo_estatico = intervalo_estatico
+        self.intervalo_cierre = intervalo_cierre
+        self.intervalo_max_error = intervalo_max_error
+        self.consultas_para_estatico = consultas_para_estatico
+
+        self.consultas = 0
+        self.salteadas = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Vuelve al estado inicial (por ejemplo, al reconectar)"""
+        self.ultimo_hash = None
+        self.sin_cambios = 0
+        self.errores = 0
+        self.mercado_cerrado = False
+        self.intervalo = self.intervalo_base
+
+    @property
+    def tasa_salteadas(self):
+        return self.salteadas / self.consultas if self.consultas else 0.0
+
+    def registrar_payload(self, datos):
+        """Registra una respuesta; devuelve False si es idéntica a la anterior"""
+        huella = hash_payload(datos)
+        self.consultas += 1
+        self.errores = 0
+
+        cambio = huella != self.ultimo_hash
+        if cambio:
+            self.ultimo_hash = huella
+            self.sin_cambios = 0
+        else:
+            self.sin_cambios += 1
+            self.salteadas += 1
+
+        self.recalcular()
+        return cambio
+
+    def registrar_cierre(self, cerrado):
+        """Informa si la última respuesta tenía el mercado en CIERRE"""
+        self.mercado_cerrado = cerrado
+        self.recalcular()
+
+    def registrar_error(self):
+        self.consultas += 1
+        self.errores += 1
+        # La próxima respuesta se procesa aunque sea igual a la última vista
+        self.ultimo_hash = None
+        self.recalcular()
+
+    def recalcular(self):
+        if self.errores:
+            # Backoff exponencial: 2x, 4x, 8x... el intervalo base, hasta el tope. El jitter
+            # evita que varias cuentas (o varias instancias) reintenten todas a la vez
+            self.intervalo = max(con_jitter(min(self.intervalo_base * 2 ** self.errores, self.intervalo_max_error)),
+                                 self.intervalo_base)
+        elif self.mercado_cerrado:
+            self.intervalo = max(self.intervalo_cierre, self.intervalo_base)
+        elif self.sin_cambios >= self.consultas_para_estatico:
+            # Datos estáticos: duplicar por cada consulta sin cambios, hasta el tope
+            pasos = self.sin_cambios - self.consultas_para_estatico + 1
+            self.intervalo = min(self.intervalo_base * 2 ** pasos, max(self.intervalo_estatico, self.intervalo_base))
+        else:
+            self.intervalo = self.intervalo_base
+
+    def resumen(self):
+        """Texto corto con el intervalo actual y la proporción de consultas salteadas"""
+        return f"Intervalo: {self.intervalo:.1f} s | Sin cambios: {self.tasa_salteadas:.0%} de {self.consultas}"
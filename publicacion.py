@@ -0,0 +1,256 @@
+"""Publicación local de la tenencia para otros programas, sin dependencias de interfaz.
+
+Un solo proceso consulta SHDA y publica cada tenencia normalizada en un
+socket TCP que solo escucha en 127.0.0.1; cualquier cantidad de lectores
+(otra pantalla, una planilla, un notebook) se conecta sin hacer login propio.
+
+El protocolo es una línea JSON por mensaje:
+
+- instantanea: tenencia completa de una cuenta (columnas, claves y filas);
+  se envía al conectarse y cada vez que no se puede mandar una diferencia
+- diferencia: respecto del mensaje anterior de la misma cuenta, emparejando
+  filas por Ticker: claves eliminadas, celdas cambiadas e insertadas
+
+Cada mensaje se codifica una sola vez y se encola (ya en bytes) para todos
+los lectores. Un lector que no da abasto pierde su cola y vuelve a recibir
+instantáneas completas, sin frenar a los demás ni al sondeo.
+"""
+import json
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bitacora import obtener
+from diferencias import claves_de_filas, diferenciar_instantaneas
+
+
+log = obtener('publicacion')
+
+
+PUERTO_PUBLICACION = 8765
+MENSAJES_EN_COLA = 1000  # Por lector; si se llena se descarta y se reenvían instantáneas
+
+
+def a_json(valor):
+    """Valor de una celda como tipo nativo de Python (NaN -> None)"""
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and valor != valor:
+        return None
+    return valor
+
+
+def fila_json(valores):
+    return [a_json(valor) for valor in valores]
+
+
+def codificar(mensaje):
+    return (json.dumps(mensaje, ensure_ascii=False, allow_nan=False) + '\n').encode('utf-8')
+
+
+class Lector:
+    """Conexión de un lector: cola de mensajes ya codificados y un hilo que los envía"""
+    def __init__(self, conexion, direccion):
+        self.conexion = conexion
+        self.direccion = direccion
+        self.cola = queue.Queue(MENSAJES_EN_COLA)
+        self.activo = True
+        self.hilo = threading.Thread(target=self.enviar, name=f'lector-{direccion[1]}', daemon=True)
+
+    def encolar(self, datos):
+        """Devuelve False si la cola está llena"""
+        try:
+            self.cola.put_nowait(datos)
+            return True
+        except queue.Full:
+            return False
+
+    def vaciar(self):
+        try:
+            while True:
+                self.cola.get_nowait()
+        except queue.Empty:
+            pass
+
+    def enviar(self):
+        try:
+            while self.activo:
+                datos = self.cola.get()
+                if datos is None:
+                    break
+                self.conexion.sendall(datos)
+        except OSError:
+            pass
+        finally:
+            self.activo = False
+            self.conexion.close()
+
+    def cerrar(self):
+        self.activo = False
+        self.vaciar()
+        self.cola.put_nowait(None)
+
+
+class PublicadorTenencias:
+    """Servidor TCP en localhost que reparte instantáneas y diferencias por cuenta"""
+    def __init__(self, puerto=PUERTO_PUBLICACION):
+        self.lock = threading.Lock()
+        self.lectores = []
+        self.ultimas = {}  # cuenta -> (secuencia, df, claves)
+        self.instantaneas = {}  # cuenta -> (secuencia, bytes) de la última instantánea codificada
+        self.secuencia = 0
+
+        # Solo localhost: la tenencia no se expone a la red
+        self.servidor = socket.create_server(('127.0.0.1', puerto))
+        self.puerto = self.servidor.getsockname()[1]
+        self.hilo = threading.Thread(target=self.aceptar, name='publicacion', daemon=True)
+        self.hilo.start()
+        log.info("Publicando tenencias en 127.0.0.1:%d", self.puerto)
+
+    def aceptar(self):
+        while True:
+            try:
+                conexion, direccion = self.servidor.accept()
+            except OSError:
+                return  # Servidor cerrado
+            conexion.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            lector = Lector(conexion, direccion)
+            with self.lock:
+                for cuenta in self.ultimas:
+                    lector.encolar(self.instantanea(cuenta))
+                self.lectores.append(lector)
+            lector.hilo.start()
+            log.info("Lector conectado desde %s:%d", direccion[0], direccion[1])
+
+    def instantanea(self, cuenta):
+        """Mensaje de instantánea de la cuenta, codificado una sola vez por secuencia"""
+        secuencia, df, claves = self.ultimas[cuenta]
+        guardada = self.instantaneas.get(cuenta)
+        if guardada is not None and guardada[0] == secuencia:
+            return guardada[1]
+        datos = codificar({
+            'tipo': 'instantanea',
+            'cuenta': cuenta,
+            'secuencia': secuencia,
+            't': time.time(),
+            'columnas': list(df.columns),
+            'claves': None if claves is None else [str(clave) for clave in claves],
+            'filas': [fila_json(fila) for fila in df.itertuples(index=False, name=None)],
+        })
+        self.instantaneas[cuenta] = (secuencia, datos)
+        return datos
+
+    def diferencia(self, cuenta, secuencia, anterior, df, claves_anteriores, claves):
+        """Mensaje de diferencia respecto de la publicación anterior, o None si hace falta una instantánea"""
+        if claves is None or claves_anteriores is None:
+            return None
+        diferencia = diferenciar_instantaneas(anterior, df, claves_anteriores, claves)
+        if diferencia is None:
+            return None
+        if diferencia.vacia:
+            return b''
+
+        columnas = list(df.columns)
+        cambios = []
+        for fila in np.flatnonzero(diferencia.cambios.any(axis=1)):
+            pos = diferencia.pos_nuevo[fila]
+            celdas = {columnas[col]: a_json(df.iat[pos, col]) for col in np.flatnonzero(diferencia.cambios[fila])}
+            cambios.append([str(diferencia.claves_comunes[fila]), celdas])
+
+        return codificar({
+            'tipo': 'diferencia',
+            'cuenta': cuenta,
+            'secuencia': secuencia,
+            't': time.time(),
+            'eliminadas': [str(clave) for clave in diferencia.claves_eliminadas],
+            'cambios': cambios,
+            'insertadas': [[str(clave), fila_json(df.iloc[pos])]
+                           for clave, pos in zip(diferencia.claves_insertadas, diferencia.pos_insertadas)],
+        })
+
+    def publicar(self, cuenta, df):
+        """Publica la tenencia de una cuenta (se puede llamar desde cualquier hilo)"""
+        claves = claves_de_filas(df)
+        with self.lock:
+            self.secuencia += 1
+            secuencia = self.secuencia
+            previa = self.ultimas.get(cuenta)
+            self.ultimas[cuenta] = (secuencia, df, claves)
+            if not self.lectores:
+                return
+
+            datos = None
+            if previa is not None:
+                datos = self.diferencia(cuenta, secuencia, previa[1], df, previa[2], claves)
+            if datos is None:
+                datos = self.instantanea(cuenta)
+            if not datos:
+                return
+
+            self.lectores = [lector for lector in self.lectores if lector.activo]
+            for lector in self.lectores:
+                if not lector.encolar(datos):
+                    # Lector lento: se descarta lo pendiente y se resincroniza con instantáneas
+                    lector.vaciar()
+                    for otra in self.ultimas:
+                        lector.encolar(self.instantanea(otra))
+
+    def cerrar(self):
+        try:
+            self.servidor.shutdown(socket.SHUT_RDWR)  # Despierta al accept() en Linux
+        except OSError:
+            pass
+        self.servidor.close()
+        with self.lock:
+            for lector in self.lectores:
+                lector.cerrar()
+            self.lectores = []
+
+
+class ClienteTenencias:
+    """Lector del publicador: aplica instantáneas y diferencias y entrega cada tenencia armada"""
+    def __init__(self, puerto=PUERTO_PUBLICACION, host='127.0.0.1'):
+        self.conexion = socket.create_connection((host, puerto))
+        self.archivo = self.conexion.makefile('r', encoding='utf-8')
+        self.columnas = {}  # cuenta -> columnas
+        self.filas = {}  # cuenta -> {clave: fila}, en orden
+
+    def aplicar(self, mensaje):
+        """Actualiza el estado con un mensaje y devuelve la tenencia de la cuenta como DataFrame"""
+        cuenta = mensaje['cuenta']
+        if mensaje['tipo'] == 'instantanea':
+            claves = mensaje['claves'] or [str(i) for i in range(len(mensaje['filas']))]
+            self.columnas[cuenta] = mensaje['columnas']
+            self.filas[cuenta] = dict(zip(claves, mensaje['filas']))
+        else:
+            filas = self.filas[cuenta]
+            columnas = {col: i for i, col in enumerate(self.columnas[cuenta])}
+            for clave in mensaje['eliminadas']:
+                filas.pop(clave, None)
+            for clave, celdas in mensaje['cambios']:
+                fila = filas[clave]
+                for col, valor in celdas.items():
+                    fila[columnas[col]] = valor
+            for clave, fila in mensaje['insertadas']:
+                filas[clave] = fila
+            # La fila de totales siempre al final
+            if 'TOTALES' in filas:
+                filas['TOTALES'] = filas.pop('TOTALES')
+        return pd.DataFrame(list(self.filas[cuenta].values()), columns=self.columnas[cuenta])
+
+    def recibir(self):
+        """Genera (cuenta, DataFrame) por cada mensaje recibido, hasta que se cierre la conexión"""
+        for linea in self.archivo:
+            mensaje = json.loads(linea)
+            yield mensaje['cuenta'], self.aplicar(mensaje)
+
+    def cerrar(self):
+        try:
+            self.conexion.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conexion.close()
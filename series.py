@@ -0,0 +1,230 @@
+"""Precios recientes por ticker en buffers circulares de NumPy, con estadísticas rodantes.
+
+Cada ticker tiene una fila de capacidad fija (tiempo, precio y retorno
+logarítmico al cuadrado respecto del precio anterior, con su suma acumulada
+en el día) en cuatro matrices; cada consulta escribe, de una sola vez para
+todos los tickers cuyo precio cambió, en la posición siguiente de su fila.
+La memoria no crece con la duración de la sesión y agregar una consulta
+cuesta lo mismo al minuto que a las seis horas. Máximo y mínimo del día se
+llevan aparte, así que no se pierden cuando el buffer da la vuelta.
+
+A partir de los buffers se calculan, vectorizadas sobre todos los tickers,
+las columnas opcionales de máximo y mínimo del día, variación en los últimos
+N minutos y volatilidad realizada, y la serie corta que dibuja la columna
+Tendencia de la tabla.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from cartera import claves_unicas
+from cierres import fecha_de
+
+
+MUESTRAS_POR_TICKER = 256  # Capacidad del buffer de cada ticker
+PUNTOS_TENDENCIA = 60  # Precios que se dibujan en la columna Tendencia
+VENTANA_MINUTOS = 5  # Ventana de la variación y la volatilidad
+
+COLUMNAS_INTRADIARIAS = ['Máx. Día', 'Mín. Día', 'Var % Ventana', 'Volatilidad', 'Tendencia']
+
+
+class Tendencias:
+    """Últimos precios de cada ticker en orden cronológico (NaN donde no hay dato).
+
+    Es una copia: se puede pasar al hilo de la interfaz mientras el pool
+    sigue escribiendo en los buffers.
+    """
+    def __init__(self, tickers, precios):
+        self.indice = pd.Index(tickers)
+        self.precios = precios  # Matriz tickers x PUNTOS_TENDENCIA
+        self.precios.flags.writeable = False
+
+    def serie(self, ticker):
+        """Precios del ticker sin los huecos iniciales; None si no hay datos"""
+        fila = self.indice.get_indexer([ticker])[0]
+        if fila < 0:
+            return None
+        precios = self.precios[fila]
+        return precios[~np.isnan(precios)]
+
+
+def unir_tendencias(tendencias):
+    """Une las tendencias de varias cuentas; ante tickers repetidos queda la primera"""
+    partes = [t for t in tendencias if t is not None and len(t.indice)]
+    if not partes:
+        return None
+    tickers = np.concatenate([t.indice.to_numpy(dtype=object) for t in partes])
+    precios = np.vstack([t.precios for t in partes])
+    primeras = ~pd.Series(tickers).duplicated().to_numpy()
+    return Tendencias(tickers[primeras], precios[primeras])
+
+
+class SeriesIntradiarias:
+    """Buffers circulares de tiempo y precio por ticker, con altas al vuelo y reinicio diario"""
+    def __init__(self, capacidad=MUESTRAS_POR_TICKER):
+        self.capacidad = capacidad
+        self.reiniciar()
+
+    def reiniciar(self, dia=None):
+        self.dia = dia
+        self.tickers = []
+        self.indice = pd.Index([], dtype=object)
+        self.t = np.full((0, self.capacidad), np.nan)
+        self.precio = np.full((0, self.capacidad), np.nan)
+        self.retorno2 = np.zeros((0, self.capacidad))
+        self.acumulado = np.zeros((0, self.capacidad))  # Suma de retornos² del día hasta cada muestra
+        self.total = np.zeros(0)  # Suma de retornos² del día
+        self.referencia = np.full(0, -1, dtype=np.int64)  # Número de muestra de la referencia de la ventana
+        self.corte = np.full(0, -np.inf)  # Corte con el que se ubicó esa referencia
+        self.posicion = np.zeros(0, dtype=np.int64)  # Próxima posición a escribir de cada fila
+        self.muestras = np.zeros(0, dtype=np.int64)  # Precios registrados en el día
+        self.ultimo = np.zeros(0)
+        self.maximo = np.zeros(0)
+        self.minimo = np.zeros(0)
+
+    def ids_de(self, tickers):
+        """Filas de los tickers, dando de alta los que no existían"""
+        ids = self.indice.get_indexer(tickers)
+        nuevos = ids < 0
+        if nuevos.any():
+            altas = list(pd.unique(tickers[nuevos]))
+            n = len(altas)
+            self.tickers.extend(altas)
+            self.indice = pd.Index(self.tickers, dtype=object)
+            self.t = np.vstack([self.t, np.full((n, self.capacidad), np.nan)])
+            self.precio = np.vstack([self.precio, np.full((n, self.capacidad), np.nan)])
+            self.retorno2 = np.vstack([self.retorno2, np.zeros((n, self.capacidad))])
+            self.acumulado = np.vstack([self.acumulado, np.zeros((n, self.capacidad))])
+            self.total = np.concatenate([self.total, np.zeros(n)])
+            self.referencia = np.concatenate([self.referencia, np.full(n, -1, dtype=np.int64)])
+            self.corte = np.concatenate([self.corte, np.full(n, -np.inf)])
+            self.posicion = np.concatenate([self.posicion, np.zeros(n, dtype=np.int64)])
+            self.muestras = np.concatenate([self.muestras, np.zeros(n, dtype=np.int64)])
+            self.ultimo = np.concatenate([self.ultimo, np.full(n, np.nan)])
+            self.maximo = np.concatenate([self.maximo, np.full(n, np.nan)])
+            self.minimo = np.concatenate([self.minimo, np.full(n, np.nan)])
+            ids = self.indice.get_indexer(tickers)
+        return ids
+
+    def filas_de(self, tickers):
+        """(claves, filas) de los tickers, -1 si no tienen fila; los repetidos usan Ticker#1, ..."""
+        ids = self.indice.get_indexer(tickers)
+        encontrados = ids[ids >= 0]
+        if len(encontrados) and np.bincount(encontrados).max() > 1:
+            tickers = claves_unicas(tickers)
+            ids = self.indice.get_indexer(tickers)
+        return tickers, ids
+
+    def registrar(self, t, tickers, precios):
+        """Agrega el precio de cada ticker que cambió; devuelve cuántos se escribieron"""
+        dia = fecha_de(t)
+        if dia != self.dia:
+            self.reiniciar(dia)
+
+        validos = np.isfinite(precios) & (precios > 0)
+        ids = self.ids_de(tickers[validos])
+        if len(ids) and np.bincount(ids).max() > 1:
+            # Tickers repetidos en la tenencia: cada aparición lleva su propia fila (Ticker#1, ...), como en Cartera
+            ids = self.ids_de(claves_unicas(tickers)[validos])
+        precios = precios[validos]
+
+        cambiaron = precios != self.ultimo[ids]
+        ids = ids[cambiaron]
+        precios = precios[cambiaron]
+        if not len(ids):
+            return 0
+
+        # El primer precio del día no tiene retorno
+        retornos = np.log(precios / self.ultimo[ids])
+        posiciones = self.posicion[ids]
+        self.t[ids, posiciones] = t
+        self.precio[ids, posiciones] = precios
+        retornos2 = np.nan_to_num(retornos ** 2)
+        self.retorno2[ids, posiciones] = retornos2
+        self.total[ids] += retornos2
+        self.acumulado[ids, posiciones] = self.total[ids]
+        self.posicion[ids] = (posiciones + 1) % self.capacidad
+        self.muestras[ids] += 1
+        self.ultimo[ids] = precios
+        self.maximo[ids] = np.fmax(self.maximo[ids], precios)
+        self.minimo[ids] = np.fmin(self.minimo[ids], precios)
+        return len(ids)
+
+    def ubicar_referencias(self, filas, corte):
+        """Número de muestra de la última anterior al corte en cada fila (o la anterior a la primera guardada).
+
+        Cada fila recuerda su referencia y, como el corte avanza con el reloj,
+        solo se recorren las muestras que quedaron fuera de la ventana desde
+        la consulta anterior. Si el corte retrocede (otra ventana), la fila se
+        vuelve a ubicar contando sus muestras anteriores al corte.
+        """
+        muestras = self.muestras[filas]
+        primera = np.maximum(muestras - self.capacidad, 0)  # Muestra más vieja que sigue en el buffer
+        referencias = np.maximum(self.referencia[filas], primera - 1)
+        retrocede = corte < self.corte[filas]
+        if retrocede.any():
+            referencias[retrocede] = primera[retrocede] - 1 + (self.t[filas[retrocede]] < corte).sum(axis=1)
+
+        pendientes = np.arange(len(filas))
+        while len(pendientes):
+            siguientes = referencias[pendientes] + 1
+            pendientes = pendientes[siguientes < muestras[pendientes]]
+            siguientes = referencias[pendientes] + 1
+            pendientes = pendientes[self.t[filas[pendientes], siguientes % self.capacidad] < corte]
+            referencias[pendientes] += 1
+
+        self.referencia[filas] = referencias
+        self.corte[filas] = corte
+        return referencias
+
+    def estadisticas(self, tickers, ahora=None, ventana_minutos=VENTANA_MINUTOS):
+        """Máximo, mínimo, variación % y volatilidad realizada % en la ventana, por ticker.
+
+        La variación se mide contra el último precio anterior al comienzo de
+        la ventana; la volatilidad es la raíz de la suma de los retornos
+        logarítmicos al cuadrado dentro de la ventana. Sin datos, NaN.
+        """
+        ahora = time.time() if ahora is None else ahora
+        corte = ahora - ventana_minutos * 60
+        _, ids = self.filas_de(tickers)
+        encontrados = ids >= 0
+        filas = ids[encontrados]
+        n = len(tickers)
+        resultado = {col: np.full(n, np.nan) for col in COLUMNAS_INTRADIARIAS[:4]}
+        resultado['Tendencia'] = np.zeros(n, dtype=np.int64)
+        if not len(filas):
+            return resultado
+
+        # Solo se tocan las filas pedidas y, en cada una, la referencia y la primera muestra de la ventana
+        referencias = self.ubicar_referencias(filas, corte)
+        muestras = self.muestras[filas]
+        hay_ref = referencias >= np.maximum(muestras - self.capacidad, 0)
+        variacion = np.full(len(filas), np.nan)
+        np.divide(self.ultimo[filas], self.precio[filas, referencias % self.capacidad], out=variacion, where=hay_ref)
+        variacion = (variacion - 1) * 100
+
+        # Suma de retornos² en la ventana: la del día menos la acumulada antes de su primera muestra
+        primeras = (referencias + 1) % self.capacidad
+        suma = self.total[filas] - self.acumulado[filas, primeras] + self.retorno2[filas, primeras]
+        volatilidad = np.sqrt(np.maximum(suma, 0.0)) * 100
+        volatilidad[referencias + 1 >= muestras] = np.nan
+
+        resultado['Máx. Día'][encontrados] = self.maximo[filas]
+        resultado['Mín. Día'][encontrados] = self.minimo[filas]
+        resultado['Var % Ventana'][encontrados] = variacion.round(2)
+        resultado['Volatilidad'][encontrados] = volatilidad.round(3)
+        resultado['Tendencia'][encontrados] = muestras
+        return resultado
+
+    def tendencias(self, tickers, puntos=PUNTOS_TENDENCIA):
+        """Copia de los últimos precios de cada ticker, en orden cronológico"""
+        puntos = min(puntos, self.capacidad)
+        tickers, ids = self.filas_de(tickers)
+        precios = np.full((len(tickers), puntos), np.nan)
+        encontrados = ids >= 0
+        filas = ids[encontrados]
+        if len(filas):
+            columnas = (self.posicion[filas, None] - puntos + np.arange(puntos)) % self.capacidad
+            precios[encontrados] = self.precio[filas[:, None], columnas]
+        return Tendencias(tickers, precios)
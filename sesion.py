@@ -0,0 +1,135 @@
+"""Sesiones de SHDA: login fuera del hilo de la interfaz y reconexión automática.
+
+Los errores se clasifican en sesión vencida (hay que volver a loguearse),
+error de red (la sesión sigue sirviendo, solo se reintenta) u otros.
+"""
+import random
+import threading
+import time
+
+from bitacora import obtener
+
+
+log = obtener('sesion')
+
+
+ERROR_SESION = 'sesion'
+ERROR_RED = 'red'
+ERROR_OTRO = 'otro'
+
+# Estado de conexión de una cuenta
+CONECTANDO = 'conectando'
+CONECTADO = 'conectado'
+REINTENTANDO = 'reintentando'
+
+DESCRIPCION_ERROR = {
+    ERROR_SESION: "sesión vencida",
+    ERROR_RED: "error de red",
+    ERROR_OTRO: "error",
+}
+
+# Tras tantos errores seguidos sin clasificar se rehace el login por las dudas
+REINTENTOS_ANTES_DE_RELOGIN = 3
+
+PALABRAS_SESION = ('sesion', 'sesión', 'session', 'login', 'token', 'expir', 'unauthorized',
+                   'no autorizado', 'forbidden', 'credencial', 'autentic', 'authentic')
+CLASES_RED = ('ConnectionError', 'Timeout', 'TimeoutError', 'ReadTimeout', 'ConnectTimeout',
+              'ProtocolError', 'ChunkedEncodingError', 'SSLError', 'gaierror')
+
+
+def clasificar_error(error):
+    """Devuelve ERROR_SESION, ERROR_RED o ERROR_OTRO según la excepción"""
+    # Respuestas HTTP 401/403 (requests las adjunta como error.response)
+    respuesta = getattr(error, 'response', None)
+    if getattr(respuesta, 'status_code', None) in (401, 403):
+        return ERROR_SESION
+
+    clases = [clase.__name__ for clase in type(error).__mro__]
+    if any(nombre in CLASES_RED for nombre in clases):
+        return ERROR_RED
+
+    mensaje = str(error).lower()
+    if any(palabra in mensaje for palabra in PALABRAS_SESION):
+        return ERROR_SESION
+
+    if isinstance(error, (OSError, TimeoutError)):
+        return ERROR_RED
+    return ERROR_OTRO
+
+
+def con_jitter(segundos):
+    """Aplica jitter al intervalo: un valor al azar entre la mitad y el total"""
+    return segundos * random.uniform(0.5, 1.0)
+
+
+def describir_estado(estado, ahora=None):
+    """Texto corto para la barra de estado a partir de SondeoCuenta.estado_conexion()"""
+    ahora = time.time() if ahora is None else ahora
+    ultima = estado.get('ultima_actualizacion')
+    antiguedad = f"hace {ahora - ultima:.0f} s" if ultima is not None else "sin datos"
+
+    if estado['estado'] == REINTENTANDO:
+        motivo = DESCRIPCION_ERROR.get(estado.get('tipo_error'), "error")
+        return f"Reintentando ({estado['reintentos']}, {motivo}) | Último dato: {antiguedad}"
+    if estado['estado'] == CONECTANDO:
+        return "Conectando..."
+    return f"Conectado | Último dato: {antiguedad}"
+
+
+class GestorSesiones:
+    """Sesiones de SHDA compartidas por credenciales.
+
+    El login se hace en el hilo que pide la sesión (el pool de sondeo), nunca
+    en el de la interfaz. Cada sesión tiene un lock: las cuentas que la
+    comparten hacen sus consultas de a una, mientras que las de otros brokers
+    no se esperan.
+    """
+    def __init__(self, fabrica=None):
+        self.fabrica = fabrica
+        self.sesiones = {}  # credenciales -> (hb, lock de consultas)
+        self.locks_login = {}  # credenciales -> lock para no loguearse dos veces en paralelo
+        self.logins = 0
+        self.lock = threading.Lock()
+
+    def crear(self, cuenta):
+        if self.fabrica is not None:
+            return self.fabrica(cuenta.host, cuenta.dni, cuenta.user, cuenta.password)
+        import SHDA
+        return SHDA.SHDA(cuenta.host, cuenta.dni, cuenta.user, cuenta.password)
+
+    def obtener(self, cuenta):
+        """Devuelve (hb, lock) de la cuenta, haciendo login si todavía no hay sesión"""
+        clave = cuenta.credenciales
+        with self.lock:
+            sesion = self.sesiones.get(clave)
+            if sesion is not None:
+                return sesion
+            lock_login = self.locks_login.setdefault(clave, threading.Lock())
+
+        with lock_login:
+            # Otra cuenta con las mismas credenciales pudo haberse logueado mientras esperábamos
+            with self.lock:
+                sesion = self.sesiones.get(clave)
+            if sesion is not None:
+                return sesion
+
+            hb = self.crear(cuenta)
+            log.info("Login en SHDA (host %s, usuario %s)", cuenta.host, cuenta.user)
+            with self.lock:
+                self.logins += 1
+                return self.sesiones.setdefault(clave, (hb, threading.Lock()))
+
+    def invalidar(self, cuenta, hb=None):
+        """Descarta la sesión de la cuenta; la próxima consulta vuelve a hacer login.
+
+        Si se indica hb, solo se descarta si sigue siendo la sesión vigente
+        (otra cuenta con las mismas credenciales pudo haberla renovado ya).
+        """
+        with self.lock:
+            sesion = self.sesiones.get(cuenta.credenciales)
+            if sesion is not None and (hb is None or sesion[0] is hb):
+                del self.sesiones[cuenta.credenciales]
+
+    def cerrar(self):
+        with self.lock:
+            self.sesiones.clear()